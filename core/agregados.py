@@ -0,0 +1,105 @@
+"""
+Manutenção das tabelas agregadas (`CuboSafra` e `ClimaAnual`) lidas pela
+API do gráfico, para que a consulta não dependa do tamanho da série diária.
+"""
+from functools import reduce
+from itertools import combinations
+from operator import or_
+
+import pandas as pd
+from django.db import transaction
+from django.db.models import Avg, Count, Q, Sum
+
+from .models import ClimaAnual, CuboSafra, DadoMeteorologicoDiario, Localidade, SafraAnual
+
+DIMENSOES_CUBO = ['uf', 'produto_slug', 'safra']
+MEDIDAS_CUBO = ['area_plantada_ha', 'producao_toneladas']
+COLUNAS_CUBO = ['ano', *DIMENSOES_CUBO, *MEDIDAS_CUBO]
+
+
+def atualizar_cubo_safras():
+    """
+    Recalcula `CuboSafra` a partir de `SafraAnual` (série pequena, recálculo
+    completo): para cada ano, os totais de cada combinação de UF, produto e
+    safra, inclusive com uma ou mais dimensões somadas (`CuboSafra.TODOS`).
+    """
+    df = pd.DataFrame.from_records(
+        SafraAnual.objects.values_list(*COLUNAS_CUBO, 'produto'), columns=[*COLUNAS_CUBO, 'produto'],
+    )
+    nomes = dict(zip(df['produto_slug'], df['produto']))
+    niveis = []
+    # Um GROUP BY por subconjunto das dimensões; as ausentes do agrupamento viram o total
+    for tamanho in range(len(DIMENSOES_CUBO) + 1):
+        for dimensoes in combinations(DIMENSOES_CUBO, tamanho):
+            nivel = df.groupby(['ano', *dimensoes])[MEDIDAS_CUBO].sum(min_count=1).reset_index()
+            niveis.append(nivel.assign(**{d: CuboSafra.TODOS for d in DIMENSOES_CUBO if d not in dimensoes}))
+    cubo = pd.concat(niveis, ignore_index=True)[COLUNAS_CUBO]
+    cubo['produto'] = cubo['produto_slug'].map(nomes).fillna('Todos os produtos')
+    area = cubo['area_plantada_ha'].where(cubo['area_plantada_ha'] > 0)
+    cubo['produtividade_kg_ha'] = cubo['producao_toneladas'] * 1000 / area
+    cubo = cubo.astype(object).where(cubo.notna(), None)
+
+    objetos = [CuboSafra(**registro) for registro in cubo.to_dict('records')]
+    with transaction.atomic():
+        CuboSafra.objects.all().delete()
+        CuboSafra.objects.bulk_create(objetos, batch_size=5000)
+    return len(objetos)
+
+
+def atualizar_clima_anual(celula_id, anos):
+    """
+    Recalcula `ClimaAnual` das localidades de uma célula da grade apenas para
+    os `anos` informados. O resumo é calculado uma vez e copiado para cada
+    localidade da célula.
+    """
+    anos = sorted(set(anos))
+    localidades = list(Localidade.objects.filter(celula_id=celula_id).values_list('pk', 'uf'))
+    if not anos or not localidades:
+        return 0
+    # `data__year=ano` vira um intervalo de datas e usa o índice (celula, data)
+    por_ano = reduce(or_, (Q(data__year=ano) for ano in anos))
+    resumos = DadoMeteorologicoDiario.objects.filter(
+        por_ano, celula_id=celula_id,
+    ).values('data__year').annotate(
+        total_precipitacao=Sum('precipitacao_mm'),
+        media_maxima=Avg('temp_maxima_c'),
+        media_minima=Avg('temp_minima_c'),
+        dias=Count('id'),
+    )
+    objetos = [
+        ClimaAnual(
+            localidade_id=localidade_id, uf=uf, ano=item['data__year'],
+            precipitacao_total_mm=item['total_precipitacao'],
+            temp_maxima_media_c=item['media_maxima'],
+            temp_minima_media_c=item['media_minima'],
+            dias=item['dias'],
+        )
+        for item in resumos
+        for localidade_id, uf in localidades
+    ]
+    ClimaAnual.objects.bulk_create(
+        objetos,
+        update_conflicts=True,
+        unique_fields=['localidade', 'ano'],
+        update_fields=['uf', 'precipitacao_total_mm', 'temp_maxima_media_c', 'temp_minima_media_c', 'dias'],
+    )
+    return len(objetos)
+
+
+def anos_do_periodo(inicio, fim):
+    """Anos cobertos por um período no formato AAAAMMDD."""
+    return range(int(inicio[:4]), int(fim[:4]) + 1)
+
+
+def recalcular_clima_anual():
+    """Recalcula `ClimaAnual` inteiro, para todas as localidades e anos."""
+    total = 0
+    anos_por_celula = DadoMeteorologicoDiario.objects.values_list('celula_id', 'data__year').distinct()
+    agrupados = {}
+    for celula_id, ano in anos_por_celula:
+        agrupados.setdefault(celula_id, []).append(ano)
+    with transaction.atomic():
+        ClimaAnual.objects.all().delete()
+        for celula_id, anos in agrupados.items():
+            total += atualizar_clima_anual(celula_id, anos)
+    return total
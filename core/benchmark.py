@@ -0,0 +1,369 @@
+"""
+Benchmark reproduzível das importações, dos agregados e da API.
+
+Gera dados sintéticos no formato das fontes (CSV da Conab e JSON da NASA
+POWER) em escalas múltiplas do volume atual, passa esses dados pelos mesmos
+carregadores da importação real (`importar_serie_conab`, `importar_periodos`)
+e mede a API do gráfico, de indicadores e de séries (e a cópia em memória
+do gráfico) com as tabelas já cheias. Cada escala começa com o banco vazio.
+
+O resultado é um dicionário serializável em JSON (linhas/s, latências e pico
+de memória por etapa) que pode ser comparado com um relatório anterior por
+`comparar_relatorios`. Usado pelo comando `executar_benchmark`, que roda tudo
+num banco de teste descartável.
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+import zlib
+from contextlib import contextmanager
+from datetime import date
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+
+from .agregados import atualizar_cubo_safras, recalcular_clima_anual
+from .cache import invalidar_respostas
+from .coleta import ColetorConcorrente
+from .conab import importar_serie_conab
+from .cubo_memoria import DadosEmMemoria
+from .grade import atribuir_celulas
+from .indicadores import atualizar_indicadores
+from .metricas import Medicao
+from .models import DadoMeteorologicoDiario, Localidade, SafraAnual
+from .nasa import VALOR_AUSENTE, celulas_com_localidades, importar_periodos, planejar_periodos
+
+VERSAO_RELATORIO = 1
+ESCALAS_PADRAO = [1, 10]
+
+# Volume de referência (escala 1), próximo ao da série e das localidades atuais
+ANOS_CONAB = range(1976, 2025)
+UFS = [
+    'AC', 'AL', 'AM', 'AP', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MG', 'MS', 'MT', 'PA',
+    'PB', 'PE', 'PI', 'PR', 'RJ', 'RN', 'RO', 'RR', 'RS', 'SC', 'SE', 'SP', 'TO',
+]
+PRODUTOS_BASE = [
+    'SOJA', 'MILHO TOTAL', 'ALGODAO EM PLUMA', 'ARROZ TOTAL', 'FEIJAO TOTAL',
+    'SORGO', 'TRIGO', 'GIRASSOL', 'AMENDOIM TOTAL', 'MAMONA',
+]
+LOCALIDADES_BASE = 5
+ANOS_NASA_PADRAO = 20
+ULTIMO_ANO = 2024
+# Fração de dias marcados como ausentes (-999) nas respostas sintéticas da NASA
+FRACAO_AUSENTE = 0.01
+
+REPETICOES_PADRAO = 20
+TOLERANCIA_PADRAO = 0.10
+
+
+# --- Dados sintéticos ---------------------------------------------------------
+
+def gerar_csv_conab(caminho, escala=1, semente=0):
+    """
+    Grava em `caminho` uma série no layout do arquivo da Conab (';', latin-1),
+    com todos os anos e UFs e 10 * `escala` produtos. Retorna o número de linhas.
+    """
+    rng = np.random.default_rng(semente)
+    produtos = [
+        nome if i == 0 else f'{nome} {i}'
+        for i in range(escala) for nome in PRODUTOS_BASE
+    ]
+    chaves = pd.MultiIndex.from_product([ANOS_CONAB, UFS, range(len(produtos))], names=['ano', 'uf', 'produto'])
+    df = chaves.to_frame(index=False)
+    area = rng.gamma(2.0, 150.0, len(df)).round(1)
+    produtividade = rng.normal(3.0, 0.6, len(df)).clip(0.3).round(3)
+    pd.DataFrame({
+        'ano_agricola': df['ano'].map(lambda ano: f'{ano}/{(ano + 1) % 100:02d}'.ljust(20)),
+        'dsc_safra_previsao': 'UNICA'.ljust(15),
+        'uf': df['uf'],
+        'produto': df['produto'].map(lambda i: produtos[i].ljust(40)),
+        'id_produto': 4000 + df['produto'],
+        'area_plantada_mil_ha': area,
+        'producao_mil_t': (area * produtividade).round(1),
+        'produtividade_mil_ha_mil_t': produtividade,
+    }).to_csv(caminho, sep=';', encoding='latin-1', index=False)
+    return len(df)
+
+
+def gerar_payload_nasa(inicio, fim, semente=0):
+    """Resposta da NASA POWER (já decodificada) para o período [inicio, fim], datas AAAAMMDD."""
+    rng = np.random.default_rng(semente)
+    datas = pd.date_range(pd.Timestamp(inicio), pd.Timestamp(fim), freq='D')
+    sazonal = np.cos(2 * np.pi * (datas.dayofyear.to_numpy() - 15) / 365.25)
+    valores = {
+        'T2M_MAX': 31 + 3 * sazonal + rng.normal(0, 2, len(datas)),
+        'T2M_MIN': 19 + 4 * sazonal + rng.normal(0, 2, len(datas)),
+        'PRECTOTCORR': np.where(rng.random(len(datas)) < 0.4 + 0.3 * sazonal, rng.gamma(0.8, 12, len(datas)), 0.0),
+    }
+    chaves = datas.strftime('%Y%m%d').tolist()
+    parametros = {}
+    for nome, serie in valores.items():
+        serie = serie.round(2)
+        serie[rng.random(len(serie)) < FRACAO_AUSENTE] = VALOR_AUSENTE
+        parametros[nome] = dict(zip(chaves, serie.tolist()))
+    return {'properties': {'parameter': parametros}}
+
+
+class ColetorSintetico(ColetorConcorrente):
+    """
+    Coletor que responde às URLs da NASA POWER com `gerar_payload_nasa`, sem
+    rede e sem limitação de taxa. O JSON é serializado e lido de volta, como
+    numa resposta real.
+    """
+
+    def __init__(self, max_simultaneas=4):
+        super().__init__(max_simultaneas=max_simultaneas, requisicoes_por_segundo=None)
+
+    def obter_json(self, url):
+        consulta = parse_qs(urlparse(url).query)
+        semente = zlib.crc32(url.encode())
+        corpo = json.dumps(gerar_payload_nasa(consulta['start'][0], consulta['end'][0], semente))
+        return json.loads(corpo)
+
+
+def criar_localidades(quantidade):
+    """Localidades sintéticas espalhadas sobre MT, ligadas às suas células da grade."""
+    lado = int(np.ceil(np.sqrt(quantidade)))
+    Localidade.objects.bulk_create([
+        Localidade(
+            nome=f'Benchmark {i:04d}', uf='MT',
+            latitude=round(-17.5 + 8.0 * (i // lado) / lado, 4),
+            longitude=round(-61.0 + 10.0 * (i % lado) / lado, 4),
+        )
+        for i in range(quantidade)
+    ])
+    localidades = list(Localidade.objects.order_by('pk'))
+    atribuir_celulas(localidades)
+    return localidades
+
+
+# --- Medição ----------------------------------------------------------------------
+
+@contextmanager
+def medir(resultado, memoria=True):
+    """Grava em `resultado` os segundos e o pico de memória (MB, via tracemalloc) do bloco."""
+    if memoria:
+        tracemalloc.reset_peak()
+    inicio = time.perf_counter()
+    try:
+        yield resultado
+    finally:
+        resultado['segundos'] = round(time.perf_counter() - inicio, 4)
+        if memoria:
+            resultado['pico_memoria_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+
+
+def _taxa(resultado, linhas):
+    resultado['linhas'] = linhas
+    resultado['linhas_por_segundo'] = round(linhas / resultado['segundos'], 1) if resultado['segundos'] else 0.0
+    return resultado
+
+
+def _etapas(medicao):
+    """Segundos, linhas/s e consultas de cada etapa de uma `Medicao`."""
+    return {
+        nome: dict(segundos=round(etapa['segundos'], 4), linhas=etapa['linhas'],
+                   linhas_por_segundo=etapa['linhas_por_segundo'], consultas=etapa['consultas'])
+        for nome, etapa in medicao.resumo()['etapas'].items()
+    }
+
+
+def medir_endpoint(cliente, url, repeticoes):
+    """
+    Latência (ms) de `url` sem cache (dados invalidados antes de cada chamada)
+    e com a resposta já em cache.
+    """
+    resultado = {}
+    for modo in ('sem_cache', 'com_cache'):
+        latencias = []
+        for _ in range(repeticoes):
+            if modo == 'sem_cache':
+                invalidar_respostas()
+            inicio = time.perf_counter()
+            response = cliente.get(url)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url} respondeu {response.status_code}.')
+        latencias = np.array(latencias)
+        resultado[modo] = {
+            'mediana_ms': round(float(np.median(latencias)), 2),
+            'p95_ms': round(float(np.percentile(latencias, 95)), 2),
+            'media_ms': round(float(latencias.mean()), 2),
+        }
+    return resultado
+
+
+def medir_cubo_memoria(repeticoes, memoria=True):
+    """
+    Carga da cópia em memória do gráfico (`core.cubo_memoria`) e latência
+    (ms) da consulta do gráfico feita direto sobre ela, sem HTTP nem cache.
+    """
+    with medir({}, memoria) as medida:
+        dados = DadosEmMemoria(invalidar_respostas())
+    latencias = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        dados.safras.somar('producao_toneladas', por='ano', uf='MT', produto_slug='soja')
+        dados.clima.media('precipitacao_total_mm', por='ano', uf='MT')
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return {
+        'carga': _taxa(medida, dados.safras.linhas + dados.clima.linhas),
+        'consulta': {'mediana_ms': round(float(np.median(latencias)), 4)},
+    }
+
+
+# --- Execução ----------------------------------------------------------------------
+
+def executar_escala(escala, diretorio, anos_nasa=ANOS_NASA_PADRAO, repeticoes=REPETICOES_PADRAO,
+                    memoria=True, max_simultaneas=None, relatar=print):
+    """Roda o benchmark completo de uma escala num banco vazio e devolve os resultados."""
+    call_command('flush', interactive=False, verbosity=0)
+    resultado = {}
+
+    # Conab: carga inicial e reimportação do mesmo arquivo (nova troca completa da tabela)
+    caminho = os.path.join(diretorio, f'conab-{escala}x.csv')
+    linhas_arquivo = gerar_csv_conab(caminho, escala)
+    relatar(f'  Conab: {linhas_arquivo} linhas no arquivo sintético')
+    conab = resultado['conab'] = {'linhas_arquivo': linhas_arquivo}
+    for fase in ('carga_inicial', 'reimportacao'):
+        medicao = Medicao('conab')
+        with medir({}, memoria) as medida:
+            carga = importar_serie_conab(caminho, medicao=medicao)
+        conab[fase] = dict(_taxa(medida, linhas_arquivo), gravadas=carga.registros,
+                           troca_ms=round(carga.segundos_troca * 1000, 2), etapas=_etapas(medicao))
+
+    # NASA: todas as células com localidades e anos, pelo mesmo caminho concorrente da importação
+    localidades = criar_localidades(LOCALIDADES_BASE * escala)
+    celulas = list(celulas_com_localidades())
+    anos = range(ULTIMO_ANO - anos_nasa + 1, ULTIMO_ANO + 1)
+    unidades = planejar_periodos(celulas, anos, hoje=date(ULTIMO_ANO + 1, 1, 1))
+    relatar(f'  NASA: {len(localidades)} localidades em {len(celulas)} células, {len(unidades)} requisições')
+    medicao = Medicao('nasa')
+    coletor = ColetorSintetico(max_simultaneas or settings.NASA_POWER_MAX_SIMULTANEAS)
+    with medir({}, memoria) as medida:
+        gravadas = sum(alteradas for *_, alteradas, erro in importar_periodos(unidades, coletor, medicao) if not erro)
+    resultado['nasa'] = dict(_taxa(medida, gravadas), requisicoes=len(unidades), falhas=medicao.falhas,
+                             etapas=_etapas(medicao))
+
+    # Agregados recalculados do zero
+    resultado['agregados'] = {}
+    for nome, funcao in (('cubo_safras', atualizar_cubo_safras), ('clima_anual', recalcular_clima_anual),
+                         ('indicadores', atualizar_indicadores)):
+        with medir({}, memoria) as medida:
+            linhas = funcao()
+        resultado['agregados'][nome] = _taxa(medida, linhas)
+
+    resultado['cubo_memoria'] = medir_cubo_memoria(repeticoes, memoria)
+
+    resultado['tamanhos'] = {
+        'safras': SafraAnual.objects.count(),
+        'localidades': len(localidades),
+        'celulas': len(celulas),
+        'clima_diario': DadoMeteorologicoDiario.objects.count(),
+    }
+
+    # API com as tabelas cheias
+    relatar(f'  API: {repeticoes} chamadas por endpoint e modo')
+    cliente = Client()
+    inicio_serie, fim_serie = f'{anos[0]}-01-01', f'{ULTIMO_ANO}-12-31'
+    resultado['api'] = {
+        nome: medir_endpoint(cliente, url, repeticoes)
+        for nome, url in (
+            ('chart_data', '/api/chart-data/?produto=soja'),
+            ('producao', '/api/producao/?uf=BR&produto=soja&safra=unica'),
+            ('indicadores', '/api/indicadores/?uf=MT'),
+            ('series_auto', f'/api/series/?localidade={localidades[0].pk}&inicio={inicio_serie}&fim={fim_serie}'),
+            ('series_dia', f'/api/series/?localidade={localidades[0].pk}&inicio={inicio_serie}&fim={fim_serie}'
+                           f'&resolucao=dia&variaveis=precipitacao_mm,temp_maxima_c,temp_minima_c'),
+        )
+    }
+    return resultado
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar_benchmark(escalas=ESCALAS_PADRAO, diretorio='.', anos_nasa=ANOS_NASA_PADRAO,
+                       repeticoes=REPETICOES_PADRAO, memoria=True, max_simultaneas=None, relatar=print):
+    """
+    Roda `executar_escala` para cada escala no banco da conexão atual (que é
+    esvaziado) e monta o relatório. Os arquivos sintéticos ficam em `diretorio`.
+    """
+    relatorio = {
+        'versao': VERSAO_RELATORIO,
+        'gerado_em': pd.Timestamp.now(tz='UTC').isoformat(),
+        'commit': _commit_atual(),
+        'ambiente': {
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+            'banco': connection.vendor,
+            'versao_banco': '.'.join(map(str, connection.get_database_version())),
+        },
+        'parametros': {
+            'anos_nasa': anos_nasa, 'repeticoes': repeticoes, 'memoria': memoria,
+            'max_simultaneas': max_simultaneas or settings.NASA_POWER_MAX_SIMULTANEAS,
+        },
+        'escalas': {},
+    }
+    if memoria:
+        tracemalloc.start()
+    try:
+        for escala in escalas:
+            relatar(f'Escala {escala}x')
+            relatorio['escalas'][str(escala)] = executar_escala(
+                escala, diretorio, anos_nasa, repeticoes, memoria, max_simultaneas, relatar,
+            )
+    finally:
+        if memoria:
+            tracemalloc.stop()
+    return relatorio
+
+
+# --- Comparação ------------------------------------------------------------------
+
+def _metricas(relatorio, prefixo=''):
+    """Achata o relatório em {caminho: valor} só com as métricas comparáveis."""
+    metricas = {}
+    for chave, valor in relatorio.items():
+        caminho = f'{prefixo}.{chave}' if prefixo else chave
+        if isinstance(valor, dict):
+            metricas.update(_metricas(valor, caminho))
+        elif chave in ('linhas_por_segundo', 'segundos', 'pico_memoria_mb') or chave.endswith('_ms'):
+            metricas[caminho] = valor
+    return metricas
+
+
+def comparar_relatorios(anterior, atual, tolerancia=TOLERANCIA_PADRAO):
+    """
+    Compara as métricas das escalas presentes nos dois relatórios. Devolve
+    [(caminho, valor_anterior, valor_atual, variacao, regressao)], em que
+    `variacao` é relativa ao anterior e `regressao` indica piora acima de
+    `tolerancia` (linhas/s menor; tempo, latência ou memória maiores).
+    """
+    antes = _metricas(anterior['escalas'])
+    depois = _metricas(atual['escalas'])
+    comparacao = []
+    for caminho in sorted(antes.keys() & depois.keys()):
+        valor_antes, valor_depois = antes[caminho], depois[caminho]
+        if not valor_antes:
+            continue
+        variacao = (valor_depois - valor_antes) / valor_antes
+        piora = -variacao if caminho.endswith('linhas_por_segundo') else variacao
+        comparacao.append((caminho, valor_antes, valor_depois, round(variacao, 4), piora > tolerancia))
+    return comparacao
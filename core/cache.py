@@ -0,0 +1,71 @@
+"""
+Cache das respostas da API versionado pelos dados.
+
+Cada importação que altera os dados grava uma nova "versão" (o instante da
+importação). A versão entra na chave do cache, no ETag e no Last-Modified,
+então respostas antigas deixam de ser usadas sem precisar apagá-las.
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+
+CHAVE_VERSAO = 'datum_safra:versao_dados'
+
+# Tempo máximo de vida de uma resposta em cache (segundos)
+TEMPO_RESPOSTA = 60 * 60 * 24
+
+
+def versao_dados():
+    """Instante (epoch) da última alteração dos dados conhecida pelo cache."""
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        versao = int(time.time())
+        # `add` não sobrescreve uma versão gravada por outro processo nesse meio tempo
+        if not cache.add(CHAVE_VERSAO, versao, timeout=None):
+            versao = cache.get(CHAVE_VERSAO, versao)
+    return versao
+
+
+async def aversao_dados():
+    """Versão assíncrona de `versao_dados`, para as views assíncronas."""
+    versao = await cache.aget(CHAVE_VERSAO)
+    if versao is None:
+        versao = int(time.time())
+        if not await cache.aadd(CHAVE_VERSAO, versao, timeout=None):
+            versao = await cache.aget(CHAVE_VERSAO, versao)
+    return versao
+
+
+def invalidar_respostas():
+    """Chamado ao final das importações: publica uma nova versão dos dados."""
+    versao = max(int(time.time()), (cache.get(CHAVE_VERSAO) or 0) + 1)
+    cache.set(CHAVE_VERSAO, versao, timeout=None)
+    return versao
+
+
+def chave_resposta(nome, parametros, versao=None):
+    """Chave do cache para a resposta `nome` com os `parametros` já normalizados."""
+    versao = versao_dados() if versao is None else versao
+    consulta = urlencode(sorted(parametros.items()))
+    return f'datum_safra:{nome}:{versao}:{hashlib.sha1(consulta.encode()).hexdigest()}'
+
+
+def etag_resposta(nome, parametros, versao=None):
+    return hashlib.sha1(chave_resposta(nome, parametros, versao).encode()).hexdigest()
+
+
+async def aobter_ou_calcular(nome, parametros, calcular, versao=None):
+    """
+    Devolve a resposta em cache para (`nome`, `parametros`) ou a calcula
+    (`calcular` é uma corrotina) e grava. Quem já leu a `versao` dos dados
+    na requisição a repassa.
+    """
+    versao = await aversao_dados() if versao is None else versao
+    chave = chave_resposta(nome, parametros, versao)
+    resposta = await cache.aget(chave)
+    if resposta is None:
+        resposta = await calcular()
+        await cache.aset(chave, resposta, timeout=TEMPO_RESPOSTA)
+    return resposta
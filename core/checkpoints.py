@@ -0,0 +1,126 @@
+"""
+Registro das execuções de importação e checkpoints por unidade de trabalho
+(`ExecucaoImportacao` e `UnidadeImportacao`).
+
+Cada importação planeja suas unidades (referencia, inicio, fim) e passa por
+`retomar`, que descarta as já concluídas e registra as demais como
+pendentes. Ao terminar cada unidade o importador chama `concluir_unidade`
+(com linhas e hash do conteúdo) ou `falhar_unidade`. Se a execução cair no
+meio, a próxima refaz só o que ficou pendente ou falhou.
+
+Uma unidade concluída só é pulada se o período já tinha terminado quando
+ela foi concluída; períodos que chegavam até o dia da busca podem ter
+ganhado dados depois e são buscados de novo.
+"""
+import hashlib
+import json
+
+import pandas as pd
+from django.db.models import F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ExecucaoImportacao, UnidadeImportacao
+
+
+def hash_conteudo(dados):
+    """SHA-256 de uma resposta JSON já decodificada, independente da ordem das chaves."""
+    return hashlib.sha256(json.dumps(dados, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def chave_unidade(referencia, inicio=None, fim=None):
+    return f'{referencia}:{inicio}-{fim}' if inicio else str(referencia)
+
+
+def _data(valor):
+    """Datas AAAAMMDD (NASA) ou AAAA-MM-DD (INMET) como date; None continua None."""
+    return pd.Timestamp(valor).date() if valor else None
+
+
+def iniciar_execucao(fonte):
+    return ExecucaoImportacao.objects.create(fonte=fonte)
+
+
+def unidades_concluidas(fonte):
+    """Chaves das unidades concluídas depois do fim do seu período."""
+    return set(
+        UnidadeImportacao.objects.filter(
+            fonte=fonte, status='concluida', fim__lt=TruncDate('concluida_em'),
+        ).values_list('chave', flat=True)
+    )
+
+
+def pular_concluidas(fonte, unidades, referencia):
+    """
+    Filtra de `unidades` (tuplas (objeto, inicio, fim)) as já concluídas.
+    `referencia(objeto)` identifica o objeto no checkpoint (id da
+    localidade, código da estação...).
+    """
+    concluidas = unidades_concluidas(fonte)
+    return [
+        unidade for unidade in unidades
+        if chave_unidade(referencia(unidade[0]), unidade[1], unidade[2]) not in concluidas
+    ]
+
+
+def retomar(execucao, unidades, referencia):
+    """
+    `pular_concluidas` e registro das unidades restantes como pendentes desta
+    `execucao`, mantendo o número de tentativas anteriores. Devolve as
+    unidades a processar.
+    """
+    restantes = pular_concluidas(execucao.fonte, unidades, referencia)
+    registrar_pendentes(execucao, [(referencia(objeto), inicio, fim) for objeto, inicio, fim in restantes])
+    return restantes
+
+
+def registrar_pendentes(execucao, unidades):
+    """Marca como pendentes desta `execucao` as unidades (referencia, inicio, fim)."""
+    UnidadeImportacao.objects.bulk_create(
+        [
+            UnidadeImportacao(
+                fonte=execucao.fonte, chave=chave_unidade(referencia, inicio, fim),
+                referencia=referencia, inicio=_data(inicio), fim=_data(fim),
+                status='pendente', execucao=execucao,
+            )
+            for referencia, inicio, fim in unidades
+        ],
+        update_conflicts=True,
+        unique_fields=['fonte', 'chave'],
+        update_fields=['status', 'execucao'],
+    )
+    ExecucaoImportacao.objects.filter(pk=execucao.pk).update(unidades=F('unidades') + len(unidades))
+
+
+def _atualizar_unidade(execucao_id, fonte, chave, **campos):
+    UnidadeImportacao.objects.filter(fonte=fonte, chave=chave).update(
+        execucao_id=execucao_id, tentativas=F('tentativas') + 1, atualizada_em=timezone.now(), **campos,
+    )
+
+
+def concluir_unidade(execucao_id, fonte, referencia, inicio=None, fim=None, linhas=0, sha256=''):
+    _atualizar_unidade(
+        execucao_id, fonte, chave_unidade(referencia, inicio, fim),
+        status='concluida', linhas=linhas, sha256=sha256, erro='', concluida_em=timezone.now(),
+    )
+
+
+def falhar_unidade(execucao_id, fonte, referencia, inicio=None, fim=None, erro=''):
+    _atualizar_unidade(execucao_id, fonte, chave_unidade(referencia, inicio, fim), status='falhou', erro=str(erro))
+
+
+def unidades_a_refazer(fonte, formato='%Y-%m-%d'):
+    """(referencia, inicio, fim) das unidades pendentes ou com falha, com as datas em `formato`."""
+    return [
+        (referencia, inicio.strftime(formato) if inicio else None, fim.strftime(formato) if fim else None)
+        for referencia, inicio, fim in UnidadeImportacao.objects.filter(
+            fonte=fonte, status__in=['pendente', 'falhou'],
+        ).order_by('referencia', 'inicio').values_list('referencia', 'inicio', 'fim')
+    ]
+
+
+def finalizar_execucao(execucao_id, resumo):
+    """Grava o status e o resumo (`Medicao.finalizar()`) da execução."""
+    ExecucaoImportacao.objects.filter(pk=execucao_id).update(
+        status=resumo['status'], resumo=resumo, concluida_em=timezone.now(),
+    )
@@ -0,0 +1,194 @@
+"""
+Camada de coleta HTTP concorrente usada pelos importadores.
+
+Um pool de threads compartilha uma única `requests.Session` (conexões
+reaproveitadas), com limite de requisições simultâneas, limitação de taxa
+por token bucket (no processo ou, com `LimitadorTaxaCompartilhado`, no
+Redis, somando todos os processos) e novas tentativas com backoff exponencial e jitter.
+Com um `armazem` (`core.respostas_brutas`), as respostas brutas são
+guardadas em disco e reaproveitadas enquanto válidas.
+"""
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import redis
+import requests
+from requests.adapters import HTTPAdapter
+
+# Status HTTP que valem uma nova tentativa
+STATUS_TRANSITORIOS = {429, 500, 502, 503, 504}
+
+
+class LimitadorTaxa:
+    """Token bucket: no máximo `taxa` requisições por segundo, com rajadas até `capacidade`."""
+
+    def __init__(self, taxa, capacidade=None):
+        self.taxa = float(taxa)
+        self.capacidade = float(capacidade or max(1.0, taxa))
+        self.tokens = self.capacidade
+        self.ultima_reposicao = time.monotonic()
+        self.lock = threading.Lock()
+
+    def aguardar(self):
+        """Bloqueia até haver um token disponível e o consome."""
+        while True:
+            with self.lock:
+                agora = time.monotonic()
+                self.tokens = min(self.capacidade, self.tokens + (agora - self.ultima_reposicao) * self.taxa)
+                self.ultima_reposicao = agora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                espera = (1 - self.tokens) / self.taxa
+            time.sleep(espera)
+
+
+# Token bucket atômico no Redis, com o relógio do servidor (o mesmo para
+# todos os processos). Consome um token e devolve 0, ou devolve quantos
+# segundos faltam para haver um token, sem consumir.
+SCRIPT_TOKEN_BUCKET = """
+local taxa, capacidade = tonumber(ARGV[1]), tonumber(ARGV[2])
+local relogio = redis.call('TIME')
+local agora = tonumber(relogio[1]) + tonumber(relogio[2]) / 1000000
+local estado = redis.call('HMGET', KEYS[1], 'tokens', 'instante')
+local tokens = tonumber(estado[1]) or capacidade
+local instante = tonumber(estado[2]) or agora
+tokens = math.min(capacidade, tokens + math.max(0, agora - instante) * taxa)
+local espera = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    espera = (1 - tokens) / taxa
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'instante', tostring(agora))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacidade / taxa) + 60)
+return tostring(espera)
+"""
+
+
+class LimitadorTaxaCompartilhado:
+    """
+    Token bucket guardado no Redis em `chave`: no máximo `taxa` requisições
+    por segundo somando todos os processos que usam a mesma chave (workers
+    do Celery, comandos), com rajadas até `capacidade`. Mesma interface de
+    `LimitadorTaxa`.
+    """
+
+    def __init__(self, url, chave, taxa, capacidade=None):
+        self.chave = chave
+        self.taxa = float(taxa)
+        self.capacidade = float(capacidade or max(1.0, taxa))
+        self.script = redis.Redis.from_url(url).register_script(SCRIPT_TOKEN_BUCKET)
+
+    def aguardar(self):
+        """Bloqueia até haver um token disponível no Redis e o consome."""
+        while True:
+            espera = float(self.script(keys=[self.chave], args=[self.taxa, self.capacidade]))
+            if espera <= 0:
+                return
+            time.sleep(espera)
+
+
+def criar_limitador(taxa, url=None, chave=None):
+    """`LimitadorTaxaCompartilhado` em `url`, se houver; senão um `LimitadorTaxa` do processo."""
+    if not taxa:
+        return None
+    if url:
+        return LimitadorTaxaCompartilhado(url, chave, taxa)
+    return LimitadorTaxa(taxa)
+
+
+def criar_sessao(max_conexoes):
+    """Cria uma sessão com pool de conexões dimensionado para `max_conexoes` threads."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_conexoes, pool_maxsize=max_conexoes)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class ColetorConcorrente:
+    """
+    Executa requisições GET em paralelo e entrega as respostas JSON à medida
+    que ficam prontas, de modo que o chamador grava no banco enquanto as
+    demais requisições ainda estão em andamento.
+    """
+
+    def __init__(self, max_simultaneas=4, requisicoes_por_segundo=5.0, tentativas=3,
+                 backoff_base=1.0, timeout=60.0, session=None, medicao=None, armazem=None, limitador=None):
+        self.max_simultaneas = max_simultaneas
+        # `limitador` (ex: um `LimitadorTaxaCompartilhado`) substitui o token bucket do processo
+        self.limitador = limitador or criar_limitador(requisicoes_por_segundo)
+        self.tentativas = tentativas
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.session = session or criar_sessao(max_simultaneas)
+        # `core.metricas.Medicao` que recebe a latência de cada tentativa (opcional)
+        self.medicao = medicao
+        # `core.respostas_brutas.ArmazemRespostas` com as respostas já obtidas (opcional)
+        self.armazem = armazem
+
+    def obter_json(self, url):
+        """
+        JSON de `url` (None se a resposta veio sem corpo). Usa a resposta do
+        armazém se houver uma válida; senão busca na API e a guarda.
+        """
+        conteudo = self.armazem.ler(url) if self.armazem else None
+        if conteudo is None:
+            conteudo = self.baixar(url)
+            if self.armazem:
+                self.armazem.gravar(url, conteudo)
+        return json.loads(conteudo) if conteudo else None
+
+    def baixar(self, url):
+        """
+        GET com limitação de taxa e novas tentativas para erros transitórios.
+        Devolve o corpo da resposta em bytes (vazio se não houver corpo).
+        """
+        for tentativa in range(self.tentativas):
+            if self.limitador:
+                self.limitador.aguardar()
+            inicio = time.perf_counter()
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+                self._medir(inicio, tentativa, erro=response.status_code >= 400)
+                if response.status_code in STATUS_TRANSITORIOS and tentativa + 1 < self.tentativas:
+                    self._esperar(tentativa)
+                    continue
+                response.raise_for_status()
+                return b'' if response.status_code == 204 else response.content
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self._medir(inicio, tentativa, erro=True)
+                if tentativa + 1 == self.tentativas:
+                    raise
+                self._esperar(tentativa)
+
+    def _medir(self, inicio, tentativa, erro):
+        if self.medicao:
+            self.medicao.registrar_http(time.perf_counter() - inicio, repeticao=tentativa > 0, erro=erro)
+
+    def _esperar(self, tentativa):
+        # Backoff exponencial com "full jitter"
+        time.sleep(random.uniform(0, self.backoff_base * 2 ** tentativa))
+
+    def executar(self, tarefas):
+        """
+        Recebe um iterável de (chave, url) e gera (chave, dados, erro) na ordem
+        em que as respostas chegam. `erro` é None quando a requisição deu certo;
+        `dados` é None quando a resposta veio sem corpo.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_simultaneas) as executor:
+            futuros = {executor.submit(self.obter_json, url): chave for chave, url in tarefas}
+            try:
+                for futuro in as_completed(futuros):
+                    chave = futuros[futuro]
+                    try:
+                        yield chave, futuro.result(), None
+                    except Exception as e:
+                        yield chave, None, e
+            finally:
+                for futuro in futuros:
+                    futuro.cancel()
@@ -0,0 +1,208 @@
+"""
+Pipeline compartilhado da Conab: download, transformação e carga em lote.
+
+Usado tanto pelo comando `importar_safras` quanto pela tarefa Celery
+`importar_dados_conab_task`. O arquivo é baixado em pedaços e lido em
+blocos, só com as colunas usadas; cada bloco transformado vai direto para
+uma tabela-sombra, trocada com a de `SafraAnual` de uma vez ao fim
+(`core.tabela_sombra`): o dashboard nunca vê a tabela vazia ou pela metade.
+
+A série é gravada inteira (todas as UFs) e a safra do ano agrícola (única,
+1ª, 2ª ou 3ª) faz parte da chave: milho de 1ª e de 2ª safra no mesmo ano e
+UF são linhas diferentes de `SafraAnual`.
+"""
+import hashlib
+import os
+import time
+from dataclasses import dataclass
+
+import pandas as pd
+import requests
+from django.utils.text import slugify
+
+from .metricas import Medicao
+from .models import ArquivoFonte, SafraAnual
+from .tabela_sombra import RecargaTabela
+
+CONAB_URL = 'https://portaldeinformacoes.conab.gov.br/downloads/arquivos/SerieHistoricaGraos.txt'
+ARQUIVO_LOCAL = 'data/SerieHistoricaGraos.csv'
+
+# Quantidade de linhas enviadas em cada INSERT na tabela-sombra
+TAMANHO_LOTE_PADRAO = 1000
+
+# Linhas do CSV lidas por bloco e bytes gravados por vez no download
+TAMANHO_BLOCO_PADRAO = 50000
+TAMANHO_PEDACO_DOWNLOAD = 1024 * 1024
+
+COLUNAS_RENOMEADAS = {
+    'ano_agricola': 'ano_safra',
+    'dsc_safra_previsao': 'safra',
+    'uf': 'uf',
+    'produto': 'produto',
+    'id_produto': 'codigo_produto',
+    'area_plantada_mil_ha': 'area_plantada_ha',
+    'producao_mil_t': 'producao_toneladas',
+    'produtividade_mil_ha_mil_t': 'produtividade_kg_ha',
+}
+COLUNAS_FINAIS = [
+    'ano', 'uf', 'produto', 'safra', 'produto_slug', 'codigo_produto',
+    'area_plantada_ha', 'producao_toneladas', 'produtividade_kg_ha',
+]
+CHAVE_UNICA = ['ano', 'uf', 'produto', 'safra']
+# Somadas na conferência da tabela-sombra, antes da troca
+MEDIDAS = ['area_plantada_ha', 'producao_toneladas']
+
+# Apenas as colunas do arquivo que o pipeline usa, com tipos fixos
+TIPOS_COLUNAS_LIDAS = {
+    'ano_agricola': str,
+    'dsc_safra_previsao': str,
+    'uf': str,
+    'produto': str,
+    'id_produto': 'Int64',
+    'area_plantada_mil_ha': 'float64',
+    'producao_mil_t': 'float64',
+    'produtividade_mil_ha_mil_t': 'float64',
+}
+
+
+@dataclass
+class ResultadoCarga:
+    registros: int
+    segundos: float
+    segundos_troca: float = 0.0
+
+    @property
+    def registros_por_segundo(self):
+        return self.registros / self.segundos if self.segundos else 0.0
+
+
+@dataclass
+class DownloadConab:
+    caminho: str
+    alterado: bool
+    etag: str = ''
+    last_modified: str = ''
+    sha256: str = ''
+
+    @property
+    def metadados(self):
+        return {'etag': self.etag, 'last_modified': self.last_modified, 'sha256': self.sha256}
+
+
+def baixar_serie_conab(url=CONAB_URL, destino=ARQUIVO_LOCAL, forcar=False):
+    """
+    Baixa a série histórica da Conab para `destino` em pedaços, sem manter o
+    corpo da resposta em memória. Propaga RequestException.
+
+    Envia If-None-Match/If-Modified-Since com os metadados do último arquivo
+    importado e compara o hash do conteúdo; `alterado` é False quando a Conab
+    não publicou nada novo. Os metadados só são gravados por
+    `registrar_download`, depois que a carga termina.
+    """
+    anterior = None if forcar else ArquivoFonte.objects.filter(url=url).first()
+    headers = {}
+    if anterior and anterior.etag:
+        headers['If-None-Match'] = anterior.etag
+    if anterior and anterior.last_modified:
+        headers['If-Modified-Since'] = anterior.last_modified
+
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    parcial = f'{destino}.parcial'
+    conteudo_hash = hashlib.sha256()
+    with requests.get(url, stream=True, headers=headers) as response:
+        if response.status_code == 304:
+            return DownloadConab(destino, False, anterior.etag, anterior.last_modified, anterior.sha256)
+        response.raise_for_status()
+        with open(parcial, 'wb') as f:
+            for pedaco in response.iter_content(chunk_size=TAMANHO_PEDACO_DOWNLOAD):
+                conteudo_hash.update(pedaco)
+                f.write(pedaco)
+        etag = response.headers.get('ETag', '')
+        last_modified = response.headers.get('Last-Modified', '')
+    os.replace(parcial, destino)
+
+    sha256 = conteudo_hash.hexdigest()
+    alterado = anterior is None or anterior.sha256 != sha256
+    return DownloadConab(destino, alterado, etag, last_modified, sha256)
+
+
+def registrar_download(metadados, url=CONAB_URL):
+    """Grava os metadados (`DownloadConab.metadados`) do arquivo importado para os próximos downloads condicionais."""
+    ArquivoFonte.objects.update_or_create(url=url, defaults=metadados)
+
+
+def ler_serie_conab(caminho=ARQUIVO_LOCAL, tamanho_bloco=TAMANHO_BLOCO_PADRAO):
+    """Lê o arquivo em blocos de `tamanho_bloco` linhas, só com as colunas usadas."""
+    return pd.read_csv(
+        caminho, sep=';', encoding='latin-1',
+        usecols=list(TIPOS_COLUNAS_LIDAS), dtype=TIPOS_COLUNAS_LIDAS,
+        chunksize=tamanho_bloco,
+    )
+
+
+def codigo_safra(descricao):
+    """'UNICA' -> 'unica', '2ª SAFRA' -> '2' (valores de `SafraAnual.SAFRAS`)."""
+    descricao = str(descricao).strip()
+    return descricao[0] if descricao[:1].isdigit() else 'unica'
+
+
+def transformar_serie_conab(df):
+    """
+    Renomeia colunas e ajusta unidades de um bloco. Retorna um DataFrame com
+    as colunas de `SafraAnual`.
+    """
+    df = df.rename(columns=COLUNAS_RENOMEADAS)
+    df['uf'] = df['uf'].str.strip()
+    df['area_plantada_ha'] = df['area_plantada_ha'] * 1000
+    df['producao_toneladas'] = df['producao_toneladas'] * 1000
+    df['ano'] = df['ano_safra'].str.split('/').str[0].astype(int)
+    df['produto'] = df['produto'].str.strip()
+    # Poucos produtos distintos: calcula o slug uma vez por nome
+    slugs = {nome: slugify(nome) for nome in df['produto'].unique()}
+    df['produto_slug'] = df['produto'].map(slugs)
+    safras = {descricao: codigo_safra(descricao) for descricao in df['safra'].unique()}
+    df['safra'] = df['safra'].map(safras)
+    return df[COLUNAS_FINAIS]
+
+
+def em_tuplas(df):
+    """Linhas de um bloco transformado como tuplas na ordem de COLUNAS_FINAIS, ausentes como None."""
+    df = df[COLUNAS_FINAIS].astype(object)
+    return list(df.where(df.notna(), None).itertuples(index=False, name=None))
+
+
+def importar_serie_conab(caminho=ARQUIVO_LOCAL, tamanho_bloco=TAMANHO_BLOCO_PADRAO,
+                         tamanho_lote=TAMANHO_LOTE_PADRAO, medicao=None):
+    """
+    Lê, transforma e grava a série bloco a bloco numa `RecargaTabela` de
+    `SafraAnual`: cada bloco vai para a tabela-sombra assim que é
+    transformado, e a memória fica limitada a um bloco. Ao fim, a sombra é
+    conferida e trocada com a tabela em uso numa transação curta. Linhas
+    repetidas na mesma chave mantêm a última ocorrência. Levanta
+    `core.tabela_sombra.CargaInvalida` se a conferência falhar; nesse caso a
+    tabela em uso continua como estava.
+
+    Se `medicao` (`core.metricas.Medicao`) for informada, o tempo de leitura,
+    de transformação e de gravação de cada bloco, e o da conferência com a
+    troca, são somados às etapas correspondentes.
+    """
+    medicao = medicao or Medicao('conab')
+    inicio = time.perf_counter()
+    leitor = ler_serie_conab(caminho, tamanho_bloco)
+    with RecargaTabela(SafraAnual, COLUNAS_FINAIS, CHAVE_UNICA, MEDIDAS, tamanho_lote) as recarga:
+        while True:
+            with medicao.etapa('parse') as etapa:
+                bloco = next(leitor, None)
+                etapa.linhas = 0 if bloco is None else len(bloco)
+            if bloco is None:
+                break
+            with medicao.etapa('transformacao') as etapa:
+                linhas = em_tuplas(transformar_serie_conab(bloco))
+                etapa.linhas = len(linhas)
+            with medicao.etapa('carga') as etapa:
+                etapa.linhas = recarga.gravar(linhas)
+        with medicao.etapa('carga'):
+            troca = recarga.concluir()
+    return ResultadoCarga(
+        registros=troca.linhas, segundos=time.perf_counter() - inicio, segundos_troca=troca.segundos_troca,
+    )
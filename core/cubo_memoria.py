@@ -0,0 +1,150 @@
+"""
+Cópia em memória, por processo, de `SafraAnual` e `ClimaAnual` em arrays
+NumPy, para o gráfico do dashboard responder sem ir ao banco.
+
+As duas séries são pequenas (dezenas de milhares de linhas) e só mudam nas
+importações. Cada dimensão (ano, UF, produto, safra) vira um array de
+códigos inteiros e um vocabulário ordenado; filtros são máscaras booleanas
+e somas e médias por grupo são `np.bincount` sobre os códigos. O clima fica
+com uma linha por célula da grade, não por município.
+
+Os dados são carregados no primeiro uso em cada worker e recarregados
+quando a versão publicada no cache (`core.cache.versao_dados`, gravada por
+`invalidar_respostas` ao fim das importações) muda. A troca é a atribuição
+de uma única referência: uma consulta em andamento continua com a cópia
+antiga inteira, nunca com uma mistura das duas.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .cache import versao_dados
+from .models import ClimaAnual, SafraAnual
+
+DIMENSOES_SAFRAS = ['ano', 'uf', 'produto_slug', 'safra']
+MEDIDAS_SAFRAS = ['area_plantada_ha', 'producao_toneladas']
+DIMENSOES_CLIMA = ['ano', 'uf']
+MEDIDAS_CLIMA = ['precipitacao_total_mm']
+
+_dados = None
+_trava = threading.Lock()
+
+
+class TabelaCodificada:
+    """
+    Tabela colunar com dimensões codificadas em inteiros (`codigos[dim]`
+    indexa a lista ordenada `vocabularios[dim]`) e medidas em float64,
+    ausentes como NaN.
+    """
+
+    def __init__(self, df, dimensoes, medidas):
+        self.codigos, self.vocabularios, self._posicoes = {}, {}, {}
+        for dimensao in dimensoes:
+            codigos, vocabulario = pd.factorize(df[dimensao], sort=True)
+            self.codigos[dimensao] = codigos.astype(np.min_scalar_type(max(len(vocabulario) - 1, 0)))
+            self.vocabularios[dimensao] = vocabulario.tolist()
+            self._posicoes[dimensao] = {valor: i for i, valor in enumerate(self.vocabularios[dimensao])}
+        self.medidas = {
+            medida: pd.to_numeric(df[medida]).to_numpy(dtype=np.float64, na_value=np.nan) for medida in medidas
+        }
+        self.linhas = len(df)
+
+    @classmethod
+    def de_consulta(cls, consulta, dimensoes, medidas):
+        colunas = [*dimensoes, *medidas]
+        return cls(pd.DataFrame.from_records(consulta.values_list(*colunas), columns=colunas), dimensoes, medidas)
+
+    def mascara(self, **filtros):
+        """Linhas com cada dimensão igual ao valor pedido; None não filtra a dimensão."""
+        mascara = np.ones(self.linhas, dtype=bool)
+        for dimensao, valor in filtros.items():
+            if valor is None:
+                continue
+            codigo = self._posicoes[dimensao].get(valor)
+            if codigo is None:
+                return np.zeros(self.linhas, dtype=bool)
+            mascara &= self.codigos[dimensao] == codigo
+        return mascara
+
+    def _agrupar(self, medida, por, filtros):
+        """(códigos de `por` com linhas, contagem de valores, soma dos valores) por código."""
+        mascara = self.mascara(**filtros)
+        codigos, valores = self.codigos[por][mascara], self.medidas[medida][mascara]
+        tamanho = len(self.vocabularios[por])
+        presentes = np.flatnonzero(np.bincount(codigos, minlength=tamanho))
+        validos = ~np.isnan(valores)
+        contagem = np.bincount(codigos[validos], minlength=tamanho)
+        totais = np.bincount(codigos[validos], weights=valores[validos], minlength=tamanho)
+        return presentes, contagem, totais
+
+    def somar(self, medida, por, **filtros):
+        """
+        {valor de `por`: soma de `medida`} nas linhas que passam nos `filtros`.
+        Grupos com linhas mas sem nenhum valor da medida somam None, como o
+        SUM do banco.
+        """
+        presentes, contagem, totais = self._agrupar(medida, por, filtros)
+        vocabulario = self.vocabularios[por]
+        return {vocabulario[i]: float(totais[i]) if contagem[i] else None for i in presentes}
+
+    def media(self, medida, por, **filtros):
+        """{valor de `por`: média de `medida`} nas linhas que passam nos `filtros`; como o AVG, ignora ausentes."""
+        presentes, contagem, totais = self._agrupar(medida, por, filtros)
+        vocabulario = self.vocabularios[por]
+        return {vocabulario[i]: float(totais[i] / contagem[i]) if contagem[i] else None for i in presentes}
+
+
+def clima_por_celula():
+    """
+    `ClimaAnual` com uma linha por (ano, UF, célula da grade). As localidades
+    de uma célula repetem o mesmo resumo (ver `agregados.atualizar_clima_anual`);
+    somá-las contaria a célula uma vez por município.
+    """
+    colunas = ['ano', 'uf', 'celula_id', *MEDIDAS_CLIMA]
+    linhas = ClimaAnual.objects.filter(localidade__celula__isnull=False).values_list(
+        'ano', 'uf', 'localidade__celula_id', *MEDIDAS_CLIMA,
+    )
+    df = pd.DataFrame.from_records(linhas, columns=colunas)
+    return df.drop_duplicates(['ano', 'uf', 'celula_id'])
+
+
+class DadosEmMemoria:
+    """Safras e clima anual (uma linha por célula da grade) de uma versão dos dados."""
+
+    def __init__(self, versao):
+        self.versao = versao
+        self.safras = TabelaCodificada.de_consulta(SafraAnual.objects.all(), DIMENSOES_SAFRAS, MEDIDAS_SAFRAS)
+        self.clima = TabelaCodificada(clima_por_celula(), DIMENSOES_CLIMA, MEDIDAS_CLIMA)
+
+
+def dados_atuais(versao):
+    """
+    A cópia carregada neste processo, se for da `versao` dos dados (lida
+    pela view uma vez por requisição, com `cache.aversao_dados`); senão None.
+    Não consulta o cache nem o banco, então pode ser chamada no event loop.
+    """
+    dados = _dados
+    if dados is not None and dados.versao == versao:
+        return dados
+    return None
+
+
+def obter_dados(versao=None):
+    """
+    A cópia da `versao` dos dados (padrão: a publicada), carregando-a do
+    banco se preciso. A versão é lida antes da carga: se uma importação
+    terminar no meio, a cópia fica com a versão anterior e é recarregada
+    na próxima chamada.
+    """
+    global _dados
+    versao = versao_dados() if versao is None else versao
+    dados = _dados
+    if dados is not None and dados.versao == versao:
+        return dados
+    with _trava:
+        # Outra thread pode ter carregado enquanto esta esperava
+        dados = _dados
+        if dados is None or dados.versao != versao:
+            dados = _dados = DadosEmMemoria(versao)
+    return dados
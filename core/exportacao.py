@@ -0,0 +1,235 @@
+"""
+Exportação em massa de `SafraAnual`, de `DadoMeteorologicoDiario` (por célula
+da grade da NASA POWER, com o centro da célula) e das safras de cada UF
+junto do clima anual de cada localidade (`safras_clima`) em CSV, NDJSON ou
+Parquet.
+
+As linhas saem do banco com `.iterator(chunk_size=...)` (cursor do lado do
+servidor no PostgreSQL) e são convertidas pedaço a pedaço em geradores de
+bytes, então a memória não cresce com o tamanho do resultado e o primeiro
+pedaço sai assim que o banco devolve as primeiras linhas. Os mesmos
+geradores servem à API (`StreamingHttpResponse`) e ao comando
+`exportar_dados`.
+"""
+import csv
+import io
+import json
+from collections import defaultdict
+from datetime import date
+from itertools import islice
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .models import ClimaAnual, DadoMeteorologicoDiario, Localidade, SafraAnual
+
+TAMANHO_PEDACO = 5000
+
+CONJUNTOS = {
+    'safras': {
+        'modelo': SafraAnual,
+        'colunas': [
+            'ano', 'uf', 'produto', 'safra', 'produto_slug', 'codigo_produto',
+            'area_plantada_ha', 'producao_toneladas', 'produtividade_kg_ha',
+        ],
+        'ordem': ['ano', 'uf', 'produto', 'safra'],
+        'tipos': {
+            'ano': pa.int32(), 'uf': pa.string(), 'produto': pa.string(), 'safra': pa.string(),
+            'produto_slug': pa.string(), 'codigo_produto': pa.int32(), 'area_plantada_ha': pa.float64(),
+            'producao_toneladas': pa.float64(), 'produtividade_kg_ha': pa.float64(),
+        },
+    },
+    'clima': {
+        'modelo': DadoMeteorologicoDiario,
+        'colunas': [
+            'celula_id', 'celula__latitude', 'celula__longitude', 'data',
+            'precipitacao_mm', 'temp_maxima_c', 'temp_minima_c',
+        ],
+        'ordem': ['celula_id', 'data'],
+        'tipos': {
+            'celula_id': pa.int64(), 'celula__latitude': pa.float64(), 'celula__longitude': pa.float64(),
+            'data': pa.date32(), 'precipitacao_mm': pa.float64(),
+            'temp_maxima_c': pa.float64(), 'temp_minima_c': pa.float64(),
+        },
+    },
+    # Sem 'modelo': a consulta é um `SafrasComClima` (ver `montar_consulta`)
+    'safras_clima': {
+        'colunas': [
+            'ano', 'uf', 'localidade_id', 'localidade', 'produto', 'safra', 'produto_slug',
+            'area_plantada_ha', 'producao_toneladas', 'produtividade_kg_ha',
+            'precipitacao_total_mm', 'temp_maxima_media_c', 'temp_minima_media_c', 'dias_clima',
+        ],
+        'tipos': {
+            'ano': pa.int32(), 'uf': pa.string(), 'localidade_id': pa.int64(), 'localidade': pa.string(),
+            'produto': pa.string(), 'safra': pa.string(), 'produto_slug': pa.string(),
+            'area_plantada_ha': pa.float64(), 'producao_toneladas': pa.float64(),
+            'produtividade_kg_ha': pa.float64(), 'precipitacao_total_mm': pa.float64(),
+            'temp_maxima_media_c': pa.float64(), 'temp_minima_media_c': pa.float64(), 'dias_clima': pa.int32(),
+        },
+    },
+}
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+class SafrasComClima:
+    """
+    Consulta do conjunto `safras_clima`: cada `ClimaAnual` (localidade, ano)
+    combinado com cada `SafraAnual` da UF e do ano da localidade. Tem o
+    `iterator(chunk_size)` de um QuerySet, para servir aos mesmos geradores:
+    o clima sai do banco em pedaços, na ordem de ano, e as safras são lidas
+    um ano por vez, então a memória fica num pedaço do clima mais as safras
+    de um ano.
+    """
+
+    def __init__(self, clima, safras):
+        # `clima`: (ano, uf, localidade_id, localidade, medidas...); `safras`: (uf, colunas...)
+        self.clima = clima
+        self.safras = safras
+
+    def iterator(self, chunk_size):
+        ano_lido, safras_por_uf = None, {}
+        for ano, uf, localidade_id, nome, *clima in self.clima.iterator(chunk_size=chunk_size):
+            if ano != ano_lido:
+                safras_por_uf = defaultdict(list)
+                for uf_safra, *safra in self.safras.filter(ano=ano):
+                    safras_por_uf[uf_safra].append(safra)
+                ano_lido = ano
+            for safra in safras_por_uf.get(uf, ()):
+                yield (ano, uf, localidade_id, nome, *safra, *clima)
+
+
+def _consulta_safras_clima(uf=None, ano_inicio=None, ano_fim=None, produto=None, localidade=None):
+    clima = ClimaAnual.objects.order_by('ano', 'uf', 'localidade__nome', 'localidade_id')
+    safras = SafraAnual.objects.order_by('produto', 'safra')
+    if uf:
+        clima, safras = clima.filter(uf=uf), safras.filter(uf=uf)
+    if ano_inicio:
+        clima = clima.filter(ano__gte=ano_inicio)
+    if ano_fim:
+        clima = clima.filter(ano__lte=ano_fim)
+    if produto:
+        safras = safras.filter(produto_slug=produto)
+    if localidade:
+        clima = clima.filter(localidade_id=localidade)
+    return SafrasComClima(
+        clima.values_list(
+            'ano', 'uf', 'localidade_id', 'localidade__nome',
+            'precipitacao_total_mm', 'temp_maxima_media_c', 'temp_minima_media_c', 'dias',
+        ),
+        safras.values_list(
+            'uf', 'produto', 'safra', 'produto_slug', 'area_plantada_ha', 'producao_toneladas', 'produtividade_kg_ha',
+        ),
+    )
+
+
+def montar_consulta(conjunto, uf=None, ano_inicio=None, ano_fim=None, produto=None,
+                    localidade=None, inicio=None, fim=None):
+    """Consulta filtrada de `conjunto`; filtros que não se aplicam ao conjunto são ignorados."""
+    if conjunto == 'safras_clima':
+        return _consulta_safras_clima(uf, ano_inicio, ano_fim, produto, localidade)
+    definicao = CONJUNTOS[conjunto]
+    consulta = definicao['modelo'].objects.order_by(*definicao['ordem'])
+    if conjunto == 'safras':
+        if uf:
+            consulta = consulta.filter(uf=uf)
+        if produto:
+            consulta = consulta.filter(produto_slug=produto)
+        if ano_inicio:
+            consulta = consulta.filter(ano__gte=ano_inicio)
+        if ano_fim:
+            consulta = consulta.filter(ano__lte=ano_fim)
+    else:
+        # Filtros de localidade viram filtros pelas células das localidades
+        if uf:
+            consulta = consulta.filter(celula_id__in=Localidade.objects.filter(uf=uf).values('celula_id'))
+        if localidade:
+            consulta = consulta.filter(celula_id__in=Localidade.objects.filter(pk=localidade).values('celula_id'))
+        # Intervalo em `data` também limita as partições lidas (ver core/particoes.py)
+        if inicio or ano_inicio:
+            consulta = consulta.filter(data__gte=inicio or date(ano_inicio, 1, 1))
+        if fim or ano_fim:
+            consulta = consulta.filter(data__lte=fim or date(ano_fim, 12, 31))
+    return consulta.values_list(*definicao['colunas'])
+
+
+def _pedacos(consulta, tamanho_pedaco):
+    linhas = consulta.iterator(chunk_size=tamanho_pedaco)
+    while True:
+        pedaco = list(islice(linhas, tamanho_pedaco))
+        if not pedaco:
+            return
+        yield pedaco
+
+
+def gerar_csv(conjunto, consulta, tamanho_pedaco=TAMANHO_PEDACO):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(CONJUNTOS[conjunto]['colunas'])
+    for pedaco in _pedacos(consulta, tamanho_pedaco):
+        escritor.writerows(pedaco)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def gerar_ndjson(conjunto, consulta, tamanho_pedaco=TAMANHO_PEDACO):
+    colunas = CONJUNTOS[conjunto]['colunas']
+    for pedaco in _pedacos(consulta, tamanho_pedaco):
+        yield ''.join(
+            json.dumps(dict(zip(colunas, linha)), default=date.isoformat, ensure_ascii=False) + '\n'
+            for linha in pedaco
+        ).encode()
+
+
+class _SaidaEmPedacos(io.RawIOBase):
+    """Arquivo só de escrita que acumula bytes até serem recolhidos com `esvaziar`."""
+
+    def __init__(self):
+        self.pedacos = []
+        self.posicao = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self.pedacos.append(bytes(dados))
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self.posicao
+
+    def esvaziar(self):
+        dados = b''.join(self.pedacos)
+        self.pedacos = []
+        return dados
+
+
+def gerar_parquet(conjunto, consulta, tamanho_pedaco=TAMANHO_PEDACO):
+    """Parquet gerado como fluxo: cada pedaço vira um row group e é enviado em seguida."""
+    definicao = CONJUNTOS[conjunto]
+    esquema = pa.schema([(coluna, definicao['tipos'][coluna]) for coluna in definicao['colunas']])
+    saida = _SaidaEmPedacos()
+    with pq.ParquetWriter(saida, esquema, compression='zstd') as escritor:
+        for pedaco in _pedacos(consulta, tamanho_pedaco):
+            colunas = zip(*pedaco)
+            escritor.write_table(pa.Table.from_arrays(
+                [pa.array(valores, type=campo.type) for valores, campo in zip(colunas, esquema)],
+                schema=esquema,
+            ))
+            yield saida.esvaziar()
+    yield saida.esvaziar()
+
+
+GERADORES = {'csv': gerar_csv, 'ndjson': gerar_ndjson, 'parquet': gerar_parquet}
+
+
+def exportar(conjunto, formato, tamanho_pedaco=TAMANHO_PEDACO, **filtros):
+    """Gerador de bytes de `conjunto` no `formato` pedido, com os `filtros` de `montar_consulta`."""
+    return GERADORES[formato](conjunto, montar_consulta(conjunto, **filtros), tamanho_pedaco)
@@ -0,0 +1,49 @@
+"""
+Grade da NASA POWER. Os dados diários de temperatura e precipitação vêm
+do MERRA-2, numa grade de 0,5° de latitude x 0,625° de longitude, e a API
+devolve o valor da célula para qualquer ponto dentro dela. Municípios
+vizinhos costumam cair na mesma célula, então a série é buscada e gravada
+uma vez por `CelulaGrade`, e cada `Localidade` aponta para a sua célula.
+"""
+from .models import CelulaGrade, Localidade
+
+PASSO_LATITUDE = 0.5
+PASSO_LONGITUDE = 0.625
+
+
+def indices_celula(latitude, longitude):
+    """(linha, coluna) da célula cujo centro é o mais próximo do ponto."""
+    return round((latitude + 90) / PASSO_LATITUDE), round((longitude + 180) / PASSO_LONGITUDE)
+
+
+def centro_celula(linha, coluna):
+    """Latitude e longitude do centro da célula (linha, coluna)."""
+    return -90 + linha * PASSO_LATITUDE, -180 + coluna * PASSO_LONGITUDE
+
+
+def obter_celulas(indices):
+    """{(linha, coluna): CelulaGrade} para os `indices`, criando as células que faltam."""
+    indices = set(indices)
+    CelulaGrade.objects.bulk_create(
+        [
+            CelulaGrade(linha=linha, coluna=coluna, latitude=lat, longitude=lon)
+            for linha, coluna in indices
+            for lat, lon in [centro_celula(linha, coluna)]
+        ],
+        ignore_conflicts=True,
+    )
+    return {(c.linha, c.coluna): c for c in CelulaGrade.objects.all() if (c.linha, c.coluna) in indices}
+
+
+def atribuir_celulas(localidades=None):
+    """
+    Liga cada localidade (todas, se None) à célula da grade que a contém,
+    criando as células que faltam. Retorna o número de células usadas.
+    """
+    localidades = list(Localidade.objects.all() if localidades is None else localidades)
+    indices = {local.pk: indices_celula(local.latitude, local.longitude) for local in localidades}
+    celulas = obter_celulas(indices.values())
+    for local in localidades:
+        local.celula = celulas[indices[local.pk]]
+    Localidade.objects.bulk_update(localidades, ['celula'])
+    return len(set(indices.values()))
@@ -0,0 +1,144 @@
+"""
+Indicadores agroclimáticos por localidade e safra (`IndicadorSafra`).
+
+A série diária de todas as células da grade é carregada como matrizes
+(dias x células), e cada indicador é calculado com operações vetoriais
+sobre a matriz inteira, sem laço por célula:
+
+- graus-dia: soma de max(0, (tmax + tmin) / 2 - TEMP_BASE_GRAUS_DIA);
+- chuva em janela móvel: maior soma de JANELA_CHUVA_DIAS dias seguidos;
+- veranico: maior sequência de dias com chuva abaixo de LIMIAR_DIA_SECO_MM;
+- estresse térmico: dias com tmax acima de LIMIAR_ESTRESSE_CALOR_C.
+
+A safra vai de julho a junho e recebe o ano de início, como `SafraAnual.ano`.
+Os indicadores de cada célula são gravados para todas as localidades dela.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .models import DadoMeteorologicoDiario, IndicadorSafra, Localidade
+
+MES_INICIO_SAFRA = 7
+TEMP_BASE_GRAUS_DIA = 10.0
+LIMIAR_DIA_SECO_MM = 1.0
+LIMIAR_ESTRESSE_CALOR_C = 35.0
+JANELA_CHUVA_DIAS = 30
+
+COLUNAS_SERIE = ['precipitacao_mm', 'temp_maxima_c', 'temp_minima_c']
+CAMPOS_INDICADORES = [
+    'graus_dia', 'precipitacao_total_mm', 'chuva_maxima_janela_mm',
+    'maior_veranico_dias', 'dias_estresse_calor', 'dias',
+]
+
+
+def periodo_safra(ano):
+    """Primeiro e último dia da safra que começa em `ano`."""
+    return date(ano, MES_INICIO_SAFRA, 1), date(ano + 1, MES_INICIO_SAFRA, 1) - timedelta(days=1)
+
+
+def safras_dos_anos(anos):
+    """Safras que contêm algum dia dos anos civis `anos`."""
+    return sorted({safra for ano in anos for safra in (ano - 1, ano)})
+
+
+def carregar_series(safras, celulas=None):
+    """
+    Lê a série diária das `safras` (mais os dias anteriores que a janela
+    móvel precisa) e devolve {coluna: DataFrame dias x células}, com o
+    calendário completo; dias sem medição ficam NaN.
+    """
+    inicio = periodo_safra(min(safras))[0] - timedelta(days=JANELA_CHUVA_DIAS - 1)
+    fim = periodo_safra(max(safras))[1]
+    consulta = DadoMeteorologicoDiario.objects.filter(data__gte=inicio, data__lte=fim)
+    if celulas is not None:
+        consulta = consulta.filter(celula_id__in=list(celulas))
+    colunas = ['celula_id', 'data'] + COLUNAS_SERIE
+    df = pd.DataFrame.from_records(consulta.values_list(*colunas).iterator(chunk_size=20000), columns=colunas)
+
+    calendario = pd.date_range(inicio, fim, freq='D')
+    df['data'] = pd.to_datetime(df['data'])
+    return {
+        coluna: df.pivot(index='data', columns='celula_id', values=coluna).reindex(calendario)
+        for coluna in COLUNAS_SERIE
+    }
+
+
+def _maiores_sequencias(condicao, reinicio):
+    """
+    Para cada dia e coluna, o tamanho da sequência de dias consecutivos em
+    que `condicao` vale, terminando naquele dia. A contagem recomeça nas
+    linhas marcadas em `reinicio` (início de cada safra).
+    """
+    acumulado = np.cumsum(condicao, axis=0)
+    quebras = ~condicao | reinicio[:, None]
+    base = np.where(quebras, acumulado - condicao, 0)
+    return acumulado - np.maximum.accumulate(base, axis=0)
+
+
+def calcular_indicadores(series):
+    """
+    Calcula os indicadores de todas as células e safras presentes em
+    `series` (saída de `carregar_series`). Devolve um DataFrame com as
+    colunas celula_id, ano e CAMPOS_INDICADORES.
+    """
+    chuva = series['precipitacao_mm']
+    tmax = series['temp_maxima_c']
+    tmin = series['temp_minima_c']
+    datas = chuva.index
+    safra = np.asarray(datas.year - (datas.month < MES_INICIO_SAFRA))
+    inicio_safra = np.asarray((datas.month == MES_INICIO_SAFRA) & (datas.day == 1))
+
+    graus = ((tmax + tmin) / 2 - TEMP_BASE_GRAUS_DIA).clip(lower=0)
+    janela = chuva.rolling(JANELA_CHUVA_DIAS, min_periods=JANELA_CHUVA_DIAS).sum()
+    seco = (chuva < LIMIAR_DIA_SECO_MM).to_numpy(dtype=bool)
+    veranico = pd.DataFrame(_maiores_sequencias(seco, inicio_safra), index=datas, columns=chuva.columns)
+    calor = tmax > LIMIAR_ESTRESSE_CALOR_C
+
+    por_safra = {
+        'graus_dia': graus.groupby(safra).sum(min_count=1),
+        'precipitacao_total_mm': chuva.groupby(safra).sum(min_count=1),
+        'chuva_maxima_janela_mm': janela.groupby(safra).max(),
+        'maior_veranico_dias': veranico.groupby(safra).max(),
+        'dias_estresse_calor': calor.groupby(safra).sum(),
+        'dias': (chuva.notna() | tmax.notna() | tmin.notna()).groupby(safra).sum(),
+    }
+    # Todas as matrizes têm as mesmas safras (linhas) e células (colunas)
+    referencia = por_safra['dias']
+    resultado = pd.DataFrame({
+        'ano': np.repeat(referencia.index.to_numpy(), len(referencia.columns)),
+        'celula_id': np.tile(referencia.columns.to_numpy(), len(referencia.index)),
+        **{campo: matriz.to_numpy().ravel() for campo, matriz in por_safra.items()},
+    })
+    return resultado[resultado['dias'] > 0]
+
+
+def atualizar_indicadores(safras=None, celulas=None):
+    """
+    Recalcula e grava `IndicadorSafra` das `safras` (todas, se None) para as
+    localidades das `celulas` da grade (todas, se None), num único upsert.
+    """
+    if safras is None:
+        anos = DadoMeteorologicoDiario.objects.dates('data', 'year')
+        safras = safras_dos_anos([d.year for d in anos])
+    safras = sorted(set(safras))
+    if not safras:
+        return 0
+
+    indicadores = calcular_indicadores(carregar_series(safras, celulas))
+    indicadores = indicadores[indicadores['ano'].isin(safras)]
+    localidades = pd.DataFrame.from_records(
+        Localidade.objects.filter(celula__isnull=False).values_list('pk', 'uf', 'celula_id'),
+        columns=['localidade_id', 'uf', 'celula_id'],
+    )
+    indicadores = indicadores.merge(localidades, on='celula_id').drop(columns=['celula_id'])
+    indicadores = indicadores.astype(object).where(indicadores.notna(), None)
+    objetos = [IndicadorSafra(**item) for item in indicadores.to_dict('records')]
+    IndicadorSafra.objects.bulk_create(
+        objetos,
+        update_conflicts=True,
+        unique_fields=['localidade', 'ano'],
+        update_fields=['uf'] + CAMPOS_INDICADORES,
+    )
+    return len(objetos)
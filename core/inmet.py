@@ -0,0 +1,222 @@
+"""
+Importação das estações automáticas do INMET: cadastro das estações,
+divisão do histórico em fatias (estação, período), busca concorrente e
+gravação em lote de `DadoEstacaoDiario`.
+"""
+from datetime import date, datetime
+from urllib.parse import urlsplit
+
+import pandas as pd
+from django.conf import settings
+
+from .checkpoints import concluir_unidade, falhar_unidade, hash_conteudo, unidades_a_refazer
+from .coleta import ColetorConcorrente
+from .metricas import Medicao
+from .models import DadoEstacaoDiario, EstacaoMeteorologica
+from .respostas_brutas import criar_armazem
+
+BASE_URL = "https://apitempo.inmet.gov.br"
+
+# Campo do registro horário de /estacao/<inicio>/<fim>/<codigo> -> coluna de
+# DadoEstacaoDiario, com a agregação que leva as horas ao dia: CHUVA é a
+# chuva da hora em mm, TEM_MAX/TEM_MIN são os extremos da hora e UMD_INS a
+# umidade relativa instantânea (PRE_* são pressões em hPa, não chuva)
+CAMPOS_INMET = {
+    'CHUVA': ('precipitacao_mm', 'sum'),
+    'TEM_MAX': ('temp_maxima_c', 'max'),
+    'TEM_MIN': ('temp_minima_c', 'min'),
+    'UMD_INS': ('umidade_media_porc', 'mean'),
+}
+COLUNAS_VALORES = [coluna for coluna, _ in CAMPOS_INMET.values()]
+
+TAMANHO_LOTE_ESTACAO = 1000
+
+
+def criar_coletor(max_simultaneas=None, replay=False):
+    """
+    Coletor HTTP configurado pelos parâmetros INMET_* do settings, com o
+    armazém de respostas brutas. Com `replay`, lê só do armazém, sem rede.
+    """
+    if replay:
+        # Uma resposta por vez, na ordem de `fatias_armazenadas` (a mais nova vale)
+        return ColetorConcorrente(
+            max_simultaneas=1, requisicoes_por_segundo=None, tentativas=1,
+            armazem=criar_armazem('inmet', fim_da_url, somente_local=True),
+        )
+    return ColetorConcorrente(
+        max_simultaneas=max_simultaneas or settings.INMET_MAX_SIMULTANEAS,
+        requisicoes_por_segundo=settings.INMET_REQUISICOES_POR_SEGUNDO,
+        tentativas=settings.INMET_TENTATIVAS,
+        timeout=30.0,
+        armazem=criar_armazem('inmet', fim_da_url),
+    )
+
+
+def cadastrar_estacoes(uf='MT', coletor=None):
+    """Busca as estações automáticas da `uf` na API e grava todas num único upsert."""
+    coletor = coletor or criar_coletor(max_simultaneas=1)
+    todas_estacoes = coletor.obter_json(f"{BASE_URL}/estacoes/T") or []
+
+    estacoes = [
+        EstacaoMeteorologica(
+            codigo=dados['CD_ESTACAO'],
+            nome=dados['DC_NOME'],
+            uf=dados['SG_ESTADO'],
+            latitude=float(dados['VL_LATITUDE']),
+            longitude=float(dados['VL_LONGITUDE']),
+            altitude=float(dados['VL_ALTITUDE']) if dados.get('VL_ALTITUDE') else None,
+            data_inicio_operacao=(
+                datetime.strptime(dados['DT_INICIO_OPERACAO'].split('T')[0], '%Y-%m-%d').date()
+                if dados.get('DT_INICIO_OPERACAO') else None
+            ),
+        )
+        for dados in todas_estacoes if dados.get('SG_ESTADO') == uf
+    ]
+    EstacaoMeteorologica.objects.bulk_create(
+        estacoes,
+        update_conflicts=True,
+        unique_fields=['codigo'],
+        update_fields=['nome', 'uf', 'latitude', 'longitude', 'altitude', 'data_inicio_operacao'],
+    )
+    return len(estacoes)
+
+
+def planejar_fatias(estacoes, anos, meses_por_fatia=6, hoje=None):
+    """
+    Divide o histórico de cada estação em fatias (estacao, inicio, fim) de
+    `meses_por_fatia` meses dentro dos `anos` pedidos, a partir do início de
+    operação da estação e sem passar de hoje. Datas no formato AAAA-MM-DD.
+    """
+    hoje = hoje or date.today()
+    fatias = []
+    for estacao in estacoes:
+        for ano in sorted(set(anos)):
+            for mes in range(1, 13, meses_por_fatia):
+                inicio = date(ano, mes, 1)
+                fim = (pd.Timestamp(inicio) + pd.DateOffset(months=meses_por_fatia) - pd.Timedelta(days=1)).date()
+                if estacao.data_inicio_operacao:
+                    inicio = max(inicio, estacao.data_inicio_operacao)
+                fim = min(fim, hoje)
+                if inicio <= fim:
+                    fatias.append((estacao, inicio.isoformat(), fim.isoformat()))
+    return fatias
+
+
+def fatias_a_refazer():
+    """Fatias (estacao, inicio, fim) pendentes ou com falha nos checkpoints do INMET."""
+    fatias = unidades_a_refazer('inmet')
+    estacoes = EstacaoMeteorologica.objects.in_bulk({codigo for codigo, _, _ in fatias}, field_name='codigo')
+    return [(estacoes[codigo], inicio, fim) for codigo, inicio, fim in fatias if codigo in estacoes]
+
+
+def montar_url(codigo, inicio, fim):
+    return f"{BASE_URL}/estacao/{inicio}/{fim}/{codigo}"
+
+
+def interpretar_url(url):
+    """(codigo, inicio, fim) de uma URL montada por `montar_url`, ou None para outras URLs."""
+    partes = urlsplit(url).path.strip('/').split('/')
+    if len(partes) != 4 or partes[0] != 'estacao':
+        return None
+    _, inicio, fim, codigo = partes
+    return codigo, inicio, fim
+
+
+def fim_da_url(url):
+    """Último dia pedido numa URL de dados diários (None para a lista de estações)."""
+    fatia = interpretar_url(url)
+    return date.fromisoformat(fatia[2]) if fatia else None
+
+
+def fatias_armazenadas(armazem):
+    """
+    Fatias (estacao, inicio, fim) de todas as respostas de dados diários
+    guardadas no `armazem`, da mais antiga para a mais nova, para o replay.
+    Fatias de estações que não estão cadastradas são ignoradas.
+    """
+    fatias = []
+    for entrada in armazem.entradas():
+        fatia = interpretar_url(entrada['url'])
+        if fatia:
+            fatias.append(fatia)
+    estacoes = EstacaoMeteorologica.objects.in_bulk({codigo for codigo, _, _ in fatias}, field_name='codigo')
+    return [(estacoes[codigo], inicio, fim) for codigo, inicio, fim in fatias if codigo in estacoes]
+
+
+def parse_registros(registros):
+    """
+    Converte a lista de registros da API em um DataFrame indexado pela data,
+    com um valor por dia e coluna.
+    """
+    if not registros:
+        return pd.DataFrame(columns=COLUNAS_VALORES)
+    df = pd.DataFrame.from_records(registros)
+    for campo in CAMPOS_INMET:
+        if campo not in df:
+            df[campo] = None
+    valores = df[list(CAMPOS_INMET)].apply(pd.to_numeric, errors='coerce')
+    valores.columns = COLUNAS_VALORES
+    valores['data'] = pd.to_datetime(df['DT_MEDICAO'], format='%Y-%m-%d').dt.date
+    # Soma com min_count=1 mantém NaN (e não 0) em dias sem nenhuma medição
+    agregacoes = {
+        coluna: (lambda serie: serie.sum(min_count=1)) if funcao == 'sum' else funcao
+        for coluna, funcao in CAMPOS_INMET.values()
+    }
+    return valores.groupby('data').agg(agregacoes)
+
+
+def gravar_dados_estacao(estacao_id, df, tamanho_lote=TAMANHO_LOTE_ESTACAO):
+    """Grava `df` (saída de `parse_registros`) com INSERT ... ON CONFLICT (estacao, data) DO UPDATE."""
+    if df.empty:
+        return 0
+    df = df.astype(object).where(df.notna(), None)
+    objetos = [
+        DadoEstacaoDiario(estacao_id=estacao_id, data=data, **valores)
+        for data, valores in zip(df.index, df[COLUNAS_VALORES].to_dict('records'))
+    ]
+    DadoEstacaoDiario.objects.bulk_create(
+        objetos,
+        batch_size=tamanho_lote,
+        update_conflicts=True,
+        unique_fields=['estacao', 'data'],
+        update_fields=COLUNAS_VALORES,
+    )
+    return len(objetos)
+
+
+def importar_fatias(fatias, coletor=None, medicao=None, execucao=None):
+    """
+    Busca as fatias (estacao, inicio, fim) com o pool de workers do coletor e
+    grava cada uma assim que a resposta chega.
+
+    Gera (estacao, inicio, fim, gravados, erro) por fatia. Tempos, requisições
+    e falhas vão para `medicao`, se informada, e o resultado de cada fatia
+    para o checkpoint da `execucao` (`ExecucaoImportacao`), se informada.
+    """
+    coletor = coletor or criar_coletor()
+    medicao = medicao or Medicao('inmet')
+    coletor.medicao = medicao
+    tarefas = (
+        ((estacao, inicio, fim), montar_url(estacao.codigo, inicio, fim))
+        for estacao, inicio, fim in fatias
+    )
+    for (estacao, inicio, fim), dados, erro in coletor.executar(tarefas):
+        gravados = 0
+        if erro is None:
+            try:
+                with medicao.etapa('parse') as etapa:
+                    df = parse_registros(dados)
+                    etapa.linhas = len(df)
+                with medicao.etapa('carga') as etapa:
+                    gravados = etapa.linhas = gravar_dados_estacao(estacao.id, df)
+            except Exception as e:
+                erro = e
+        if erro is None:
+            medicao.unidade_concluida()
+            if execucao:
+                concluir_unidade(execucao.id, 'inmet', estacao.codigo, inicio, fim, gravados, hash_conteudo(dados))
+        else:
+            medicao.registrar_erro(f'{estacao.codigo} {inicio}-{fim}', erro)
+            if execucao:
+                falhar_unidade(execucao.id, 'inmet', estacao.codigo, inicio, fim, erro)
+        yield estacao, inicio, fim, gravados, erro
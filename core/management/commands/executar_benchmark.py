@@ -0,0 +1,99 @@
+import json
+import tempfile
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from core.benchmark import (
+    ANOS_NASA_PADRAO, ESCALAS_PADRAO, REPETICOES_PADRAO, TOLERANCIA_PADRAO,
+    comparar_relatorios, executar_benchmark,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede importações, agregados e API com dados sintéticos em várias escalas, '
+        'num banco de teste descartável, e grava um relatório JSON comparável.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--escalas', default=','.join(map(str, ESCALAS_PADRAO)),
+            help='Múltiplos do volume atual, separados por vírgula (padrão: %(default)s; ex: 1,10,100).'
+        )
+        parser.add_argument('--anos-nasa', type=int, default=ANOS_NASA_PADRAO,
+                            help='Anos de dados diários por localidade (padrão: %(default)s).')
+        parser.add_argument('--repeticoes', type=int, default=REPETICOES_PADRAO,
+                            help='Chamadas por endpoint da API em cada modo (padrão: %(default)s).')
+        parser.add_argument('--max-simultaneas', type=int, default=None,
+                            help='Requisições simultâneas na carga da NASA (padrão: NASA_POWER_MAX_SIMULTANEAS).')
+        parser.add_argument('--sem-memoria', action='store_true',
+                            help='Não mede o pico de memória (tracemalloc deixa tudo mais lento).')
+        parser.add_argument('--saida', default=None,
+                            help='Arquivo do relatório (padrão: benchmark-AAAAMMDD-HHMMSS.json).')
+        parser.add_argument('--dados', default=None,
+                            help='Diretório dos arquivos sintéticos (padrão: diretório temporário).')
+        parser.add_argument('--comparar', default=None,
+                            help='Relatório anterior; termina com erro se alguma métrica piorar além da tolerância.')
+        parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_PADRAO,
+                            help='Piora relativa aceita na comparação (padrão: %(default)s).')
+        parser.add_argument('--manter-banco', action='store_true',
+                            help='Reaproveita o banco de teste e não o apaga no final.')
+
+    def handle(self, *args, **options):
+        try:
+            escalas = [int(escala) for escala in options['escalas'].split(',')]
+        except ValueError:
+            raise CommandError('--escalas deve ser uma lista de inteiros, ex: 1,10,100.')
+        saida = options['saida'] or f'benchmark-{datetime.now():%Y%m%d-%H%M%S}.json'
+
+        # Banco de teste (test_<NAME>) e cache local: os dados de produção não são tocados
+        setup_test_environment()
+        nome_original = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['manter_banco'])
+        try:
+            with tempfile.TemporaryDirectory() as temporario, override_settings(CACHES={
+                'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            }):
+                relatorio = executar_benchmark(
+                    escalas,
+                    diretorio=options['dados'] or temporario,
+                    anos_nasa=options['anos_nasa'],
+                    repeticoes=options['repeticoes'],
+                    memoria=not options['sem_memoria'],
+                    max_simultaneas=options['max_simultaneas'],
+                    relatar=self.stdout.write,
+                )
+        finally:
+            connection.creation.destroy_test_db(nome_original, verbosity=0, keepdb=options['manter_banco'])
+            teardown_test_environment()
+
+        with open(saida, 'w') as arquivo:
+            json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+        for escala, resultado in relatorio['escalas'].items():
+            self.stdout.write(
+                f"{escala}x: Conab {resultado['conab']['carga_inicial']['linhas_por_segundo']:.0f} linhas/s, "
+                f"NASA {resultado['nasa']['linhas_por_segundo']:.0f} linhas/s, "
+                f"chart-data {resultado['api']['chart_data']['sem_cache']['mediana_ms']:.1f} ms sem cache"
+            )
+        self.stdout.write(self.style.SUCCESS(f'Relatório gravado em {saida}.'))
+
+        if options['comparar']:
+            self.comparar(options['comparar'], relatorio, options['tolerancia'])
+
+    def comparar(self, caminho, relatorio, tolerancia):
+        with open(caminho) as arquivo:
+            anterior = json.load(arquivo)
+        if anterior.get('parametros') != relatorio['parametros'] or anterior.get('ambiente') != relatorio['ambiente']:
+            self.stdout.write(self.style.WARNING('Os relatórios foram gerados com parâmetros ou ambientes diferentes.'))
+        regressoes = 0
+        for metrica, antes, depois, variacao, regressao in comparar_relatorios(anterior, relatorio, tolerancia):
+            linha = f'  {metrica}: {antes} -> {depois} ({variacao:+.1%})'
+            if regressao:
+                regressoes += 1
+                self.stdout.write(self.style.ERROR(linha))
+            elif abs(variacao) > tolerancia:
+                self.stdout.write(self.style.SUCCESS(linha))
+        if regressoes:
+            raise CommandError(f'{regressoes} métricas pioraram mais de {tolerancia:.0%} em relação a {caminho}.')
+        self.stdout.write(self.style.SUCCESS(f'Nenhuma regressão acima de {tolerancia:.0%} em relação a {caminho}.'))
@@ -0,0 +1,45 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from core.exportacao import CONJUNTOS, FORMATOS, TAMANHO_PEDACO, exportar
+
+
+class Command(BaseCommand):
+    help = (
+        'Exporta SafraAnual, os dados meteorológicos diários ou as safras junto do clima anual de cada '
+        'localidade em CSV, NDJSON ou Parquet, em fluxo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('conjunto', choices=list(CONJUNTOS), help='Dados a exportar.')
+        parser.add_argument('saida', help='Arquivo de saída.')
+        parser.add_argument('--formato', choices=list(FORMATOS), default=None,
+                            help='Formato do arquivo (padrão: pela extensão da saída).')
+        parser.add_argument('--uf', default=None, help='Filtra pela UF.')
+        parser.add_argument('--produto', default=None, help='Filtra safras pelo produto (slug, ex: soja).')
+        parser.add_argument('--ano-inicio', type=int, default=None, help='Primeiro ano exportado.')
+        parser.add_argument('--ano-fim', type=int, default=None, help='Último ano exportado.')
+        parser.add_argument('--localidade', type=int, default=None, help='Filtra o clima (e safras_clima) pela localidade (id).')
+        parser.add_argument('--inicio', type=date.fromisoformat, default=None, help='Primeiro dia do clima (AAAA-MM-DD).')
+        parser.add_argument('--fim', type=date.fromisoformat, default=None, help='Último dia do clima (AAAA-MM-DD).')
+        parser.add_argument('--tamanho-pedaco', type=int, default=TAMANHO_PEDACO,
+                            help='Linhas lidas do banco por vez (padrão: %(default)s).')
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or options['saida'].rsplit('.', 1)[-1]
+        if formato not in FORMATOS:
+            self.stdout.write(self.style.ERROR(f"Formato desconhecido: {formato}. Use --formato {'/'.join(FORMATOS)}."))
+            return
+
+        filtros = {
+            chave: options[chave]
+            for chave in ('uf', 'produto', 'ano_inicio', 'ano_fim', 'localidade', 'inicio', 'fim')
+        }
+        if filtros['uf']:
+            filtros['uf'] = filtros['uf'].upper()
+
+        tamanho = 0
+        with open(options['saida'], 'wb') as arquivo:
+            for pedaco in exportar(options['conjunto'], formato, options['tamanho_pedaco'], **filtros):
+                arquivo.write(pedaco)
+                tamanho += len(pedaco)
+        self.stdout.write(self.style.SUCCESS(f"{options['conjunto']} exportado em {options['saida']} ({tamanho} bytes)."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from core.snapshots import exportar_clima_diario, exportar_safras, remover_particoes_por_localidade
+
+class Command(BaseCommand):
+    help = 'Exporta SafraAnual e DadoMeteorologicoDiario inteiros para os snapshots Parquet particionados.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.NOTICE('Exportando snapshots Parquet...'))
+        safras = exportar_safras()
+        antigas = remover_particoes_por_localidade()
+        if antigas:
+            self.stdout.write(f'{antigas} partições de clima por localidade (anteriores à grade) apagadas.')
+        clima = exportar_clima_diario()
+        self.stdout.write(self.style.SUCCESS(f'Snapshots gravados: {safras} safras e {clima} dias de clima.'))
@@ -1,102 +1,97 @@
-import requests
-from datetime import datetime
-from django.core.management.base import BaseCommand
-from core.models import SafraAnual, EstacaoMeteorologica, DadoMeteorologicoDiario
+from operator import attrgetter
+from django.core.management.base import BaseCommand, CommandError
+from core.checkpoints import finalizar_execucao, iniciar_execucao, retomar
+from core.inmet import (
+    cadastrar_estacoes, criar_coletor, fatias_a_refazer, fatias_armazenadas, importar_fatias, planejar_fatias,
+)
+from core.metricas import Medicao, formatar_resumo
+from core.models import SafraAnual, EstacaoMeteorologica
 
 class Command(BaseCommand):
     help = 'Busca e importa dados das estações meteorológicas e seus registros diários do INMET.'
 
-    BASE_URL = "https://apitempo.inmet.gov.br"
+    def add_arguments(self, parser):
+        parser.add_argument('--uf', default='MT', help='UF das estações a importar (padrão: %(default)s).')
+        parser.add_argument(
+            '--max-simultaneas', type=int, default=None,
+            help='Requisições simultâneas à API (padrão: INMET_MAX_SIMULTANEAS).'
+        )
+        parser.add_argument(
+            '--meses-por-fatia', type=int, default=6,
+            help='Meses de dados pedidos em cada requisição (padrão: %(default)s).'
+        )
+        parser.add_argument(
+            '--somente-falhas', action='store_true',
+            help='Refaz apenas as fatias pendentes ou com falha nas execuções anteriores.'
+        )
+        parser.add_argument(
+            '--replay', action='store_true',
+            help='Regrava estações e dados diários a partir das respostas guardadas em RESPOSTAS_BRUTAS_DIR, '
+                 'sem acessar a API.'
+        )
 
     def handle(self, *args, **options):
         self.stdout.write(self.style.NOTICE('Iniciando importação de dados do INMET...'))
-
-        # FASE 1: Cadastrar as estações de Mato Grosso
-        self.cadastrar_estacoes()
-
-        # FASE 2: Buscar dados diários para as estações e anos relevantes
-        self.importar_dados_diarios()
-
-        self.stdout.write(self.style.SUCCESS('Importação de dados do INMET concluída com sucesso!'))
-
-    def cadastrar_estacoes(self):
-        """Busca todas as estações de MT na API do INMET e salva no banco de dados."""
-        self.stdout.write(self.style.HTTP_INFO('Buscando e cadastrando estações de MT...'))
+        medicao = Medicao('inmet')
+        # O replay só relê respostas guardadas; não entra no registro de execuções
+        execucao = None if options['replay'] else iniciar_execucao('inmet')
+        coletor = criar_coletor(options['max_simultaneas'], replay=options['replay'])
+        coletor.medicao = medicao
+
+        # FASE 1: Cadastrar as estações da UF
+        self.stdout.write(self.style.HTTP_INFO(f"Buscando e cadastrando estações de {options['uf']}..."))
         try:
-            response = requests.get(f"{self.BASE_URL}/estacoes/T")
-            response.raise_for_status()
-            todas_estacoes = response.json()
-            estacoes_mt = [est for est in todas_estacoes if est.get("SG_ESTADO") == "MT"]
-
-            for estacao_data in estacoes_mt:
-                EstacaoMeteorologica.objects.update_or_create(
-                    codigo=estacao_data['CD_ESTACAO'],
-                    defaults={
-                        'nome': estacao_data['DC_NOME'],
-                        'latitude': float(estacao_data['VL_LATITUDE']),
-                        'longitude': float(estacao_data['VL_LONGITUDE']),
-                        'altitude': float(estacao_data['VL_ALTITUDE']),
-                        'data_inicio_operacao': datetime.strptime(estacao_data['DT_INICIO_OPERACAO'].split('T')[0], '%Y-%m-%d').date(),
-                        'uf': estacao_data['SG_ESTADO']
-                    }
-                )
-            self.stdout.write(self.style.SUCCESS(f'{len(estacoes_mt)} estações de MT foram salvas ou atualizadas.'))
-        except requests.exceptions.RequestException as e:
+            with medicao.etapa('download') as etapa:
+                etapa.linhas = total = cadastrar_estacoes(options['uf'], coletor)
+            medicao.unidade_concluida()
+            self.stdout.write(self.style.SUCCESS(f"{total} estações de {options['uf']} foram salvas ou atualizadas."))
+        except Exception as e:
+            medicao.registrar_erro('estacoes', e)
             self.stdout.write(self.style.ERROR(f'Erro ao buscar estações: {e}'))
 
-    def importar_dados_diarios(self):
-        """Busca os dados diários para cada estação e ano existentes na base de safras."""
-        anos = SafraAnual.objects.values_list('ano', flat=True).distinct().order_by('ano')
-        estacoes = EstacaoMeteorologica.objects.filter(uf='MT')
-
-        if not anos:
+        # FASE 2: Buscar dados diários para as estações e anos relevantes
+        self.importar_dados_diarios(
+            options['uf'], options['meses_por_fatia'], coletor, medicao, execucao, options['somente_falhas'],
+            options['replay'],
+        )
+
+        resumo = medicao.finalizar()
+        if execucao:
+            finalizar_execucao(execucao.id, resumo)
+        self.stdout.write(formatar_resumo(resumo))
+        if resumo['status'] == 'falha':
+            raise CommandError('Nenhuma requisição ao INMET foi concluída.')
+        self.stdout.write(self.style.SUCCESS('Importação de dados do INMET concluída!'))
+
+    def importar_dados_diarios(self, uf, meses_por_fatia, coletor, medicao, execucao, somente_falhas=False,
+                               replay=False):
+        """Busca em paralelo os dados diários de cada estação, em fatias (estação, período)."""
+        anos = list(SafraAnual.objects.values_list('ano', flat=True).distinct().order_by('ano'))
+        estacoes = EstacaoMeteorologica.objects.filter(uf=uf)
+
+        if replay:
+            fatias = fatias_armazenadas(coletor.armazem)
+        elif not anos:
             self.stdout.write(self.style.WARNING('Nenhum ano de safra encontrado. Pule a importação de dados diários.'))
             return
-
-        self.stdout.write(self.style.HTTP_INFO(f'Anos de safra encontrados: {list(anos)}'))
-        self.stdout.write(self.style.HTTP_INFO(f'Iniciando busca de dados diários para {estacoes.count()} estações...'))
-
-        # ...
-        # ...
-        for estacao in estacoes:
-            for ano in anos:
-                if ano >= estacao.data_inicio_operacao.year:
-                    # ===== NOVA LÓGICA: DIVIDIR O ANO EM DOIS SEMESTRES =====
-                    periodos = [
-                        (f"{ano}-01-01", f"{ano}-06-30"), # Primeiro semestre
-                        (f"{ano}-07-01", f"{ano}-12-31")  # Segundo semestre
-                    ]
-
-                    self.stdout.write(f'  - Buscando dados para estação {estacao.codigo} no ano {ano}...')
-
-                    for data_inicio, data_fim in periodos:
-                        dados_diarios = None
-                        try:
-                            endpoint = f"/estacao/{data_inicio}/{data_fim}/{estacao.codigo}"
-                            response = requests.get(f"{self.BASE_URL}{endpoint}", timeout=30.0) # Adiciona um timeout
-                            response.raise_for_status()
-                            dados_diarios = response.json()
-
-                            if not dados_diarios:
-                                self.stdout.write(self.style.WARNING(f'    Aviso: Período {data_inicio} a {data_fim} retornou vazio (sem erro).'))
-                                continue
-
-                        except requests.exceptions.RequestException as e:
-                            self.stdout.write(self.style.WARNING(f'    Aviso: Sem dados para {estacao.codigo} no período {data_inicio}-{data_fim}. (API retornou: {e})'))
-                            continue 
-
-                        # ... o resto do código para salvar os dados continua o mesmo ...
-                        try:
-                            for dado in dados_diarios:
-                                DadoMeteorologicoDiario.objects.update_or_create(
-                                    estacao=estacao,
-                                    data=datetime.strptime(dado['DT_MEDICAO'], '%Y-%m-%d').date(),
-                                    defaults={
-                                        'precipitacao_mm': float(dado['PRE_MAX']) if dado.get('PRE_MAX') else None,
-                                        'temp_maxima_c': float(dado['TEM_MAX']) if dado.get('TEM_MAX') else None,
-                                        'temp_minima_c': float(dado['TEM_MIN']) if dado.get('TEM_MIN') else None,
-                                        'umidade_media_porc': float(dado['UMD_MED']) if dado.get('UMD_MED') else None,
-                                    }
-                                )
-                        except Exception as e:
-                            self.stdout.write(self.style.ERROR(f'    ERRO ao SALVAR dados para {estacao.codigo} em {ano}: {e}'))
\ No newline at end of file
+        else:
+            # Fatias já concluídas em execuções anteriores são puladas (checkpoints)
+            fatias = fatias_a_refazer() if somente_falhas else planejar_fatias(estacoes, anos, meses_por_fatia)
+            fatias = retomar(execucao, fatias, attrgetter('codigo'))
+        self.stdout.write(self.style.HTTP_INFO(
+            f'Iniciando busca de {len(fatias)} fatias para {estacoes.count()} estações...'
+        ))
+
+        total_gravados = 0
+        for estacao, inicio, fim, gravados, erro in importar_fatias(fatias, coletor, medicao, execucao):
+            if erro:
+                self.stdout.write(self.style.WARNING(
+                    f'    Aviso: Sem dados para {estacao.codigo} no período {inicio}-{fim}. ({erro})'
+                ))
+            elif not gravados:
+                self.stdout.write(self.style.WARNING(f'    Aviso: Período {inicio} a {fim} de {estacao.codigo} retornou vazio.'))
+            else:
+                total_gravados += gravados
+                self.stdout.write(f'  - {estacao.codigo} de {inicio} a {fim}: {gravados} dias gravados.')
+
+        self.stdout.write(self.style.SUCCESS(f'{total_gravados} dias de estações gravados.'))
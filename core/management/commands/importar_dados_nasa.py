@@ -1,72 +1,101 @@
-import requests
-from datetime import datetime
-from django.core.management.base import BaseCommand
-from core.models import SafraAnual, Localidade, DadoMeteorologicoDiario
-from django.db import transaction
+from operator import attrgetter
+from django.core.management.base import BaseCommand, CommandError
+from core.models import SafraAnual
+from core.agregados import anos_do_periodo
+from core.cache import invalidar_respostas
+from core.checkpoints import finalizar_execucao, iniciar_execucao, pular_concluidas, retomar
+from core.metricas import Medicao, formatar_resumo
+from core.indicadores import atualizar_indicadores, safras_dos_anos
+from core.municipios import cadastrar_municipios
+from core.snapshots import exportar_clima_diario
+from core.nasa import (
+    celulas_com_localidades, criar_coletor, importar_periodos, periodos_a_refazer, periodos_armazenados,
+    planejar_periodos,
+)
 
 class Command(BaseCommand):
-    help = 'Busca e importa dados da API NASA POWER para localidades pré-definidas.'
+    help = 'Cadastra os municípios e importa da API NASA POWER o clima diário de cada célula da grade que os contém.'
 
-    LOCALIDADES_MT = {
-        "Cuiabá": {"lat": -15.59, "lon": -56.09}, "Rondonópolis": {"lat": -16.47, "lon": -54.63},
-        "Sinop": {"lat": -11.86, "lon": -55.50}, "Sorriso": {"lat": -12.54, "lon": -55.71},
-        "Primavera do Leste": {"lat": -15.56, "lon": -54.29},
-    }
-    API_BASE_URL = "https://power.larc.nasa.gov/api/temporal/daily/point"
-    PARAMS = "parameters=T2M_MAX,T2M_MIN,PRECTOTCORR&community=AG&format=JSON"
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-simultaneas', type=int, default=None,
+            help='Requisições simultâneas à API (padrão: NASA_POWER_MAX_SIMULTANEAS).'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Apenas mostra os períodos que seriam buscados, sem chamar a API.'
+        )
+        parser.add_argument(
+            '--somente-falhas', action='store_true',
+            help='Refaz apenas os períodos pendentes ou com falha nas execuções anteriores.'
+        )
+        parser.add_argument(
+            '--replay', action='store_true',
+            help='Regrava o clima diário a partir das respostas guardadas em RESPOSTAS_BRUTAS_DIR, sem acessar a API.'
+        )
 
     def handle(self, *args, **options):
         self.stdout.write(self.style.NOTICE('Iniciando importação de dados da NASA POWER...'))
         self.cadastrar_localidades()
-        self.importar_dados_diarios()
+        if options['replay']:
+            self.reprocessar_armazem()
+        else:
+            self.importar_dados_diarios(options['max_simultaneas'], options['dry_run'], options['somente_falhas'])
         self.stdout.write(self.style.SUCCESS('Importação de dados da NASA POWER concluída com sucesso!'))
 
     def cadastrar_localidades(self):
         self.stdout.write('Cadastrando ou atualizando localidades...')
-        with transaction.atomic():
-            for nome, coords in self.LOCALIDADES_MT.items():
-                Localidade.objects.update_or_create(
-                    nome=nome,
-                    defaults={'latitude': coords['lat'], 'longitude': coords['lon']}
-                )
-        self.stdout.write(self.style.SUCCESS(f'{len(self.LOCALIDADES_MT)} localidades salvas.'))
+        localidades, celulas = cadastrar_municipios()
+        self.stdout.write(self.style.SUCCESS(f'{localidades} localidades salvas em {celulas} células da grade.'))
 
-    def importar_dados_diarios(self):
+    def importar_dados_diarios(self, max_simultaneas=None, dry_run=False, somente_falhas=False):
         anos = SafraAnual.objects.values_list('ano', flat=True).distinct().order_by('ano')
-        localidades = Localidade.objects.all() # <-- AQUI ESTÁ A CORREÇÃO PRINCIPAL
+        celulas = celulas_com_localidades()
 
         if not list(anos):
             self.stdout.write(self.style.WARNING('Nenhum ano de safra encontrado. Rode a importação da Conab primeiro.'))
             return
 
-        self.stdout.write(f'Iniciando busca de dados diários para {localidades.count()} localidades...')
-        for local in localidades:
-            for ano in anos:
-                # ... (resto da função, que já estava correta)
-                self.stdout.write(f'  - Buscando dados para {local.nome} no ano {ano}...')
-                start_date = f"{ano}0101"; end_date = f"{ano}1231"
-                url = f"{self.API_BASE_URL}?{self.PARAMS}&latitude={local.latitude}&longitude={local.longitude}&start={start_date}&end={end_date}"
-                try:
-                    response = requests.get(url, timeout=60.0)
-                    response.raise_for_status()
-                    api_data = response.json()
-                    params = api_data['properties']['parameter']
-                    t2m_max_data = params['T2M_MAX']
-                    t2m_min_data = params['T2M_MIN']
-                    prec_data = params['PRECTOTCORR']
-                    with transaction.atomic():
-                        for date_str, temp_max in t2m_max_data.items():
-                            data_obj = datetime.strptime(date_str, '%Y%m%d').date()
-                            temp_min = t2m_min_data.get(date_str, -999)
-                            prec = prec_data.get(date_str, -999)
-                            if temp_max == -999 or temp_min == -999 or prec == -999:
-                                continue
-                            DadoMeteorologicoDiario.objects.update_or_create(
-                                localidade=local, data=data_obj,
-                                defaults={
-                                    'temp_maxima_c': temp_max, 'temp_minima_c': temp_min,
-                                    'precipitacao_mm': prec,
-                                }
-                            )
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f'    Erro ao processar dados para {local.nome} em {ano}: {e}'))
\ No newline at end of file
+        # Períodos já concluídos em execuções anteriores são pulados (checkpoints)
+        unidades = periodos_a_refazer() if somente_falhas else planejar_periodos(celulas, anos)
+        referencia = attrgetter('id')
+        if dry_run:
+            unidades = pular_concluidas('nasa', unidades, referencia)
+            self.stdout.write(f'{len(unidades)} períodos a buscar para {celulas.count()} células da grade.')
+            for celula, inicio, fim in unidades:
+                self.stdout.write(f'  - {celula}: {inicio} a {fim}')
+            return
+        execucao = iniciar_execucao('nasa')
+        unidades = retomar(execucao, unidades, referencia)
+        self.stdout.write(f'{len(unidades)} períodos a buscar para {celulas.count()} células da grade.')
+        self.gravar_periodos(unidades, criar_coletor(max_simultaneas), execucao)
+
+    def reprocessar_armazem(self):
+        """Refaz o parse e a gravação de todas as respostas guardadas, sem rede."""
+        coletor = criar_coletor(replay=True)
+        unidades = periodos_armazenados(coletor.armazem)
+        self.stdout.write(f'{len(unidades)} respostas guardadas a reprocessar, sem acesso à API.')
+        self.gravar_periodos(unidades, coletor)
+
+    def gravar_periodos(self, unidades, coletor, execucao=None):
+        medicao = Medicao('nasa')
+        anos_alterados = {}
+        for celula, inicio, fim, alteradas, erro in importar_periodos(unidades, coletor, medicao, execucao):
+            if erro:
+                self.stdout.write(self.style.ERROR(f'    Erro ao processar dados para {celula} de {inicio} a {fim}: {erro}'))
+            else:
+                if alteradas:
+                    anos_alterados.setdefault(celula.id, set()).update(anos_do_periodo(inicio, fim))
+                self.stdout.write(f'  - {celula} de {inicio} a {fim}: {alteradas} dias inseridos ou atualizados.')
+        if anos_alterados:
+            with medicao.etapa('agregados'):
+                atualizar_indicadores(safras_dos_anos(set().union(*anos_alterados.values())), celulas=anos_alterados)
+                exportar_clima_diario(anos_alterados)
+                invalidar_respostas()
+
+        resumo = medicao.finalizar()
+        if execucao:
+            finalizar_execucao(execucao.id, resumo)
+        self.stdout.write(formatar_resumo(resumo))
+        if resumo['status'] == 'falha':
+            raise CommandError(f'Nenhum dos {len(unidades)} períodos da NASA foi importado.')
@@ -1,60 +1,86 @@
-import pandas as pd
 import requests
-import os
-from django.core.management.base import BaseCommand
-from core.models import SafraAnual
-from django.db import transaction
+from django.core.management.base import BaseCommand, CommandError
+from core.agregados import atualizar_cubo_safras
+from core.cache import invalidar_respostas
+from core.checkpoints import (
+    concluir_unidade, falhar_unidade, finalizar_execucao, iniciar_execucao, registrar_pendentes,
+)
+from core.metricas import Medicao, formatar_resumo
+from core.snapshots import exportar_safras
+from core.conab import (
+    TAMANHO_BLOCO_PADRAO, TAMANHO_LOTE_PADRAO, baixar_serie_conab, importar_serie_conab,
+    registrar_download,
+)
 
 class Command(BaseCommand):
     help = 'Baixa, processa e importa os dados de safra da Conab.'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tamanho-lote', type=int, default=TAMANHO_LOTE_PADRAO,
+            help='Quantidade de linhas por INSERT em lote (padrão: %(default)s).'
+        )
+        parser.add_argument(
+            '--tamanho-bloco', type=int, default=TAMANHO_BLOCO_PADRAO,
+            help='Linhas do CSV lidas e transformadas por vez; cada bloco vai para a tabela nova antes do próximo (padrão: %(default)s).'
+        )
+        parser.add_argument(
+            '--forcar', action='store_true',
+            help='Baixa e processa a série mesmo que ela não tenha mudado desde a última importação.'
+        )
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.NOTICE('Iniciando pipeline de dados da Conab...'))
-        
+        medicao = Medicao('conab')
+        # A série inteira é uma unidade só: a tabela é trocada de uma vez
+        execucao = iniciar_execucao('conab')
+        registrar_pendentes(execucao, [('serie', None, None)])
+
         # Etapa de Extração
-        url = 'https://portaldeinformacoes.conab.gov.br/downloads/arquivos/SerieHistoricaGraos.txt'
-        local_filename = 'data/SerieHistoricaGraos.csv'
-        os.makedirs(os.path.dirname(local_filename), exist_ok=True)
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            with open(local_filename, 'w', encoding='latin-1') as f:
-                f.write(response.text)
+            with medicao.etapa('download'):
+                download = baixar_serie_conab(forcar=options['forcar'])
         except requests.exceptions.RequestException as e:
-            self.stdout.write(self.style.ERROR(f'Erro no download da Conab: {e}'))
-            return
+            medicao.registrar_erro('download', e)
+            falhar_unidade(execucao.id, 'conab', 'serie', erro=e)
+            self.finalizar(medicao, execucao)
+            raise CommandError(f'Erro no download da Conab: {e}')
 
-        # Etapa de Transformação
-        df = pd.read_csv(local_filename, sep=';', encoding='latin-1')
-        colunas_renomeadas = {'ano_agricola': 'ano_safra', 'dsc_safra_previsao': 'tipo_safra', 'uf': 'uf', 'produto': 'produto', 'area_plantada_mil_ha': 'area_plantada_ha', 'producao_mil_t': 'producao_toneladas', 'produtividade_mil_ha_mil_t': 'produtividade_kg_ha'}
-        df_transformado = df.rename(columns=colunas_renomeadas)
-        df_transformado['area_plantada_ha'] = df_transformado['area_plantada_ha'] * 1000
-        df_transformado['producao_toneladas'] = df_transformado['producao_toneladas'] * 1000
-        df_transformado['ano'] = df_transformado['ano_safra'].str.split('/').str[0].astype(int)
-        df_mt = df_transformado[df_transformado['uf'] == 'MT'].copy()
-        colunas_finais = ['ano', 'uf', 'produto', 'area_plantada_ha', 'producao_toneladas', 'produtividade_kg_ha']
-        df_final = df_mt[colunas_finais]
-        self.stdout.write(f'{len(df_final)} registros para o Mato Grosso foram processados.')
+        if not download.alterado:
+            medicao.unidade_concluida()
+            concluir_unidade(execucao.id, 'conab', 'serie', sha256=download.sha256)
+            self.finalizar(medicao, execucao)
+            self.stdout.write(self.style.SUCCESS('A série da Conab não mudou desde a última importação. Nada a fazer.'))
+            return
 
-        # Etapa de Carga
+        # Etapas de Transformação e Carga, bloco a bloco
         try:
-            with transaction.atomic():
-                SafraAnual.objects.all().delete()
-                registros_criados = 0
-                for index, row in df_final.iterrows():
-                    # AQUI ESTÁ A CORREÇÃO PRINCIPAL: USANDO update_or_create
-                    obj, created = SafraAnual.objects.update_or_create(
-                        ano=row['ano'],
-                        uf=row['uf'],
-                        produto=row['produto'].strip(), # Adicionado .strip() para remover espaços extras
-                        defaults={
-                            'area_plantada_ha': row['area_plantada_ha'],
-                            'producao_toneladas': row['producao_toneladas'],
-                            'produtividade_kg_ha': row['produtividade_kg_ha']
-                        }
-                    )
-                    if created:
-                        registros_criados += 1
-            self.stdout.write(self.style.SUCCESS(f'Pipeline da Conab concluída! {registros_criados} novos registros criados.'))
+            resultado = importar_serie_conab(
+                download.caminho,
+                tamanho_bloco=options['tamanho_bloco'],
+                tamanho_lote=options['tamanho_lote'],
+                medicao=medicao,
+            )
+            registrar_download(download.metadados)
+            with medicao.etapa('agregados') as etapa:
+                etapa.linhas = atualizar_cubo_safras()
+                exportar_safras()
+                invalidar_respostas()
+            medicao.unidade_concluida()
+            concluir_unidade(execucao.id, 'conab', 'serie', linhas=resultado.registros, sha256=download.sha256)
+            self.stdout.write(self.style.SUCCESS(
+                f'Pipeline da Conab concluída! {resultado.registros} registros carregados em '
+                f'{resultado.segundos:.2f}s ({resultado.registros_por_segundo:.0f} registros/s); '
+                f'troca da tabela em {resultado.segundos_troca * 1000:.0f} ms.'
+            ))
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Erro durante a transação da Conab: {e}'))
\ No newline at end of file
+            medicao.registrar_erro('carga', e)
+            falhar_unidade(execucao.id, 'conab', 'serie', erro=e)
+            self.finalizar(medicao, execucao)
+            raise CommandError(f'Erro na carga da Conab: {e}')
+        self.stdout.write(formatar_resumo(self.finalizar(medicao, execucao)))
+
+    def finalizar(self, medicao, execucao):
+        resumo = medicao.finalizar()
+        finalizar_execucao(execucao.id, resumo)
+        return resumo
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from core.agregados import atualizar_cubo_safras, recalcular_clima_anual
+from core.cache import invalidar_respostas
+from core.indicadores import atualizar_indicadores
+
+class Command(BaseCommand):
+    help = 'Recalcula do zero as tabelas agregadas (CuboSafra, ClimaAnual e IndicadorSafra) usadas pelo dashboard.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.NOTICE('Recalculando tabelas agregadas...'))
+        producao = atualizar_cubo_safras()
+        clima = recalcular_clima_anual()
+        indicadores = atualizar_indicadores()
+        invalidar_respostas()
+        self.stdout.write(self.style.SUCCESS(
+            f'Agregados recalculados: {producao} linhas do cubo de safras, {clima} de clima '
+            f'e {indicadores} indicadores de safra.'
+        ))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.cache import invalidar_respostas
+from core.metricas import Medicao, formatar_resumo
+from core.indicadores import atualizar_indicadores, safras_dos_anos
+from core.snapshots import exportar_clima_diario
+from core.nasa import celulas_com_localidades, criar_coletor, reimportar_ano
+
+
+class Command(BaseCommand):
+    help = 'Rebusca anos inteiros da NASA POWER para todas as células da grade com localidades e troca a partição de cada ano.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('anos', nargs='+', type=int, help='Anos a reimportar (ex: 2020 2021).')
+        parser.add_argument(
+            '--max-simultaneas', type=int, default=None,
+            help='Requisições simultâneas à API (padrão: NASA_POWER_MAX_SIMULTANEAS).'
+        )
+
+    def handle(self, *args, **options):
+        celulas = list(celulas_com_localidades())
+        if not celulas:
+            self.stdout.write(self.style.WARNING('Nenhuma localidade cadastrada. Rode importar_dados_nasa primeiro.'))
+            return
+
+        medicao = Medicao('nasa')
+        coletor = criar_coletor(options['max_simultaneas'])
+        coletor.medicao = medicao
+        reimportados = []
+        for ano in sorted(set(options['anos'])):
+            try:
+                with medicao.etapa('carga') as etapa:
+                    gravadas = etapa.linhas = reimportar_ano(ano, celulas, coletor)
+            except Exception as e:
+                medicao.registrar_erro(str(ano), e)
+                self.stdout.write(self.style.ERROR(f'Erro ao reimportar {ano}; a partição anterior foi mantida: {e}'))
+                continue
+            medicao.unidade_concluida()
+            reimportados.append(ano)
+            self.stdout.write(f'  - {ano}: {gravadas} dias gravados para {len(celulas)} células da grade.')
+
+        if reimportados:
+            with medicao.etapa('agregados'):
+                atualizar_indicadores(safras_dos_anos(reimportados))
+                exportar_clima_diario({celula.id: reimportados for celula in celulas})
+                invalidar_respostas()
+
+        resumo = medicao.finalizar()
+        self.stdout.write(formatar_resumo(resumo))
+        if resumo['status'] == 'falha':
+            raise CommandError('Nenhum ano foi reimportado.')
+        self.stdout.write(self.style.SUCCESS(f'Reimportação concluída: {len(reimportados)} ano(s) trocados.'))
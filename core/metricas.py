@@ -0,0 +1,292 @@
+"""
+Instrumentação das importações (Conab, NASA, INMET).
+
+Cada execução usa uma `Medicao`, que acumula em memória o tempo, as linhas
+e as consultas ao banco de cada etapa (download, parse, transformação,
+carga, agregados), além da latência, das novas tentativas e dos erros das
+requisições HTTP feitas pelo `ColetorConcorrente`.
+
+No fim da execução:
+- `publicar` soma esses números a contadores no cache (Redis), comuns a
+  todos os processos web e workers, lidos pelo endpoint /metrics no formato
+  de texto do Prometheus;
+- `finalizar` também grava um resumo estruturado da execução no log
+  (logger `core.importacao`, uma linha JSON) e como "última execução" do
+  importador no cache.
+"""
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.db import connection
+
+logger = logging.getLogger('core.importacao')
+
+IMPORTADORES = ('conab', 'nasa', 'inmet')
+ETAPAS = ('download', 'parse', 'transformacao', 'carga', 'agregados')
+STATUS = ('sucesso', 'parcial', 'falha')
+# Limites (segundos) das faixas do histograma de latência HTTP
+LIMITES_HTTP = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PREFIXO = 'datum_safra:metricas'
+
+
+class ImportacaoFalhou(Exception):
+    """Nenhuma unidade (período, fatia, arquivo) da importação foi concluída."""
+
+
+class RegistroEtapa:
+    """Devolvido por `Medicao.etapa`; quem chama informa as linhas processadas."""
+
+    def __init__(self):
+        self.linhas = 0
+
+
+class Medicao:
+    """Métricas de uma execução de importação. Segura para uso por várias threads."""
+
+    def __init__(self, importador):
+        if importador not in IMPORTADORES:
+            raise ValueError(f'Importador desconhecido: {importador}')
+        self.importador = importador
+        self.inicio = time.time()
+        self.etapas = {nome: {'execucoes': 0, 'segundos': 0.0, 'linhas': 0, 'consultas': 0} for nome in ETAPAS}
+        self.http = {
+            'requisicoes': 0, 'tentativas_extras': 0, 'erros': 0, 'segundos': 0.0,
+            'faixas': [0] * (len(LIMITES_HTTP) + 1),
+        }
+        self.unidades = 0
+        self.falhas = 0
+        self.erros = []
+        self.partes = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def etapa(self, nome):
+        """Mede o tempo e as consultas ao banco (na thread atual) do bloco `with`."""
+        registro = RegistroEtapa()
+        consultas = 0
+
+        def contar_consulta(execute, sql, params, many, context):
+            nonlocal consultas
+            consultas += 1
+            return execute(sql, params, many, context)
+
+        inicio = time.perf_counter()
+        try:
+            with connection.execute_wrapper(contar_consulta):
+                yield registro
+        finally:
+            with self._lock:
+                acumulado = self.etapas[nome]
+                acumulado['execucoes'] += 1
+                acumulado['segundos'] += time.perf_counter() - inicio
+                acumulado['linhas'] += registro.linhas
+                acumulado['consultas'] += consultas
+
+    def registrar_http(self, segundos, repeticao=False, erro=False):
+        """Chamado pelo coletor a cada tentativa de requisição."""
+        with self._lock:
+            self.http['requisicoes'] += 1
+            self.http['segundos'] += segundos
+            self.http['faixas'][bisect_left(LIMITES_HTTP, segundos)] += 1
+            if repeticao:
+                self.http['tentativas_extras'] += 1
+            if erro:
+                self.http['erros'] += 1
+
+    def unidade_concluida(self):
+        with self._lock:
+            self.unidades += 1
+
+    def registrar_erro(self, contexto, erro):
+        """Conta uma unidade que falhou e registra o erro no log, com o traceback."""
+        logger.error('Falha na importação %s (%s): %s', self.importador, contexto, erro,
+                     exc_info=erro if isinstance(erro, BaseException) else None)
+        with self._lock:
+            self.unidades += 1
+            self.falhas += 1
+            self.erros.append({'contexto': contexto, 'erro': str(erro)})
+
+    @property
+    def status(self):
+        return _status(self.unidades, self.falhas)
+
+    def resumo(self):
+        """
+        Resumo serializável em JSON desta execução, incluindo as partes
+        recebidas por `incorporar`.
+        """
+        etapas = {nome: dict(etapa) for nome, etapa in self.etapas.items()}
+        http = dict(self.http, faixas=list(self.http['faixas']))
+        unidades, falhas, erros = self.unidades, self.falhas, list(self.erros)
+        for parte in self.partes:
+            for nome, etapa in parte['etapas'].items():
+                for campo in ('execucoes', 'segundos', 'linhas', 'consultas'):
+                    etapas[nome][campo] += etapa[campo]
+            for campo in ('requisicoes', 'tentativas_extras', 'erros', 'segundos'):
+                http[campo] += parte['http'][campo]
+            http['faixas'] = [a + b for a, b in zip(http['faixas'], parte['http']['faixas'])]
+            unidades += parte['unidades']
+            falhas += parte['falhas']
+            erros.extend(parte['erros'])
+
+        for etapa in etapas.values():
+            etapa['linhas_por_segundo'] = round(etapa['linhas'] / etapa['segundos'], 1) if etapa['segundos'] else 0.0
+        http['latencia_media_s'] = round(http['segundos'] / http['requisicoes'], 3) if http['requisicoes'] else 0.0
+        return {
+            'importador': self.importador,
+            'inicio': datetime.fromtimestamp(self.inicio, tz=timezone.utc).isoformat(),
+            'duracao_s': round(time.time() - self.inicio, 3),
+            'status': _status(unidades, falhas),
+            'unidades': unidades,
+            'falhas': falhas,
+            'etapas': {nome: etapa for nome, etapa in etapas.items() if etapa['execucoes']},
+            'http': http,
+            'erros': erros,
+        }
+
+    def incorporar(self, resumo):
+        """
+        Junta ao resumo desta execução o de uma parte dela (ex: sub-tarefa de
+        um chord). Só afeta o resumo: cada parte publica os próprios contadores.
+        """
+        self.partes.append(resumo)
+
+    def publicar(self):
+        """Soma os números desta execução aos contadores globais no cache."""
+        for nome, etapa in self.etapas.items():
+            if etapa['execucoes']:
+                rotulo = f'{self.importador}:{nome}'
+                _incrementar(f'etapa_execucoes:{rotulo}', etapa['execucoes'])
+                _incrementar(f'etapa_ms:{rotulo}', round(etapa['segundos'] * 1000))
+                _incrementar(f'etapa_linhas:{rotulo}', etapa['linhas'])
+                _incrementar(f'etapa_consultas:{rotulo}', etapa['consultas'])
+        _incrementar(f'http_requisicoes:{self.importador}', self.http['requisicoes'])
+        _incrementar(f'http_tentativas_extras:{self.importador}', self.http['tentativas_extras'])
+        _incrementar(f'http_erros:{self.importador}', self.http['erros'])
+        _incrementar(f'http_ms:{self.importador}', round(self.http['segundos'] * 1000))
+        for i, quantidade in enumerate(self.http['faixas']):
+            _incrementar(f'http_faixa:{self.importador}:{i}', quantidade)
+
+    def finalizar(self):
+        """
+        Encerra a execução: publica os contadores, conta a execução pelo
+        status, grava o resumo no log e no cache e o devolve.
+        """
+        self.publicar()
+        resumo = self.resumo()
+        _incrementar(f"execucoes:{self.importador}:{resumo['status']}", 1)
+        cache.set(f'{PREFIXO}:ultima:{self.importador}', resumo, timeout=None)
+        logger.info(json.dumps(resumo, ensure_ascii=False))
+        return resumo
+
+
+def _status(unidades, falhas):
+    if falhas and falhas >= unidades:
+        return 'falha'
+    return 'parcial' if falhas else 'sucesso'
+
+
+def _incrementar(nome, valor):
+    if not valor:
+        return
+    chave = f'{PREFIXO}:{nome}'
+    cache.add(chave, 0, timeout=None)
+    try:
+        cache.incr(chave, valor)
+    except ValueError:
+        # A chave expirou ou foi removida entre o `add` e o `incr`
+        cache.set(chave, valor, timeout=None)
+
+
+def ultima_execucao(importador):
+    """Resumo da última execução de `importador` (ou None)."""
+    return cache.get(f'{PREFIXO}:ultima:{importador}')
+
+
+def _formatar_rotulos(rotulos):
+    return '{' + ','.join(f'{chave}="{valor}"' for chave, valor in rotulos.items()) + '}'
+
+
+def renderizar_prometheus():
+    """Contadores de todas as importações no formato de texto do Prometheus."""
+    pares = [(i, e) for i in IMPORTADORES for e in ETAPAS]
+    nomes = [f'execucoes:{i}:{s}' for i in IMPORTADORES for s in STATUS]
+    for i, e in pares:
+        nomes += [f'{m}:{i}:{e}' for m in ('etapa_execucoes', 'etapa_ms', 'etapa_linhas', 'etapa_consultas')]
+    for i in IMPORTADORES:
+        nomes += [f'{m}:{i}' for m in ('http_requisicoes', 'http_tentativas_extras', 'http_erros', 'http_ms')]
+        nomes += [f'http_faixa:{i}:{indice}' for indice in range(len(LIMITES_HTTP) + 1)]
+    valores = cache.get_many([f'{PREFIXO}:{nome}' for nome in nomes])
+
+    def valor(nome):
+        return valores.get(f'{PREFIXO}:{nome}', 0)
+
+    linhas = []
+
+    def metrica(nome, tipo, ajuda, amostras):
+        """`amostras`: (sufixo do nome, rótulos, valor)."""
+        linhas.append(f'# HELP {nome} {ajuda}')
+        linhas.append(f'# TYPE {nome} {tipo}')
+        for sufixo, rotulos, amostra in amostras:
+            linhas.append(f'{nome}{sufixo}{_formatar_rotulos(rotulos)} {amostra:g}')
+
+    metrica('datum_safra_importacao_execucoes_total', 'counter', 'Execuções de importação por status.', [
+        ('', {'importador': i, 'status': s}, valor(f'execucoes:{i}:{s}')) for i in IMPORTADORES for s in STATUS
+    ])
+    metrica('datum_safra_importacao_etapa_segundos', 'summary', 'Tempo gasto em cada etapa.', [
+        amostra
+        for i, e in pares
+        for amostra in (
+            ('_sum', {'importador': i, 'etapa': e}, valor(f'etapa_ms:{i}:{e}') / 1000),
+            ('_count', {'importador': i, 'etapa': e}, valor(f'etapa_execucoes:{i}:{e}')),
+        )
+    ])
+    metrica('datum_safra_importacao_linhas_total', 'counter', 'Linhas processadas por etapa.', [
+        ('', {'importador': i, 'etapa': e}, valor(f'etapa_linhas:{i}:{e}')) for i, e in pares
+    ])
+    metrica('datum_safra_importacao_consultas_db_total', 'counter', 'Consultas ao banco (round trips) por etapa.', [
+        ('', {'importador': i, 'etapa': e}, valor(f'etapa_consultas:{i}:{e}')) for i, e in pares
+    ])
+    metrica('datum_safra_http_tentativas_extras_total', 'counter', 'Novas tentativas de requisições HTTP.', [
+        ('', {'importador': i}, valor(f'http_tentativas_extras:{i}')) for i in IMPORTADORES
+    ])
+    metrica('datum_safra_http_erros_total', 'counter', 'Requisições HTTP com erro (status >= 400 ou falha de conexão).', [
+        ('', {'importador': i}, valor(f'http_erros:{i}')) for i in IMPORTADORES
+    ])
+
+    histograma = []
+    for i in IMPORTADORES:
+        acumulado = 0
+        for indice, limite in enumerate(LIMITES_HTTP):
+            acumulado += valor(f'http_faixa:{i}:{indice}')
+            histograma.append(('_bucket', {'importador': i, 'le': f'{limite:g}'}, acumulado))
+        acumulado += valor(f'http_faixa:{i}:{len(LIMITES_HTTP)}')
+        histograma.append(('_bucket', {'importador': i, 'le': '+Inf'}, acumulado))
+        histograma.append(('_sum', {'importador': i}, valor(f'http_ms:{i}') / 1000))
+        histograma.append(('_count', {'importador': i}, valor(f'http_requisicoes:{i}')))
+    metrica('datum_safra_http_requisicao_segundos', 'histogram', 'Latência das requisições HTTP.', histograma)
+    return '\n'.join(linhas) + '\n'
+
+
+def formatar_resumo(resumo):
+    """Resumo de uma execução em uma linha, para a saída dos comandos."""
+    partes = [f"{resumo['status']} em {resumo['duracao_s']:.1f}s"]
+    for nome, etapa in resumo['etapas'].items():
+        texto = f"{nome} {etapa['segundos']:.2f}s"
+        if etapa['linhas']:
+            texto += f" ({etapa['linhas']} linhas, {etapa['linhas_por_segundo']:.0f}/s, {etapa['consultas']} consultas)"
+        partes.append(texto)
+    http = resumo['http']
+    if http['requisicoes']:
+        partes.append(
+            f"HTTP {http['requisicoes']} requisições, média {http['latencia_media_s']:.2f}s, "
+            f"{http['tentativas_extras']} novas tentativas, {http['erros']} erros"
+        )
+    return ' | '.join(partes)
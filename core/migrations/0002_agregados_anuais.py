@@ -0,0 +1,52 @@
+# Generated by Django 5.2.5 on 2026-10-17 22:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='localidade',
+            name='uf',
+            field=models.CharField(default='MT', help_text='Sigla da Unidade Federativa (UF).', max_length=2, verbose_name='Estado (UF)'),
+        ),
+        migrations.CreateModel(
+            name='ProducaoAnual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ano', models.IntegerField(verbose_name='Ano da Safra')),
+                ('produto', models.CharField(max_length=255, verbose_name='Produto Agricola')),
+                ('area_plantada_ha', models.FloatField(blank=True, null=True, verbose_name='Área Plantada (ha)')),
+                ('producao_toneladas', models.FloatField(blank=True, null=True, verbose_name='Produção (t)')),
+            ],
+            options={
+                'verbose_name': 'Produção Anual',
+                'verbose_name_plural': 'Produções Anuais',
+                'unique_together': {('ano', 'produto')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ClimaAnual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uf', models.CharField(max_length=2, verbose_name='Estado (UF)')),
+                ('ano', models.IntegerField(verbose_name='Ano')),
+                ('precipitacao_total_mm', models.FloatField(blank=True, null=True, verbose_name='Precipitação Total (mm)')),
+                ('temp_maxima_media_c', models.FloatField(blank=True, null=True, verbose_name='Média da Temperatura Máxima (°C)')),
+                ('temp_minima_media_c', models.FloatField(blank=True, null=True, verbose_name='Média da Temperatura Mínima (°C)')),
+                ('dias', models.IntegerField(default=0, verbose_name='Dias com Medição')),
+                ('localidade', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.localidade', verbose_name='Localidade')),
+            ],
+            options={
+                'verbose_name': 'Clima Anual',
+                'verbose_name_plural': 'Climas Anuais',
+                'unique_together': {('localidade', 'ano')},
+            },
+        ),
+    ]
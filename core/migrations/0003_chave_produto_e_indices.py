@@ -0,0 +1,65 @@
+# Generated by Django 5.2.5 on 2026-10-17 22:42
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def normalizar_produtos(apps, schema_editor):
+    """
+    Remove o preenchimento do nome do produto (a tarefa Celery não fazia
+    `.strip()`) e preenche `produto_slug` nas linhas existentes.
+    """
+    SafraAnual = apps.get_model('core', 'SafraAnual')
+    ProducaoAnual = apps.get_model('core', 'ProducaoAnual')
+
+    for safra in SafraAnual.objects.all().order_by('id'):
+        nome = safra.produto.strip()
+        duplicada = SafraAnual.objects.filter(ano=safra.ano, uf=safra.uf, produto=nome).exclude(pk=safra.pk)
+        if nome != safra.produto and duplicada.exists():
+            safra.delete()
+            continue
+        safra.produto = nome
+        safra.produto_slug = slugify(nome)
+        safra.save(update_fields=['produto', 'produto_slug'])
+
+    for producao in ProducaoAnual.objects.all():
+        producao.produto_slug = slugify(producao.produto.strip())
+        producao.save(update_fields=['produto_slug'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_agregados_anuais'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producaoanual',
+            name='produto_slug',
+            field=models.SlugField(db_index=False, default='', max_length=255, verbose_name='Chave do Produto'),
+        ),
+        migrations.AddField(
+            model_name='safraanual',
+            name='codigo_produto',
+            field=models.IntegerField(blank=True, help_text='Valor da coluna id_produto da série da Conab.', null=True, verbose_name='Código do Produto (Conab)'),
+        ),
+        migrations.AddField(
+            model_name='safraanual',
+            name='produto_slug',
+            field=models.SlugField(db_index=False, default='', help_text='Nome do produto normalizado (ex: soja, algodao-em-pluma), usado nos filtros da API.', max_length=255, verbose_name='Chave do Produto'),
+        ),
+        migrations.RunPython(normalizar_produtos, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='producaoanual',
+            index=models.Index(fields=['produto_slug', 'ano'], include=('producao_toneladas',), name='producao_produto_ano_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='safraanual',
+            index=models.Index(fields=['produto_slug', 'ano'], name='safra_produto_ano_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='safraanual',
+            index=models.Index(fields=['uf', 'ano'], name='safra_uf_ano_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-17 22:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_chave_produto_e_indices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArquivoFonte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=500, unique=True, verbose_name='URL')),
+                ('etag', models.CharField(blank=True, default='', max_length=255, verbose_name='ETag')),
+                ('last_modified', models.CharField(blank=True, default='', max_length=64, verbose_name='Last-Modified')),
+                ('sha256', models.CharField(blank=True, default='', max_length=64, verbose_name='Hash SHA-256 do Conteúdo')),
+                ('atualizado_em', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Arquivo de Fonte',
+                'verbose_name_plural': 'Arquivos de Fonte',
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-17 22:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_arquivo_fonte'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstacaoMeteorologica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(help_text='Código INMET da estação (ex: A901).', max_length=10, unique=True, verbose_name='Código da Estação')),
+                ('nome', models.CharField(max_length=255, verbose_name='Nome da Estação')),
+                ('uf', models.CharField(max_length=2, verbose_name='Estado (UF)')),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('altitude', models.FloatField(blank=True, null=True)),
+                ('data_inicio_operacao', models.DateField(blank=True, null=True, verbose_name='Início de Operação')),
+            ],
+            options={
+                'verbose_name': 'Estação Meteorológica',
+                'verbose_name_plural': 'Estações Meteorológicas',
+                'indexes': [models.Index(fields=['uf'], name='estacao_uf_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DadoEstacaoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data da Medição')),
+                ('precipitacao_mm', models.FloatField(blank=True, null=True, verbose_name='Precipitação (mm/dia)')),
+                ('temp_maxima_c', models.FloatField(blank=True, null=True, verbose_name='Temperatura Máxima (°C)')),
+                ('temp_minima_c', models.FloatField(blank=True, null=True, verbose_name='Temperatura Mínima (°C)')),
+                ('umidade_media_porc', models.FloatField(blank=True, null=True, verbose_name='Umidade Relativa Média (%)')),
+                ('estacao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.estacaometeorologica', verbose_name='Estação')),
+            ],
+            options={
+                'verbose_name': 'Dado Diário de Estação',
+                'verbose_name_plural': 'Dados Diários de Estações',
+                'unique_together': {('estacao', 'data')},
+            },
+        ),
+    ]
@@ -0,0 +1,88 @@
+from django.db import migrations
+
+TABELA = 'core_dadometeorologicodiario'
+
+
+def particionar(apps, schema_editor):
+    """
+    Recria a tabela diária como particionada por intervalo de `data` (um ano
+    por partição, mais uma partição padrão) e copia os dados existentes.
+    Só no PostgreSQL; nos demais bancos a tabela continua simples.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    q = schema_editor.connection.ops.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {q(TABELA)} RENAME TO {q(TABELA + "_antiga")}')
+        # A chave primária de uma tabela particionada precisa conter a coluna de partição
+        cursor.execute(f"""
+            CREATE TABLE {q(TABELA)} (
+                id bigint NOT NULL,
+                data date NOT NULL,
+                precipitacao_mm double precision NULL,
+                temp_maxima_c double precision NULL,
+                temp_minima_c double precision NULL,
+                localidade_id bigint NOT NULL
+                    REFERENCES core_localidade (id) DEFERRABLE INITIALLY DEFERRED,
+                PRIMARY KEY (id, data),
+                UNIQUE (localidade_id, data)
+            ) PARTITION BY RANGE (data)
+        """)
+        cursor.execute(f'CREATE TABLE {q(TABELA + "_padrao")} PARTITION OF {q(TABELA)} DEFAULT')
+        cursor.execute(f'SELECT DISTINCT EXTRACT(YEAR FROM data)::int FROM {q(TABELA + "_antiga")}')
+        for (ano,) in cursor.fetchall():
+            cursor.execute(
+                f'CREATE TABLE {q(f"{TABELA}_{ano}")} PARTITION OF {q(TABELA)} '
+                f"FOR VALUES FROM ('{ano}-01-01') TO ('{ano + 1}-01-01')"
+            )
+        cursor.execute(
+            f'INSERT INTO {q(TABELA)} (id, data, precipitacao_mm, temp_maxima_c, temp_minima_c, localidade_id) '
+            f'SELECT id, data, precipitacao_mm, temp_maxima_c, temp_minima_c, localidade_id '
+            f'FROM {q(TABELA + "_antiga")}'
+        )
+        cursor.execute(f'DROP TABLE {q(TABELA + "_antiga")}')
+        # Sequência comum a todas as partições, no lugar da identity da tabela antiga
+        cursor.execute(f'CREATE SEQUENCE {q(TABELA + "_id_seq")} OWNED BY {q(TABELA)}.id')
+        cursor.execute(
+            f"SELECT setval('{TABELA}_id_seq', COALESCE((SELECT MAX(id) FROM {q(TABELA)}), 0) + 1, false)"
+        )
+        cursor.execute(f"ALTER TABLE {q(TABELA)} ALTER COLUMN id SET DEFAULT nextval('{TABELA}_id_seq')")
+
+
+def desparticionar(apps, schema_editor):
+    """Volta para uma tabela simples, com a chave primária só em `id`."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    q = schema_editor.connection.ops.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {q(TABELA)} RENAME TO {q(TABELA + "_particionada")}')
+        cursor.execute(f'ALTER SEQUENCE {q(TABELA + "_id_seq")} OWNED BY NONE')
+        cursor.execute(f"""
+            CREATE TABLE {q(TABELA)} (
+                id bigint NOT NULL PRIMARY KEY DEFAULT nextval('{TABELA}_id_seq'),
+                data date NOT NULL,
+                precipitacao_mm double precision NULL,
+                temp_maxima_c double precision NULL,
+                temp_minima_c double precision NULL,
+                localidade_id bigint NOT NULL
+                    REFERENCES core_localidade (id) DEFERRABLE INITIALLY DEFERRED,
+                UNIQUE (localidade_id, data)
+            )
+        """)
+        cursor.execute(
+            f'INSERT INTO {q(TABELA)} SELECT id, data, precipitacao_mm, temp_maxima_c, temp_minima_c, localidade_id '
+            f'FROM {q(TABELA + "_particionada")}'
+        )
+        cursor.execute(f'DROP TABLE {q(TABELA + "_particionada")} CASCADE')
+        cursor.execute(f'ALTER SEQUENCE {q(TABELA + "_id_seq")} OWNED BY {q(TABELA)}.id')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_estacoes_inmet'),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar, desparticionar),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-17 22:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_particionar_clima_diario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndicadorSafra',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uf', models.CharField(max_length=2, verbose_name='Estado (UF)')),
+                ('ano', models.IntegerField(help_text='Ano de início da safra agrícola (mesma convenção de SafraAnual).', verbose_name='Ano da Safra')),
+                ('graus_dia', models.FloatField(blank=True, null=True, verbose_name='Graus-Dia Acumulados (°C·dia)')),
+                ('precipitacao_total_mm', models.FloatField(blank=True, null=True, verbose_name='Precipitação Total (mm)')),
+                ('chuva_maxima_janela_mm', models.FloatField(blank=True, help_text='Maior soma de precipitação em JANELA_CHUVA_DIAS dias consecutivos.', null=True, verbose_name='Maior Chuva em Janela Móvel (mm)')),
+                ('maior_veranico_dias', models.IntegerField(default=0, help_text='Maior sequência de dias consecutivos sem chuva.', verbose_name='Maior Veranico (dias)')),
+                ('dias_estresse_calor', models.IntegerField(default=0, help_text='Dias com temperatura máxima acima do limiar de estresse.', verbose_name='Dias com Estresse Térmico')),
+                ('dias', models.IntegerField(default=0, verbose_name='Dias com Medição')),
+                ('localidade', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.localidade', verbose_name='Localidade')),
+            ],
+            options={
+                'verbose_name': 'Indicador da Safra',
+                'verbose_name_plural': 'Indicadores das Safras',
+                'indexes': [models.Index(fields=['uf', 'ano'], name='indicador_uf_ano_idx')],
+                'unique_together': {('localidade', 'ano')},
+            },
+        ),
+    ]
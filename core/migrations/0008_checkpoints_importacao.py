@@ -0,0 +1,56 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_indicadores_safra'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExecucaoImportacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fonte', models.CharField(max_length=20, verbose_name='Fonte')),
+                ('status', models.CharField(choices=[('em_andamento', 'Em andamento'), ('sucesso', 'Sucesso'), ('parcial', 'Parcial'), ('falha', 'Falha')], default='em_andamento', max_length=20, verbose_name='Status')),
+                ('iniciada_em', models.DateTimeField(auto_now_add=True, verbose_name='Iniciada em')),
+                ('concluida_em', models.DateTimeField(blank=True, null=True, verbose_name='Concluída em')),
+                ('unidades', models.IntegerField(default=0, verbose_name='Unidades Planejadas')),
+                ('resumo', models.JSONField(blank=True, null=True, verbose_name='Resumo das Métricas')),
+            ],
+            options={
+                'verbose_name': 'Execução de Importação',
+                'verbose_name_plural': 'Execuções de Importação',
+                'indexes': [models.Index(fields=['fonte', '-iniciada_em'], name='execucao_fonte_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UnidadeImportacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fonte', models.CharField(max_length=20, verbose_name='Fonte')),
+                ('chave', models.CharField(max_length=255, verbose_name='Chave da Unidade')),
+                ('referencia', models.CharField(help_text='Id da localidade, código da estação ou UF/produto.', max_length=255, verbose_name='Referência')),
+                ('inicio', models.DateField(blank=True, null=True, verbose_name='Início do Período')),
+                ('fim', models.DateField(blank=True, null=True, verbose_name='Fim do Período')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('concluida', 'Concluída'), ('falhou', 'Falhou')], default='pendente', max_length=20, verbose_name='Status')),
+                ('linhas', models.IntegerField(default=0, verbose_name='Linhas Gravadas')),
+                ('sha256', models.CharField(blank=True, default='', max_length=64, verbose_name='Hash SHA-256 do Conteúdo')),
+                ('tentativas', models.IntegerField(default=0, verbose_name='Tentativas')),
+                ('erro', models.TextField(blank=True, default='', verbose_name='Último Erro')),
+                ('atualizada_em', models.DateTimeField(auto_now=True, verbose_name='Atualizada em')),
+                ('concluida_em', models.DateTimeField(blank=True, null=True, verbose_name='Concluída em')),
+                ('execucao', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='unidades_processadas', to='core.execucaoimportacao', verbose_name='Última Execução')),
+            ],
+            options={
+                'verbose_name': 'Unidade de Importação',
+                'verbose_name_plural': 'Unidades de Importação',
+                'indexes': [models.Index(fields=['fonte', 'status'], name='unidade_fonte_status_idx')],
+                'unique_together': {('fonte', 'chave')},
+            },
+        ),
+    ]
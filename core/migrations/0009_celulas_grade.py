@@ -0,0 +1,92 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef, Subquery
+
+PASSO_LATITUDE = 0.5
+PASSO_LONGITUDE = 0.625
+
+
+def atribuir_celulas(apps, schema_editor):
+    """
+    Liga cada localidade existente à sua célula da grade (mesma conta de
+    `core/grade.py`) e passa a série diária para a célula. Localidades que
+    caem na mesma célula tinham séries iguais; fica a linha de menor id.
+
+    Os checkpoints da NASA eram por localidade, com chaves no mesmo formato
+    das novas por célula (`<id>:<inicio>-<fim>`); são apagados para que uma
+    célula com o id de uma localidade antiga não tenha períodos pulados.
+    """
+    CelulaGrade = apps.get_model('core', 'CelulaGrade')
+    Localidade = apps.get_model('core', 'Localidade')
+    DadoMeteorologicoDiario = apps.get_model('core', 'DadoMeteorologicoDiario')
+    UnidadeImportacao = apps.get_model('core', 'UnidadeImportacao')
+
+    for local in Localidade.objects.all():
+        linha = round((local.latitude + 90) / PASSO_LATITUDE)
+        coluna = round((local.longitude + 180) / PASSO_LONGITUDE)
+        local.celula, _ = CelulaGrade.objects.get_or_create(
+            linha=linha, coluna=coluna,
+            defaults={'latitude': -90 + linha * PASSO_LATITUDE, 'longitude': -180 + coluna * PASSO_LONGITUDE},
+        )
+        local.save(update_fields=['celula'])
+
+    DadoMeteorologicoDiario.objects.update(celula_id=Subquery(
+        Localidade.objects.filter(pk=OuterRef('localidade_id')).values('celula_id')[:1]
+    ))
+    DadoMeteorologicoDiario.objects.filter(Exists(
+        DadoMeteorologicoDiario.objects.filter(
+            celula_id=OuterRef('celula_id'), data=OuterRef('data'), id__lt=OuterRef('id'),
+        )
+    )).delete()
+
+    UnidadeImportacao.objects.filter(fonte='nasa').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_checkpoints_importacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CelulaGrade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('linha', models.IntegerField(verbose_name='Linha (latitude)')),
+                ('coluna', models.IntegerField(verbose_name='Coluna (longitude)')),
+                ('latitude', models.FloatField(verbose_name='Latitude do Centro')),
+                ('longitude', models.FloatField(verbose_name='Longitude do Centro')),
+            ],
+            options={
+                'verbose_name': 'Célula da Grade',
+                'verbose_name_plural': 'Células da Grade',
+                'unique_together': {('linha', 'coluna')},
+            },
+        ),
+        migrations.AlterField(
+            model_name='localidade',
+            name='nome',
+            field=models.CharField(max_length=255, verbose_name='Nome da Localidade'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='localidade',
+            unique_together={('nome', 'uf')},
+        ),
+        migrations.AddField(
+            model_name='localidade',
+            name='celula',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='localidades', to='core.celulagrade', verbose_name='Célula da Grade'),
+        ),
+        migrations.AddField(
+            model_name='dadometeorologicodiario',
+            name='celula',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='core.celulagrade', verbose_name='Célula da Grade'),
+        ),
+        migrations.AlterField(
+            model_name='unidadeimportacao',
+            name='referencia',
+            field=models.CharField(help_text='Id da célula da grade, código da estação ou UF/produto.', max_length=255, verbose_name='Referência'),
+        ),
+        migrations.RunPython(atribuir_celulas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Separada da 0009 porque o PostgreSQL não altera a tabela na mesma
+    transação em que a atualização dos dados deixou gatilhos de FK pendentes.
+    """
+
+    dependencies = [
+        ('core', '0009_celulas_grade'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='dadometeorologicodiario',
+            unique_together={('celula', 'data')},
+        ),
+        migrations.RemoveField(
+            model_name='dadometeorologicodiario',
+            name='localidade',
+        ),
+        migrations.AlterField(
+            model_name='dadometeorologicodiario',
+            name='celula',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.celulagrade', verbose_name='Célula da Grade'),
+        ),
+    ]
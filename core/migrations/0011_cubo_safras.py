@@ -0,0 +1,60 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:19
+
+from django.db import migrations, models
+
+
+def forcar_nova_carga_conab(apps, schema_editor):
+    """
+    As linhas gravadas eram só de MT e sem a safra (as de 1ª e 2ª safra se
+    sobrescreviam). Sem os metadados do último arquivo, a próxima importação
+    baixa e carrega a série nacional inteira, mesmo que o arquivo não tenha
+    mudado, e remove as chaves antigas.
+    """
+    ArquivoFonte = apps.get_model('core', 'ArquivoFonte')
+    ArquivoFonte.objects.filter(url__endswith='/SerieHistoricaGraos.txt').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_clima_diario_por_celula'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CuboSafra',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ano', models.IntegerField(verbose_name='Ano da Safra')),
+                ('uf', models.CharField(help_text="Sigla da UF, ou '*' para o Brasil.", max_length=2, verbose_name='Estado (UF)')),
+                ('produto_slug', models.SlugField(db_index=False, help_text="Chave do produto, ou '*' para todos os produtos.", max_length=255, verbose_name='Chave do Produto')),
+                ('produto', models.CharField(max_length=255, verbose_name='Produto Agricola')),
+                ('safra', models.CharField(help_text="Safra (unica, 1, 2 ou 3), ou '*' para o total do ano agrícola.", max_length=5, verbose_name='Safra')),
+                ('area_plantada_ha', models.FloatField(blank=True, null=True, verbose_name='Área Plantada (ha)')),
+                ('producao_toneladas', models.FloatField(blank=True, null=True, verbose_name='Produção (t)')),
+                ('produtividade_kg_ha', models.FloatField(blank=True, help_text='Produção sobre área plantada do recorte.', null=True, verbose_name='Produtividade (kg/ha)')),
+            ],
+            options={
+                'verbose_name': 'Cubo de Safras',
+                'verbose_name_plural': 'Cubo de Safras',
+                'unique_together': {('uf', 'produto_slug', 'safra', 'ano')},
+            },
+        ),
+        migrations.DeleteModel(
+            name='ProducaoAnual',
+        ),
+        migrations.AlterUniqueTogether(
+            name='safraanual',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='safraanual',
+            name='safra',
+            field=models.CharField(choices=[('unica', 'Safra única'), ('1', '1ª safra'), ('2', '2ª safra'), ('3', '3ª safra')], default='unica', help_text='Safra do ano agrícola (coluna dsc_safra_previsao da Conab): única, 1ª, 2ª ou 3ª.', max_length=5, verbose_name='Safra'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='safraanual',
+            unique_together={('ano', 'uf', 'produto', 'safra')},
+        ),
+        migrations.RunPython(forcar_nova_carga_conab, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def refazer_fatias_inmet(apps, schema_editor):
+    """
+    A chuva das estações era lida de PRE_MAX (pressão máxima, em hPa) e a
+    umidade de UMD_MED, que o registro horário não tem. Sem os checkpoints,
+    a próxima importação busca de novo todas as fatias e o upsert por
+    (estacao, data) corrige os dias já gravados.
+    """
+    UnidadeImportacao = apps.get_model('core', 'UnidadeImportacao')
+    UnidadeImportacao.objects.filter(fonte='inmet').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_cubo_safras'),
+    ]
+
+    operations = [
+        migrations.RunPython(refazer_fatias_inmet, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,13 @@
 from django.db import models
 
 class SafraAnual(models.Model):
+    SAFRAS = [
+        ('unica', 'Safra única'),
+        ('1', '1ª safra'),
+        ('2', '2ª safra'),
+        ('3', '3ª safra'),
+    ]
+
     ano = models.IntegerField(
         verbose_name="Ano da Safra",
         help_text="Ano de início da safra agrícola."
@@ -16,6 +23,25 @@ class SafraAnual(models.Model):
         help_text="Nome da cultura (ex: Soja, Milho)."
 
     )
+    safra = models.CharField(
+        max_length=5,
+        choices=SAFRAS,
+        default='unica',
+        verbose_name="Safra",
+        help_text="Safra do ano agrícola (coluna dsc_safra_previsao da Conab): única, 1ª, 2ª ou 3ª."
+    )
+    produto_slug = models.SlugField(
+        max_length=255,
+        default='',
+        db_index=False,
+        verbose_name="Chave do Produto",
+        help_text="Nome do produto normalizado (ex: soja, algodao-em-pluma), usado nos filtros da API."
+    )
+    codigo_produto = models.IntegerField(
+        verbose_name="Código do Produto (Conab)",
+        help_text="Valor da coluna id_produto da série da Conab.",
+        null=True, blank=True
+    )
     area_plantada_ha = models.FloatField(
         verbose_name="Área Plantada (ha)",
         help_text="Área plantada em hectares."
@@ -34,28 +60,66 @@ class SafraAnual(models.Model):
     class Meta:
         verbose_name = "Safra Anual"
         verbose_name_plural = "Safras Anuais"
-        unique_together = ('ano', 'uf', 'produto')
+        unique_together = ('ano', 'uf', 'produto', 'safra')
+        indexes = [
+            models.Index(fields=['produto_slug', 'ano'], name='safra_produto_ano_idx'),
+            models.Index(fields=['uf', 'ano'], name='safra_uf_ano_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.produto} em {self.uf} - Safra {self.ano}"
+        return f"{self.produto} em {self.uf} - Safra {self.ano} ({self.get_safra_display()})"
     
 
 
+class CelulaGrade(models.Model):
+    """
+    Célula da grade da NASA POWER (0,5° de latitude x 0,625° de longitude).
+    A API devolve o mesmo valor para qualquer ponto dentro da célula, então
+    a série diária é buscada e gravada uma vez por célula (ver `core/grade.py`).
+    """
+    linha = models.IntegerField(verbose_name="Linha (latitude)")
+    coluna = models.IntegerField(verbose_name="Coluna (longitude)")
+    latitude = models.FloatField(verbose_name="Latitude do Centro")
+    longitude = models.FloatField(verbose_name="Longitude do Centro")
+
+    class Meta:
+        verbose_name = "Célula da Grade"
+        verbose_name_plural = "Células da Grade"
+        unique_together = ('linha', 'coluna')
+
+    def __str__(self):
+        return f"Célula ({self.latitude}, {self.longitude})"
+
+
 class Localidade(models.Model):
     """
     Representa uma localidade (município) com coordenadas geográficas.
+    O clima diário da localidade é o da `celula` da grade que a contém.
     """
     nome = models.CharField(
         max_length=255,
-        unique=True,
         verbose_name="Nome da Localidade"
     )
     latitude = models.FloatField()
     longitude = models.FloatField()
+    uf = models.CharField(
+        max_length=2,
+        default='MT',
+        verbose_name="Estado (UF)",
+        help_text="Sigla da Unidade Federativa (UF)."
+    )
+    celula = models.ForeignKey(
+        CelulaGrade,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='localidades',
+        verbose_name="Célula da Grade",
+    )
 
     class Meta:
         verbose_name = "Localidade"
         verbose_name_plural = "Localidades"
+        unique_together = ('nome', 'uf')
 
     def __str__(self):
         return self.nome
@@ -63,12 +127,17 @@ class Localidade(models.Model):
 
 class DadoMeteorologicoDiario(models.Model):
     """
-    Armazena os dados meteorológicos da NASA para um dia em uma localidade.
+    Armazena os dados meteorológicos da NASA para um dia em uma célula da
+    grade; as localidades leem a série pela célula que as contém.
+
+    No PostgreSQL a tabela é particionada por ano de `data` (migração 0006,
+    ver `core/particoes.py`); filtre por intervalo de datas para que só as
+    partições do período sejam lidas.
     """
-    localidade = models.ForeignKey(
-        Localidade,
+    celula = models.ForeignKey(
+        CelulaGrade,
         on_delete=models.CASCADE,
-        verbose_name="Localidade",
+        verbose_name="Célula da Grade",
     )
     data = models.DateField(
         verbose_name="Data da Medição"
@@ -89,7 +158,302 @@ class DadoMeteorologicoDiario(models.Model):
     class Meta:
         verbose_name = "Dado Meteorológico Diário"
         verbose_name_plural = "Dados Meteorológicos Diários"
-        unique_together = ('localidade', 'data')
+        unique_together = ('celula', 'data')
+
+    def __str__(self):
+        return f"Dados de {self.celula} para {self.data.strftime('%Y-%m-%d')}"
+
+
+class EstacaoMeteorologica(models.Model):
+    """
+    Estação meteorológica automática do INMET.
+    """
+    codigo = models.CharField(
+        max_length=10,
+        unique=True,
+        verbose_name="Código da Estação",
+        help_text="Código INMET da estação (ex: A901)."
+    )
+    nome = models.CharField(max_length=255, verbose_name="Nome da Estação")
+    uf = models.CharField(max_length=2, verbose_name="Estado (UF)")
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    altitude = models.FloatField(null=True, blank=True)
+    data_inicio_operacao = models.DateField(
+        verbose_name="Início de Operação",
+        null=True, blank=True
+    )
+
+    class Meta:
+        verbose_name = "Estação Meteorológica"
+        verbose_name_plural = "Estações Meteorológicas"
+        indexes = [
+            models.Index(fields=['uf'], name='estacao_uf_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.codigo} - {self.nome}"
+
+
+class DadoEstacaoDiario(models.Model):
+    """
+    Armazena os dados diários medidos por uma estação do INMET.
+    """
+    estacao = models.ForeignKey(
+        EstacaoMeteorologica,
+        on_delete=models.CASCADE,
+        verbose_name="Estação",
+    )
+    data = models.DateField(
+        verbose_name="Data da Medição"
+    )
+    precipitacao_mm = models.FloatField(
+        verbose_name="Precipitação (mm/dia)",
+        null=True, blank=True
+    )
+    temp_maxima_c = models.FloatField(
+        verbose_name="Temperatura Máxima (°C)",
+        null=True, blank=True
+    )
+    temp_minima_c = models.FloatField(
+        verbose_name="Temperatura Mínima (°C)",
+        null=True, blank=True
+    )
+    umidade_media_porc = models.FloatField(
+        verbose_name="Umidade Relativa Média (%)",
+        null=True, blank=True
+    )
+
+    class Meta:
+        verbose_name = "Dado Diário de Estação"
+        verbose_name_plural = "Dados Diários de Estações"
+        unique_together = ('estacao', 'data')
+
+    def __str__(self):
+        return f"Dados da estação {self.estacao.codigo} para {self.data.strftime('%Y-%m-%d')}"
+
+class CuboSafra(models.Model):
+    """
+    Totais de `SafraAnual` pré-calculados em todos os níveis de UF, produto
+    e safra (cubo ano x UF x produto x safra). `TODOS` no lugar de uma
+    dimensão indica o total sobre ela: (uf='*', produto_slug='soja',
+    safra='2') é a 2ª safra de soja do Brasil. Qualquer recorte do dashboard
+    é uma busca pelo índice único, sem GROUP BY sobre a série. Recalculado
+    ao final de cada importação da Conab (`core.agregados.atualizar_cubo_safras`).
+    """
+    TODOS = '*'
+
+    ano = models.IntegerField(verbose_name="Ano da Safra")
+    uf = models.CharField(max_length=2, verbose_name="Estado (UF)", help_text="Sigla da UF, ou '*' para o Brasil.")
+    produto_slug = models.SlugField(
+        max_length=255, db_index=False, verbose_name="Chave do Produto",
+        help_text="Chave do produto, ou '*' para todos os produtos."
+    )
+    produto = models.CharField(max_length=255, verbose_name="Produto Agricola")
+    safra = models.CharField(
+        max_length=5, verbose_name="Safra",
+        help_text="Safra (unica, 1, 2 ou 3), ou '*' para o total do ano agrícola."
+    )
+    area_plantada_ha = models.FloatField(verbose_name="Área Plantada (ha)", null=True, blank=True)
+    producao_toneladas = models.FloatField(verbose_name="Produção (t)", null=True, blank=True)
+    produtividade_kg_ha = models.FloatField(
+        verbose_name="Produtividade (kg/ha)",
+        help_text="Produção sobre área plantada do recorte.",
+        null=True, blank=True
+    )
+
+    class Meta:
+        verbose_name = "Cubo de Safras"
+        verbose_name_plural = "Cubo de Safras"
+        # O índice único atende os recortes: (uf, produto, safra) fixos, anos em sequência
+        unique_together = ('uf', 'produto_slug', 'safra', 'ano')
+
+    def __str__(self):
+        return f"{self.produto} em {self.uf} - Safra {self.ano} ({self.safra})"
+
+
+class ClimaAnual(models.Model):
+    """
+    Resumo anual de `DadoMeteorologicoDiario` por localidade.
+    Atualizado pelas importações da NASA para os anos que elas alteram.
+    """
+    localidade = models.ForeignKey(
+        Localidade,
+        on_delete=models.CASCADE,
+        verbose_name="Localidade",
+    )
+    uf = models.CharField(max_length=2, verbose_name="Estado (UF)")
+    ano = models.IntegerField(verbose_name="Ano")
+    precipitacao_total_mm = models.FloatField(
+        verbose_name="Precipitação Total (mm)",
+        null=True, blank=True
+    )
+    temp_maxima_media_c = models.FloatField(
+        verbose_name="Média da Temperatura Máxima (°C)",
+        null=True, blank=True
+    )
+    temp_minima_media_c = models.FloatField(
+        verbose_name="Média da Temperatura Mínima (°C)",
+        null=True, blank=True
+    )
+    dias = models.IntegerField(verbose_name="Dias com Medição", default=0)
+
+    class Meta:
+        verbose_name = "Clima Anual"
+        verbose_name_plural = "Climas Anuais"
+        unique_together = ('localidade', 'ano')
+
+    def __str__(self):
+        return f"Clima de {self.localidade.nome} em {self.ano}"
+
+
+class ArquivoFonte(models.Model):
+    """
+    Metadados da última versão importada de um arquivo de fonte externa
+    (ex: série histórica da Conab), usados no download condicional.
+    """
+    url = models.URLField(max_length=500, unique=True, verbose_name="URL")
+    etag = models.CharField(max_length=255, blank=True, default='', verbose_name="ETag")
+    last_modified = models.CharField(max_length=64, blank=True, default='', verbose_name="Last-Modified")
+    sha256 = models.CharField(max_length=64, blank=True, default='', verbose_name="Hash SHA-256 do Conteúdo")
+    atualizado_em = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
+
+    class Meta:
+        verbose_name = "Arquivo de Fonte"
+        verbose_name_plural = "Arquivos de Fonte"
+
+    def __str__(self):
+        return self.url
+
+
+class IndicadorSafra(models.Model):
+    """
+    Indicadores agroclimáticos de uma localidade em uma safra (ano agrícola
+    de julho a junho, como o `ano_agricola` da Conab: safra 2019 = "2019/20").
+    Calculados a partir de `DadoMeteorologicoDiario` por `core/indicadores.py`.
+    """
+    localidade = models.ForeignKey(
+        Localidade,
+        on_delete=models.CASCADE,
+        verbose_name="Localidade",
+    )
+    uf = models.CharField(max_length=2, verbose_name="Estado (UF)")
+    ano = models.IntegerField(
+        verbose_name="Ano da Safra",
+        help_text="Ano de início da safra agrícola (mesma convenção de SafraAnual)."
+    )
+    graus_dia = models.FloatField(
+        verbose_name="Graus-Dia Acumulados (°C·dia)",
+        null=True, blank=True
+    )
+    precipitacao_total_mm = models.FloatField(
+        verbose_name="Precipitação Total (mm)",
+        null=True, blank=True
+    )
+    chuva_maxima_janela_mm = models.FloatField(
+        verbose_name="Maior Chuva em Janela Móvel (mm)",
+        help_text="Maior soma de precipitação em JANELA_CHUVA_DIAS dias consecutivos.",
+        null=True, blank=True
+    )
+    maior_veranico_dias = models.IntegerField(
+        verbose_name="Maior Veranico (dias)",
+        help_text="Maior sequência de dias consecutivos sem chuva.",
+        default=0
+    )
+    dias_estresse_calor = models.IntegerField(
+        verbose_name="Dias com Estresse Térmico",
+        help_text="Dias com temperatura máxima acima do limiar de estresse.",
+        default=0
+    )
+    dias = models.IntegerField(verbose_name="Dias com Medição", default=0)
+
+    class Meta:
+        verbose_name = "Indicador da Safra"
+        verbose_name_plural = "Indicadores das Safras"
+        unique_together = ('localidade', 'ano')
+        indexes = [
+            models.Index(fields=['uf', 'ano'], name='indicador_uf_ano_idx'),
+        ]
+
+    def __str__(self):
+        return f"Indicadores de {self.localidade.nome} na safra {self.ano}"
+
+
+class ExecucaoImportacao(models.Model):
+    """
+    Uma execução de importação (Conab, NASA ou INMET), com o resumo das
+    métricas (`core.metricas.Medicao`). As unidades de trabalho ficam em
+    `UnidadeImportacao`.
+    """
+    STATUS = [
+        ('em_andamento', 'Em andamento'),
+        ('sucesso', 'Sucesso'),
+        ('parcial', 'Parcial'),
+        ('falha', 'Falha'),
+    ]
+
+    fonte = models.CharField(max_length=20, verbose_name="Fonte")
+    status = models.CharField(max_length=20, choices=STATUS, default='em_andamento', verbose_name="Status")
+    iniciada_em = models.DateTimeField(auto_now_add=True, verbose_name="Iniciada em")
+    concluida_em = models.DateTimeField(null=True, blank=True, verbose_name="Concluída em")
+    unidades = models.IntegerField(default=0, verbose_name="Unidades Planejadas")
+    resumo = models.JSONField(null=True, blank=True, verbose_name="Resumo das Métricas")
+
+    class Meta:
+        verbose_name = "Execução de Importação"
+        verbose_name_plural = "Execuções de Importação"
+        indexes = [
+            models.Index(fields=['fonte', '-iniciada_em'], name='execucao_fonte_idx'),
+        ]
+
+    def __str__(self):
+        return f"Importação {self.fonte} de {self.iniciada_em:%d/%m/%Y %H:%M} ({self.status})"
+
+
+class UnidadeImportacao(models.Model):
+    """
+    Checkpoint de uma unidade de trabalho de uma fonte: um período de uma
+    célula da grade (NASA), de uma estação (INMET) ou um par UF/produto (Conab).
+    As importações pulam as unidades concluídas e refazem as pendentes ou com
+    falha (ver `core/checkpoints.py`).
+    """
+    STATUS = [
+        ('pendente', 'Pendente'),
+        ('concluida', 'Concluída'),
+        ('falhou', 'Falhou'),
+    ]
+
+    fonte = models.CharField(max_length=20, verbose_name="Fonte")
+    chave = models.CharField(max_length=255, verbose_name="Chave da Unidade")
+    referencia = models.CharField(
+        max_length=255,
+        verbose_name="Referência",
+        help_text="Id da célula da grade, código da estação ou UF/produto."
+    )
+    inicio = models.DateField(null=True, blank=True, verbose_name="Início do Período")
+    fim = models.DateField(null=True, blank=True, verbose_name="Fim do Período")
+    status = models.CharField(max_length=20, choices=STATUS, default='pendente', verbose_name="Status")
+    linhas = models.IntegerField(default=0, verbose_name="Linhas Gravadas")
+    sha256 = models.CharField(max_length=64, blank=True, default='', verbose_name="Hash SHA-256 do Conteúdo")
+    tentativas = models.IntegerField(default=0, verbose_name="Tentativas")
+    erro = models.TextField(blank=True, default='', verbose_name="Último Erro")
+    execucao = models.ForeignKey(
+        ExecucaoImportacao,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='unidades_processadas',
+        verbose_name="Última Execução",
+    )
+    atualizada_em = models.DateTimeField(auto_now=True, verbose_name="Atualizada em")
+    concluida_em = models.DateTimeField(null=True, blank=True, verbose_name="Concluída em")
+
+    class Meta:
+        verbose_name = "Unidade de Importação"
+        verbose_name_plural = "Unidades de Importação"
+        unique_together = ('fonte', 'chave')
+        indexes = [
+            models.Index(fields=['fonte', 'status'], name='unidade_fonte_status_idx'),
+        ]
 
     def __str__(self):
-        return f"Dados de {self.localidade.nome} para {self.data.strftime('%Y-%m-%d')}"
\ No newline at end of file
+        return f"{self.fonte} {self.chave} ({self.status})"
@@ -0,0 +1,43 @@
+"""
+Cadastro de localidades a partir do arquivo de coordenadas dos municípios
+(`data/municipios.csv`, colunas nome;uf;latitude;longitude, com as
+coordenadas aproximadas da sede). Cada município é ligado à sua célula da
+grade da NASA POWER (ver `core/grade.py`).
+"""
+from pathlib import Path
+
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+
+from .grade import atribuir_celulas
+from .models import Localidade
+
+ARQUIVO_MUNICIPIOS = Path(settings.BASE_DIR) / 'data' / 'municipios.csv'
+UFS_PADRAO = ('MT',)
+
+
+def ler_municipios(ufs=UFS_PADRAO, caminho=ARQUIVO_MUNICIPIOS):
+    """Municípios de `ufs` (todos, se None) como DataFrame nome, uf, latitude, longitude."""
+    df = pd.read_csv(caminho, sep=';', dtype={'nome': str, 'uf': str})
+    if ufs is not None:
+        df = df[df['uf'].isin(ufs)]
+    return df
+
+
+def cadastrar_municipios(ufs=UFS_PADRAO, caminho=ARQUIVO_MUNICIPIOS):
+    """
+    Cria ou atualiza uma `Localidade` por município de `ufs` e liga cada uma
+    à sua célula da grade. Retorna (localidades, células).
+    """
+    df = ler_municipios(ufs, caminho)
+    with transaction.atomic():
+        Localidade.objects.bulk_create(
+            [Localidade(**registro) for registro in df.to_dict('records')],
+            update_conflicts=True,
+            unique_fields=['nome', 'uf'],
+            update_fields=['latitude', 'longitude'],
+        )
+        localidades = Localidade.objects.filter(uf__in=df['uf'].unique())
+        celulas = atribuir_celulas(localidades)
+    return len(df), celulas
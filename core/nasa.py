@@ -0,0 +1,327 @@
+"""
+Funções compartilhadas da importação NASA POWER: busca concorrente, parse
+colunar e gravação em lote de `DadoMeteorologicoDiario`.
+
+A unidade de busca é a célula da grade (`CelulaGrade`), não a localidade:
+municípios na mesma célula compartilham uma única série (ver `core/grade.py`).
+"""
+from collections import defaultdict
+from datetime import date, datetime
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import connection, transaction
+
+from .agregados import anos_do_periodo, atualizar_clima_anual
+from .checkpoints import concluir_unidade, falhar_unidade, hash_conteudo, unidades_a_refazer
+from .coleta import ColetorConcorrente, criar_limitador
+from .grade import indices_celula, obter_celulas
+from .metricas import Medicao
+from .models import CelulaGrade, DadoMeteorologicoDiario
+from .particoes import garantir_particoes, substituir_ano
+from .respostas_brutas import criar_armazem
+
+API_BASE_URL = "https://power.larc.nasa.gov/api/temporal/daily/point"
+PARAMS = "parameters=T2M_MAX,T2M_MIN,PRECTOTCORR&community=AG&format=JSON"
+
+# Chave do token bucket da API no Redis (ver `coleta.LimitadorTaxaCompartilhado`)
+CHAVE_LIMITE_TAXA = 'datum_safra:limite_taxa:nasa'
+
+# Valor usado pela NASA POWER para dias sem medição
+VALOR_AUSENTE = -999
+
+# Parâmetro da API -> coluna de DadoMeteorologicoDiario
+PARAMETROS_NASA = {
+    'T2M_MAX': 'temp_maxima_c',
+    'T2M_MIN': 'temp_minima_c',
+    'PRECTOTCORR': 'precipitacao_mm',
+}
+COLUNAS_VALORES = list(PARAMETROS_NASA.values())
+
+# Linhas por INSERT; mantém o número de parâmetros abaixo do limite do PostgreSQL
+TAMANHO_LOTE_DIARIO = 2000
+
+
+def montar_url(latitude, longitude, inicio, fim):
+    """Monta a URL da API para o período [inicio, fim] (datas no formato AAAAMMDD)."""
+    return f"{API_BASE_URL}?{PARAMS}&latitude={latitude}&longitude={longitude}&start={inicio}&end={fim}"
+
+
+def interpretar_url(url):
+    """(latitude, longitude, inicio, fim) de uma URL montada por `montar_url`."""
+    consulta = dict(parse_qsl(urlsplit(url).query))
+    return float(consulta['latitude']), float(consulta['longitude']), consulta['start'], consulta['end']
+
+
+def fim_da_url(url):
+    """Último dia pedido numa URL da API, para a validade da resposta no armazém."""
+    return datetime.strptime(interpretar_url(url)[3], '%Y%m%d').date()
+
+
+def parse_parametros(parametros):
+    """
+    Converte os dicionários {AAAAMMDD: valor} da NASA em um DataFrame colunar
+    indexado pela data, descartando os dias com algum valor ausente (-999).
+    """
+    df = pd.DataFrame({coluna: parametros[nome] for nome, coluna in PARAMETROS_NASA.items()})
+    valores = df[COLUNAS_VALORES]
+    validos = (valores != VALOR_AUSENTE).all(axis=1) & valores.notna().all(axis=1)
+    df = df[validos]
+    df.index = pd.to_datetime(df.index, format='%Y%m%d').date
+    df.index.name = 'data'
+    return df
+
+
+def gravar_dados_diarios(celula_id, df, tamanho_lote=TAMANHO_LOTE_DIARIO):
+    """
+    Grava `df` (saída de `parse_parametros`) com um único
+    INSERT ... ON CONFLICT (celula_id, data) DO UPDATE por lote.
+
+    Linhas cujos valores já estão gravados não são reescritas.
+    Retorna a quantidade de linhas inseridas ou alteradas.
+    """
+    if df.empty:
+        return 0
+    garantir_particoes({data.year for data in df.index})
+
+    tabela = connection.ops.quote_name(DadoMeteorologicoDiario._meta.db_table)
+    colunas = ['celula_id', 'data'] + COLUNAS_VALORES
+    atualizacoes = ', '.join(f'{c} = EXCLUDED.{c}' for c in COLUNAS_VALORES)
+    diferentes = ' OR '.join(f'{tabela}.{c} IS DISTINCT FROM EXCLUDED.{c}' for c in COLUNAS_VALORES)
+    marcador_linha = '(' + ', '.join(['%s'] * len(colunas)) + ')'
+
+    linhas = [
+        (celula_id, data, *valores)
+        for data, valores in zip(df.index, df[COLUNAS_VALORES].itertuples(index=False, name=None))
+    ]
+
+    alteradas = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        for inicio in range(0, len(linhas), tamanho_lote):
+            lote = linhas[inicio:inicio + tamanho_lote]
+            sql = (
+                f"INSERT INTO {tabela} ({', '.join(colunas)}) "
+                f"VALUES {', '.join([marcador_linha] * len(lote))} "
+                f"ON CONFLICT (celula_id, data) DO UPDATE SET {atualizacoes} "
+                f"WHERE {diferentes}"
+            )
+            cursor.execute(sql, [valor for linha in lote for valor in linha])
+            alteradas += max(cursor.rowcount, 0)
+    return alteradas
+
+
+def planejar_periodos(celulas, anos, hoje=None, max_dias=None, tolerancia_dias=None):
+    """
+    Consulta o banco e devolve só os períodos que ainda faltam para cada
+    célula da grade, como lista de (celula, inicio, fim) no formato AAAAMMDD.
+
+    Os dias ausentes dos `anos` desejados são agrupados em intervalos
+    contíguos; lacunas separadas por até `tolerancia_dias` dias já gravados
+    viram uma única requisição, e nenhum intervalo passa de `max_dias` dias.
+    """
+    max_dias = max_dias or settings.NASA_POWER_MAX_DIAS_POR_REQUISICAO
+    if tolerancia_dias is None:
+        tolerancia_dias = settings.NASA_POWER_TOLERANCIA_LACUNA_DIAS
+    anos = sorted(set(anos))
+    if not anos:
+        return []
+
+    desejadas = np.concatenate([
+        np.arange(f'{ano}-01-01', f'{ano + 1}-01-01', dtype='datetime64[D]') for ano in anos
+    ])
+    desejadas = desejadas[desejadas <= np.datetime64(hoje or date.today())]
+    if not len(desejadas):
+        return []
+
+    existentes = defaultdict(list)
+    gravadas = DadoMeteorologicoDiario.objects.filter(
+        celula__in=celulas,
+        data__gte=desejadas[0].item(), data__lte=desejadas[-1].item(),
+    ).values_list('celula_id', 'data')
+    for celula_id, data in gravadas.iterator(chunk_size=10000):
+        existentes[celula_id].append(data)
+
+    plano = []
+    for celula in celulas:
+        faltantes = np.setdiff1d(desejadas, np.array(existentes[celula.id], dtype='datetime64[D]'))
+        for inicio, fim in agrupar_intervalos(faltantes, tolerancia_dias, max_dias):
+            plano.append((celula, _formatar_data(inicio), _formatar_data(fim)))
+    return plano
+
+
+def agrupar_intervalos(datas, tolerancia_dias, max_dias):
+    """Agrupa um array ordenado de datetime64[D] em intervalos (inicio, fim) de até `max_dias` dias."""
+    if not len(datas):
+        return []
+    quebras = np.flatnonzero(np.diff(datas).astype(int) > tolerancia_dias + 1)
+    inicios = np.concatenate([[0], quebras + 1])
+    fins = np.concatenate([quebras, [len(datas) - 1]])
+
+    intervalos = []
+    passo = np.timedelta64(1, 'D')
+    for i, f in zip(inicios, fins):
+        inicio, fim = datas[i], datas[f]
+        while inicio <= fim:
+            fim_bloco = min(fim, inicio + (max_dias - 1) * passo)
+            intervalos.append((inicio, fim_bloco))
+            inicio = fim_bloco + passo
+    return intervalos
+
+
+def celulas_com_localidades():
+    """Células da grade ligadas a alguma localidade, as únicas que são buscadas."""
+    return CelulaGrade.objects.filter(localidades__isnull=False).distinct().order_by('pk')
+
+
+def periodos_a_refazer():
+    """Períodos (celula, inicio, fim) pendentes ou com falha nos checkpoints da NASA."""
+    unidades = unidades_a_refazer('nasa', formato='%Y%m%d')
+    celulas = CelulaGrade.objects.in_bulk({int(referencia) for referencia, _, _ in unidades})
+    return [
+        (celulas[int(referencia)], inicio, fim)
+        for referencia, inicio, fim in unidades if int(referencia) in celulas
+    ]
+
+
+def periodos_armazenados(armazem):
+    """
+    Períodos (celula, inicio, fim) de todas as respostas guardadas no
+    `armazem`, da mais antiga para a mais nova, para o replay. As células
+    que ainda não existem no banco são criadas.
+    """
+    periodos = []
+    for entrada in armazem.entradas():
+        latitude, longitude, inicio, fim = interpretar_url(entrada['url'])
+        periodos.append((indices_celula(latitude, longitude), inicio, fim))
+    celulas = obter_celulas(indices for indices, _, _ in periodos)
+    return [(celulas[indices], inicio, fim) for indices, inicio, fim in periodos]
+
+
+def _formatar_data(data):
+    return np.datetime_as_string(data, unit='D').replace('-', '')
+
+
+def criar_coletor(max_simultaneas=None, replay=False):
+    """
+    Coletor HTTP configurado pelos parâmetros NASA_POWER_* do settings, com
+    o armazém de respostas brutas. Com `replay`, lê só do armazém, sem rede.
+    A taxa é controlada no Redis de LIMITE_TAXA_URL, compartilhada com os
+    outros workers e comandos, de modo que NASA_POWER_REQUISICOES_POR_SEGUNDO
+    vale para o total e não por processo.
+    """
+    if replay:
+        # Uma resposta por vez, na ordem de `periodos_armazenados`: onde dois
+        # períodos se sobrepõem, vale a resposta mais nova
+        return ColetorConcorrente(
+            max_simultaneas=1, requisicoes_por_segundo=None, tentativas=1,
+            armazem=criar_armazem('nasa', fim_da_url, somente_local=True),
+        )
+    return ColetorConcorrente(
+        max_simultaneas=max_simultaneas or settings.NASA_POWER_MAX_SIMULTANEAS,
+        tentativas=settings.NASA_POWER_TENTATIVAS,
+        armazem=criar_armazem('nasa', fim_da_url),
+        limitador=criar_limitador(
+            settings.NASA_POWER_REQUISICOES_POR_SEGUNDO, settings.LIMITE_TAXA_URL, CHAVE_LIMITE_TAXA,
+        ),
+    )
+
+
+def importar_periodos(unidades, coletor=None, medicao=None, execucao=None):
+    """
+    Busca de forma concorrente cada (celula, inicio, fim) de `unidades` e
+    grava cada resposta assim que ela chega, enquanto as demais seguem em voo.
+
+    Gera (celula, inicio, fim, alteradas, erro) por unidade; `erro` é None
+    quando a busca e a gravação deram certo. Tempos, requisições e falhas vão
+    para `medicao`, se informada, e o resultado de cada unidade para o
+    checkpoint da `execucao` (`ExecucaoImportacao`), se informada.
+    """
+    coletor = coletor or criar_coletor()
+    medicao = medicao or Medicao('nasa')
+    coletor.medicao = medicao
+    tarefas = (
+        ((celula, inicio, fim), montar_url(celula.latitude, celula.longitude, inicio, fim))
+        for celula, inicio, fim in unidades
+    )
+    for (celula, inicio, fim), dados, erro in coletor.executar(tarefas):
+        alteradas = 0
+        if erro is None:
+            try:
+                alteradas = _gravar_resposta(celula, dados, medicao)
+                if alteradas:
+                    with medicao.etapa('agregados') as etapa:
+                        etapa.linhas = atualizar_clima_anual(celula.id, anos_do_periodo(inicio, fim))
+            except Exception as e:
+                erro = e
+        if erro is None:
+            medicao.unidade_concluida()
+            if execucao:
+                concluir_unidade(execucao.id, 'nasa', celula.id, inicio, fim, alteradas, hash_conteudo(dados))
+        else:
+            medicao.registrar_erro(f'{celula} {inicio}-{fim}', erro)
+            if execucao:
+                falhar_unidade(execucao.id, 'nasa', celula.id, inicio, fim, erro)
+        yield celula, inicio, fim, alteradas, erro
+
+
+def _gravar_resposta(celula, dados, medicao):
+    with medicao.etapa('parse') as etapa:
+        df = parse_parametros(dados['properties']['parameter'])
+        etapa.linhas = len(df)
+    with medicao.etapa('carga') as etapa:
+        etapa.linhas = gravar_dados_diarios(celula.id, df)
+    return etapa.linhas
+
+
+def importar_periodo(celula, inicio, fim, coletor=None, medicao=None, execucao_id=None):
+    """
+    Busca e grava um único período de uma célula da grade. Retorna as linhas alteradas.
+    Não atualiza `ClimaAnual`; quem chama decide quando recalcular.
+    Com `execucao_id`, cada tentativa fica registrada no checkpoint da unidade.
+    """
+    coletor = coletor or criar_coletor(max_simultaneas=1)
+    medicao = medicao or Medicao('nasa')
+    coletor.medicao = medicao
+    try:
+        with medicao.etapa('download'):
+            dados = coletor.obter_json(montar_url(celula.latitude, celula.longitude, inicio, fim))
+        alteradas = _gravar_resposta(celula, dados, medicao)
+    except Exception as e:
+        if execucao_id:
+            falhar_unidade(execucao_id, 'nasa', celula.id, inicio, fim, e)
+        raise
+    if execucao_id:
+        concluir_unidade(execucao_id, 'nasa', celula.id, inicio, fim, alteradas, hash_conteudo(dados))
+    return alteradas
+
+
+def reimportar_ano(ano, celulas, coletor=None, hoje=None):
+    """
+    Busca o `ano` inteiro de todas as `celulas` da grade e troca a partição do
+    ano de uma vez (ver `particoes.substituir_ano`), em vez de fazer upsert
+    linha a linha. Se alguma célula falhar nada é trocado e o erro é repassado.
+
+    Retorna a quantidade de dias gravados.
+    """
+    coletor = coletor or criar_coletor()
+    inicio = f'{ano}0101'
+    fim = _formatar_data(min(np.datetime64(f'{ano}-12-31'), np.datetime64(hoje or date.today())))
+    tarefas = (
+        (celula, montar_url(celula.latitude, celula.longitude, inicio, fim))
+        for celula in celulas
+    )
+    linhas = []
+    for celula, dados, erro in coletor.executar(tarefas):
+        if erro is not None:
+            raise erro
+        df = parse_parametros(dados['properties']['parameter'])
+        linhas.extend(
+            (celula.id, data, *valores)
+            for data, valores in zip(df.index, df[COLUNAS_VALORES].itertuples(index=False, name=None))
+        )
+    gravadas = substituir_ano(ano, linhas, colunas=['celula_id', 'data'] + COLUNAS_VALORES)
+    for celula in celulas:
+        atualizar_clima_anual(celula.id, [ano])
+    return gravadas
@@ -0,0 +1,206 @@
+"""
+Particionamento por ano (RANGE em `data`) da tabela de `DadoMeteorologicoDiario`
+no PostgreSQL.
+
+A tabela-mãe é criada pela migração 0006; cada ano fica numa partição
+`<tabela>_<ano>` e dias de anos ainda sem partição caem na partição padrão
+`<tabela>_padrao`. Consultas com intervalo de datas constante (como
+`data__year=ano`) só leem as partições do intervalo.
+
+Em outros bancos (SQLite no desenvolvimento) a tabela continua simples e as
+funções daqui caem no caminho equivalente sem partições.
+"""
+import re
+import time
+from datetime import date
+
+from django.db import OperationalError, connection, transaction
+
+from .models import DadoMeteorologicoDiario
+from .tabela_sombra import TEMPO_LOCK_TROCA, TENTATIVAS_TROCA
+
+# Chave do advisory lock que serializa a criação/troca de partições entre workers
+CHAVE_LOCK_PARTICOES = 7_310_001
+
+COLUNAS = ['celula_id', 'data', 'precipitacao_mm', 'temp_maxima_c', 'temp_minima_c']
+TAMANHO_LOTE_CARGA = 2000
+
+# Anos que já se sabe ter partição neste processo, para não consultar o catálogo a cada lote.
+# Só é atualizado quando a transação que criou as partições é confirmada.
+_anos_conhecidos = set()
+
+
+def tabela_particionada():
+    return connection.vendor == 'postgresql'
+
+
+def _tabela():
+    return DadoMeteorologicoDiario._meta.db_table
+
+
+def nome_particao(ano):
+    return f'{_tabela()}_{ano}'
+
+
+def _limites(ano):
+    return date(ano, 1, 1).isoformat(), date(ano + 1, 1, 1).isoformat()
+
+
+def anos_com_particao(cursor):
+    """Anos que já têm partição própria, lidos do catálogo (pg_inherits)."""
+    cursor.execute(
+        """
+        SELECT filha.relname FROM pg_inherits
+        JOIN pg_class filha ON filha.oid = pg_inherits.inhrelid
+        JOIN pg_class mae ON mae.oid = pg_inherits.inhparent
+        WHERE mae.relname = %s
+        """,
+        [_tabela()],
+    )
+    prefixo = f'{_tabela()}_'
+    return {
+        int(nome[len(prefixo):]) for (nome,) in cursor.fetchall()
+        if nome[len(prefixo):].isdigit()
+    }
+
+
+def _criar_tabela_ano(cursor, nome, ano):
+    """Cria uma tabela avulsa com a estrutura da mãe e o CHECK do ano, pronta para ATTACH."""
+    q = connection.ops.quote_name
+    inicio, fim = _limites(ano)
+    cursor.execute(f'CREATE TABLE {q(nome)} (LIKE {q(_tabela())} INCLUDING DEFAULTS)')
+    # Com o CHECK equivalente ao intervalo, o ATTACH não precisa varrer a tabela
+    cursor.execute(
+        f'ALTER TABLE {q(nome)} ADD CONSTRAINT {q(nome + "_ano")} '
+        f"CHECK (data >= DATE '{inicio}' AND data < DATE '{fim}')"
+    )
+
+
+def _anexar(cursor, nome, ano):
+    q = connection.ops.quote_name
+    inicio, fim = _limites(ano)
+    cursor.execute(
+        f'ALTER TABLE {q(_tabela())} ATTACH PARTITION {q(nome)} '
+        f"FOR VALUES FROM ('{inicio}') TO ('{fim}')"
+    )
+
+
+def garantir_particoes(anos):
+    """
+    Cria as partições que faltam para `anos`. Dias desses anos que já estavam
+    na partição padrão são movidos para a partição nova.
+    """
+    anos = set(anos) - _anos_conhecidos
+    if not anos or not tabela_particionada():
+        return
+    q = connection.ops.quote_name
+    padrao = f'{_tabela()}_padrao'
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [CHAVE_LOCK_PARTICOES])
+        existentes = anos_com_particao(cursor)
+        for ano in sorted(anos - existentes):
+            nome = nome_particao(ano)
+            inicio, fim = _limites(ano)
+            _criar_tabela_ano(cursor, nome, ano)
+            cursor.execute(
+                f'WITH movidos AS (DELETE FROM {q(padrao)} WHERE data >= %s AND data < %s RETURNING *) '
+                f'INSERT INTO {q(nome)} SELECT * FROM movidos',
+                [inicio, fim],
+            )
+            _anexar(cursor, nome, ano)
+        # Dentro de uma transação externa que depois é desfeita, as partições somem;
+        # o cache do processo só passa a contar com elas depois do commit
+        confirmados = anos | existentes
+        transaction.on_commit(lambda: _anos_conhecidos.update(confirmados))
+
+
+def _preparar_anexacao(cursor, nome):
+    """
+    Cria na tabela `nome` os índices e as chaves estrangeiras da mãe, para
+    o ATTACH só reaproveitá-los (alteração de catálogo) em vez de construir
+    índices e varrer a tabela com os locks da troca. Junto com o CHECK do
+    ano, criado com a tabela, deixa a tabela pronta para ser anexada.
+    """
+    q = connection.ops.quote_name
+    mae = q(_tabela())
+    cursor.execute('SELECT pg_get_indexdef(indexrelid) FROM pg_index WHERE indrelid = %s::regclass', [mae])
+    for (definicao,) in cursor.fetchall():
+        cursor.execute(re.sub(r' INDEX \S+ ON (ONLY )?\S+ ', f' INDEX ON {q(nome)} ', definicao))
+    cursor.execute(
+        "SELECT pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [mae],
+    )
+    for i, (definicao,) in enumerate(cursor.fetchall()):
+        restricao = q(f'{nome}_fk{i}')
+        # NOT VALID + VALIDATE confere as linhas sem bloquear escritas na tabela referenciada
+        cursor.execute(f'ALTER TABLE {q(nome)} ADD CONSTRAINT {restricao} {definicao} NOT VALID')
+        cursor.execute(f'ALTER TABLE {q(nome)} VALIDATE CONSTRAINT {restricao}')
+    cursor.execute(f'ANALYZE {q(nome)}')
+
+
+def _trocar_particao(ano, carga, tentativas=TENTATIVAS_TROCA):
+    """
+    Desanexa e apaga a partição de `ano` e anexa `carga` no lugar, numa
+    transação só com alterações de catálogo. Se os locks não saírem em
+    TEMPO_LOCK_TROCA (uma leitura longa em andamento), a transação desiste,
+    sem enfileirar as leituras seguintes atrás dela, e é tentada de novo.
+    """
+    q = connection.ops.quote_name
+    atual = nome_particao(ano)
+    for tentativa in range(1, tentativas + 1):
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [CHAVE_LOCK_PARTICOES])
+                cursor.execute(f"SET LOCAL lock_timeout = '{TEMPO_LOCK_TROCA}'")
+                cursor.execute(f'ALTER TABLE {q(_tabela())} DETACH PARTITION {q(atual)}')
+                _anexar(cursor, carga, ano)
+                cursor.execute(f'DROP TABLE {q(atual)}')
+                cursor.execute(f'ALTER TABLE {q(carga)} RENAME TO {q(atual)}')
+            return
+        except OperationalError:
+            if tentativa == tentativas:
+                raise
+            time.sleep(0.5 * tentativa)
+
+
+def substituir_ano(ano, linhas, colunas=COLUNAS, tamanho_lote=TAMANHO_LOTE_CARGA):
+    """
+    Substitui todos os dias de `ano` pelas `linhas` (tuplas na ordem de
+    `colunas`), para todas as células da grade.
+
+    No PostgreSQL a carga vai para uma tabela separada, sem concorrer com
+    leituras, que recebe antes da troca o CHECK do ano e os mesmos índices e
+    chaves estrangeiras da mãe. A troca (DETACH da partição antiga e ATTACH
+    da nova, na mesma transação) fica só com alterações de catálogo: DETACH
+    ... CONCURRENTLY não serve aqui, porque a mãe tem partição padrão.
+    Retorna a quantidade de linhas gravadas.
+    """
+    linhas = list(linhas)
+    inicio, fim = _limites(ano)
+    if not tabela_particionada():
+        with transaction.atomic():
+            DadoMeteorologicoDiario.objects.filter(data__gte=inicio, data__lt=fim).delete()
+            DadoMeteorologicoDiario.objects.bulk_create(
+                [DadoMeteorologicoDiario(**dict(zip(colunas, linha))) for linha in linhas],
+                batch_size=tamanho_lote,
+            )
+        return len(linhas)
+
+    q = connection.ops.quote_name
+    garantir_particoes([ano])
+    carga = f'{nome_particao(ano)}_carga'
+    marcador_linha = '(' + ', '.join(['%s'] * len(colunas)) + ')'
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {q(carga)}')
+        _criar_tabela_ano(cursor, carga, ano)
+        for i in range(0, len(linhas), tamanho_lote):
+            lote = linhas[i:i + tamanho_lote]
+            cursor.execute(
+                f"INSERT INTO {q(carga)} ({', '.join(colunas)}) VALUES {', '.join([marcador_linha] * len(lote))}",
+                [valor for linha in lote for valor in linha],
+            )
+    # Índices e chaves estrangeiras depois da carga, fora de qualquer lock da mãe
+    with connection.cursor() as cursor:
+        _preparar_anexacao(cursor, carga)
+    _trocar_particao(ano, carga)
+    return len(linhas)
@@ -0,0 +1,136 @@
+"""
+Armazém em disco das respostas brutas das APIs (NASA POWER e INMET).
+
+Cada resposta é guardada comprimida (zstd ou gzip, via pyarrow) e
+endereçada pelo SHA-256 do próprio conteúdo; um índice por requisição
+liga a chave (fonte + caminho + parâmetros da URL, sem o host) ao conteúdo:
+
+    <RESPOSTAS_BRUTAS_DIR>/<fonte>/objetos/<ab>/<sha256>.zst
+    <RESPOSTAS_BRUTAS_DIR>/<fonte>/chaves/<cd>/<chave>.json
+
+Respostas iguais ocupam um único objeto. Uma resposta de um período cujo
+ano já tinha terminado quando ela foi obtida nunca expira; as demais
+(períodos que chegam ao ano corrente, listas de estações) valem por
+RESPOSTAS_BRUTAS_TTL_HORAS. No modo `somente_local` (replay) o armazém
+não expira nada e a falta de uma resposta é um erro, nunca uma requisição.
+"""
+import hashlib
+import json
+import os
+import uuid
+from datetime import date, datetime, timedelta
+from operator import itemgetter
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+import pyarrow as pa
+from django.conf import settings
+from django.utils import timezone
+
+EXTENSOES = {'zstd': '.zst', 'gzip': '.gz'}
+
+
+class RespostaAusente(Exception):
+    """Replay pediu uma URL que não está no armazém."""
+
+
+class ArmazemRespostas:
+    """
+    Respostas brutas de uma `fonte`. `fim_da_url(url)` devolve a data final
+    do período pedido (ou None), usada para decidir se a resposta expira.
+    """
+
+    def __init__(self, fonte, fim_da_url=None, raiz=None, ttl_horas=None, compressao=None, somente_local=False):
+        self.fonte = fonte
+        self.fim_da_url = fim_da_url
+        self.raiz = Path(raiz or settings.RESPOSTAS_BRUTAS_DIR) / fonte
+        self.ttl = timedelta(hours=settings.RESPOSTAS_BRUTAS_TTL_HORAS if ttl_horas is None else ttl_horas)
+        self.compressao = compressao or settings.RESPOSTAS_BRUTAS_COMPRESSAO
+        self.somente_local = somente_local
+
+    def chave(self, url):
+        """SHA-256 de fonte, caminho e parâmetros ordenados; o host não entra."""
+        partes = urlsplit(url)
+        parametros = '&'.join(f'{nome}={valor}' for nome, valor in sorted(parse_qsl(partes.query)))
+        return hashlib.sha256(f'{self.fonte}:{partes.path}?{parametros}'.encode()).hexdigest()
+
+    def _caminho_chave(self, chave):
+        return self.raiz / 'chaves' / chave[:2] / f'{chave}.json'
+
+    def consultar(self, url):
+        """Entrada do índice para `url`, ou None."""
+        try:
+            with open(self._caminho_chave(self.chave(url))) as arquivo:
+                return json.load(arquivo)
+        except FileNotFoundError:
+            return None
+
+    def valida(self, entrada, agora=None):
+        """Respostas de anos encerrados antes da busca não expiram; as demais valem pelo TTL."""
+        obtida_em = datetime.fromisoformat(entrada['obtida_em'])
+        if entrada['fim'] and date.fromisoformat(entrada['fim']).year < obtida_em.year:
+            return True
+        return (agora or timezone.now()) - obtida_em < self.ttl
+
+    def ler(self, url):
+        """
+        Conteúdo guardado para `url` (bytes), ou None se não houver resposta
+        válida. No modo `somente_local` a falta levanta `RespostaAusente`.
+        """
+        entrada = self.consultar(url)
+        if entrada is None:
+            if self.somente_local:
+                raise RespostaAusente(url)
+            return None
+        if not self.somente_local and not self.valida(entrada):
+            return None
+        return self.ler_entrada(entrada)
+
+    def ler_entrada(self, entrada):
+        return pa.input_stream(str(self.raiz / entrada['objeto']), compression=entrada['compressao']).read()
+
+    def gravar(self, url, conteudo):
+        """Guarda `conteudo` (bytes) como resposta de `url`. Devolve a entrada do índice."""
+        sha256 = hashlib.sha256(conteudo).hexdigest()
+        objeto = Path('objetos') / sha256[:2] / f'{sha256}{EXTENSOES[self.compressao]}'
+        caminho = self.raiz / objeto
+        if not caminho.exists():
+            caminho.parent.mkdir(parents=True, exist_ok=True)
+            temporario = caminho.with_name(f'{caminho.name}.{uuid.uuid4().hex}.parcial')
+            with pa.output_stream(str(temporario), compression=self.compressao) as arquivo:
+                arquivo.write(conteudo)
+            os.replace(temporario, caminho)
+
+        fim = self.fim_da_url(url) if self.fim_da_url else None
+        entrada = {
+            'url': url, 'sha256': sha256, 'objeto': str(objeto), 'compressao': self.compressao,
+            'tamanho': len(conteudo), 'obtida_em': timezone.now().isoformat(),
+            'fim': fim.isoformat() if fim else None,
+        }
+        indice = self._caminho_chave(self.chave(url))
+        indice.parent.mkdir(parents=True, exist_ok=True)
+        temporario = indice.with_name(f'{indice.name}.{uuid.uuid4().hex}.parcial')
+        with open(temporario, 'w') as arquivo:
+            json.dump(entrada, arquivo)
+        os.replace(temporario, indice)
+        return entrada
+
+    def entradas(self):
+        """Todas as entradas do índice, da resposta mais antiga para a mais nova."""
+        entradas = []
+        for caminho in (self.raiz / 'chaves').glob('*/*.json'):
+            with open(caminho) as arquivo:
+                entradas.append(json.load(arquivo))
+        return sorted(entradas, key=itemgetter('obtida_em'))
+
+
+def criar_armazem(fonte, fim_da_url=None, somente_local=False):
+    """
+    Armazém da `fonte` configurado pelo settings, ou None se
+    RESPOSTAS_BRUTAS_DIR estiver vazio (o replay exige o armazém).
+    """
+    if not settings.RESPOSTAS_BRUTAS_DIR:
+        if somente_local:
+            raise RespostaAusente('RESPOSTAS_BRUTAS_DIR não configurado; não há respostas para o replay.')
+        return None
+    return ArmazemRespostas(fonte, fim_da_url, somente_local=somente_local)
@@ -0,0 +1,129 @@
+"""
+Séries temporais de `DadoMeteorologicoDiario` para gráficos, com tamanho de
+resposta limitado qualquer que seja o período pedido.
+
+- Resoluções 'semana' e 'mes': agregação feita no banco (Trunc + Sum/Avg).
+- Resolução 'dia': valores diários.
+- Resolução 'auto': a resolução mais fina cujo número de pontos cabe em `pontos`.
+
+Em qualquer resolução, séries com mais de `pontos` pontos são reduzidas com
+LTTB (Largest-Triangle-Three-Buckets), que preserva picos e vales.
+
+Nenhum caminho materializa objetos do ORM: o banco devolve tuplas que vão
+direto para arrays NumPy.
+"""
+from datetime import date
+
+import numpy as np
+from django.db.models import Avg, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .models import DadoMeteorologicoDiario
+
+# Variável -> agregação usada nos baldes semanais/mensais
+VARIAVEIS = {
+    'precipitacao_mm': Sum,
+    'temp_maxima_c': Avg,
+    'temp_minima_c': Avg,
+}
+TRUNCAMENTOS = {'semana': TruncWeek, 'mes': TruncMonth}
+RESOLUCOES = ['auto', 'dia', 'semana', 'mes']
+DIAS_POR_PONTO = {'dia': 1, 'semana': 7, 'mes': 30}
+
+PONTOS_PADRAO = 1000
+MAX_PONTOS = 5000
+
+
+def escolher_resolucao(inicio, fim, pontos):
+    """Resolução mais fina em que o período [inicio, fim] cabe em `pontos` pontos."""
+    dias = (fim - inicio).days + 1
+    for resolucao in ('dia', 'semana'):
+        if dias / DIAS_POR_PONTO[resolucao] <= pontos:
+            return resolucao
+    return 'mes'
+
+
+def lttb(x, y, pontos):
+    """
+    Reduz a série (x, y) a `pontos` pontos com Largest-Triangle-Three-Buckets.
+    Devolve os índices escolhidos, sempre incluindo o primeiro e o último ponto.
+    """
+    n = len(x)
+    if pontos >= n or pontos < 3:
+        return np.arange(n)
+
+    x = x.astype(float)
+    # Baldes internos (o primeiro e o último ponto ficam fixos)
+    limites = np.linspace(1, n - 1, pontos - 1).astype(int)
+    escolhidos = np.empty(pontos, dtype=int)
+    escolhidos[0], escolhidos[-1] = 0, n - 1
+    anterior = 0
+    for i in range(pontos - 2):
+        inicio, fim = limites[i], limites[i + 1]
+        # Média do balde seguinte, terceiro vértice do triângulo
+        prox_inicio, prox_fim = fim, limites[i + 2] if i + 2 < len(limites) else n
+        media_x = x[prox_inicio:prox_fim].mean()
+        media_y = y[prox_inicio:prox_fim].mean()
+        areas = np.abs(
+            (x[anterior] - media_x) * (y[inicio:fim] - y[anterior])
+            - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior])
+        )
+        anterior = inicio + int(np.argmax(areas))
+        escolhidos[i + 1] = anterior
+    return escolhidos
+
+
+def _serie_diaria(consulta, variavel):
+    linhas = consulta.filter(**{f'{variavel}__isnull': False}).order_by('data').values_list('data', variavel)
+    dados = np.array(list(linhas), dtype=object).reshape(-1, 2)
+    return dados[:, 0].astype('datetime64[D]'), dados[:, 1].astype(float)
+
+
+def _serie_agregada(consulta, variavel, resolucao):
+    linhas = (
+        consulta.annotate(periodo=TRUNCAMENTOS[resolucao]('data'))
+        .values('periodo')
+        .annotate(valor=VARIAVEIS[variavel](variavel))
+        .filter(valor__isnull=False)
+        .order_by('periodo')
+        .values_list('periodo', 'valor')
+    )
+    dados = np.array(list(linhas), dtype=object).reshape(-1, 2)
+    return dados[:, 0].astype('datetime64[D]'), dados[:, 1].astype(float)
+
+
+def calcular_serie(localidade_id, inicio, fim, variavel, resolucao, pontos=PONTOS_PADRAO):
+    """
+    Série de uma variável de uma localidade entre `inicio` e `fim` (datas),
+    como {'datas': [...], 'valores': [...]} com no máximo `pontos` pontos.
+    `resolucao` já resolvida (sem 'auto').
+    """
+    # A série da localidade é a da célula da grade que a contém
+    consulta = DadoMeteorologicoDiario.objects.filter(
+        celula__localidades=localidade_id, data__gte=inicio, data__lte=fim,
+    )
+    if resolucao == 'dia':
+        datas, valores = _serie_diaria(consulta, variavel)
+    else:
+        datas, valores = _serie_agregada(consulta, variavel, resolucao)
+    indices = lttb(datas.astype(np.int64), valores, pontos)
+    datas, valores = datas[indices], valores[indices]
+    return {
+        'datas': np.datetime_as_string(datas, unit='D').tolist(),
+        'valores': np.round(valores, 2).tolist(),
+    }
+
+
+def montar_resposta(localidade_id, inicio, fim, resolucao, series):
+    return {
+        'localidade': localidade_id,
+        'inicio': inicio.isoformat(),
+        'fim': fim.isoformat(),
+        'resolucao': resolucao,
+        'series': series,
+    }
+
+
+def interpretar_data(valor, padrao):
+    """Converte AAAA-MM-DD em date; vazio usa `padrao`. ValueError se inválido."""
+    return date.fromisoformat(valor) if valor else padrao
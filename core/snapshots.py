@@ -0,0 +1,141 @@
+"""
+Snapshots colunares (Parquet) de `SafraAnual` e `DadoMeteorologicoDiario`.
+
+Depois de cada importação as tabelas são exportadas para arquivos Parquet
+particionados no estilo Hive em `SNAPSHOTS_DIR`:
+
+    safras/ano=<ano>/uf=<uf>/parte.parquet
+    clima_diario/ano=<ano>/celula_id=<id>/parte.parquet
+
+O clima diário é gravado por célula da grade da NASA POWER (ver
+`core/grade.py`); para ler o de uma localidade, filtre pela célula dela.
+
+As funções `ler_*` leem esses arquivos com memory-map e filtros por
+partição, para análises que não precisam passar pelo PostgreSQL.
+"""
+import os
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.conf import settings
+
+from .models import DadoMeteorologicoDiario, SafraAnual
+
+ARQUIVO_PARTE = 'parte.parquet'
+COMPRESSAO = 'zstd'
+
+COLUNAS_SAFRAS = [
+    'ano', 'uf', 'produto', 'safra', 'produto_slug', 'codigo_produto',
+    'area_plantada_ha', 'producao_toneladas', 'produtividade_kg_ha',
+]
+COLUNAS_CLIMA = ['celula_id', 'data', 'precipitacao_mm', 'temp_maxima_c', 'temp_minima_c']
+
+
+def diretorio(nome):
+    return Path(settings.SNAPSHOTS_DIR) / nome
+
+
+def _gravar_particao(df, caminho):
+    """Grava `df` em `caminho` de forma atômica (arquivo temporário + rename)."""
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    temporario = caminho.with_suffix('.parcial')
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), temporario, compression=COMPRESSAO)
+    os.replace(temporario, caminho)
+
+
+def exportar_safras():
+    """Reescreve o snapshot de `SafraAnual` (série pequena, exportação completa)."""
+    df = pd.DataFrame.from_records(SafraAnual.objects.values_list(*COLUNAS_SAFRAS), columns=COLUNAS_SAFRAS)
+    raiz = diretorio('safras')
+    novo = raiz.with_name('safras.novo')
+    shutil.rmtree(novo, ignore_errors=True)
+    for (ano, uf), particao in df.groupby(['ano', 'uf']):
+        _gravar_particao(particao.drop(columns=['ano', 'uf']), novo / f'ano={ano}' / f'uf={uf}' / ARQUIVO_PARTE)
+
+    # Troca o diretório inteiro de uma vez; leitores nunca veem um snapshot pela metade
+    antigo = raiz.with_name('safras.antigo')
+    shutil.rmtree(antigo, ignore_errors=True)
+    if raiz.exists():
+        os.replace(raiz, antigo)
+    if novo.exists():
+        os.replace(novo, raiz)
+    shutil.rmtree(antigo, ignore_errors=True)
+    return len(df)
+
+
+def remover_particoes_por_localidade():
+    """
+    Apaga as partições ano=<ano>/uf=<uf>/localidade_id=<id> de antes da
+    grade (migração 0009), que não se misturam com as por célula na leitura
+    particionada. Retorna quantas partições de ano foram apagadas.
+    """
+    antigas = list(diretorio('clima_diario').glob('ano=*/uf=*'))
+    for caminho in antigas:
+        shutil.rmtree(caminho, ignore_errors=True)
+    return len(antigas)
+
+
+def exportar_clima_diario(anos_por_celula=None):
+    """
+    Reescreve as partições (ano, célula) de `DadoMeteorologicoDiario`.
+    `anos_por_celula` ({celula_id: anos}) limita a exportação ao que a
+    importação alterou; sem ele, exporta a tabela inteira.
+    """
+    if anos_por_celula is None:
+        anos_por_celula = {}
+        for celula_id, ano in DadoMeteorologicoDiario.objects.values_list(
+            'celula_id', 'data__year'
+        ).distinct():
+            anos_por_celula.setdefault(celula_id, set()).add(ano)
+
+    linhas = 0
+    for celula_id, anos in anos_por_celula.items():
+        for ano in sorted(set(anos)):
+            df = pd.DataFrame.from_records(
+                DadoMeteorologicoDiario.objects.filter(celula_id=celula_id, data__year=ano)
+                .order_by('data').values_list(*COLUNAS_CLIMA),
+                columns=COLUNAS_CLIMA,
+            )
+            caminho = diretorio('clima_diario') / f'ano={ano}' / f'celula_id={celula_id}' / ARQUIVO_PARTE
+            if df.empty:
+                caminho.unlink(missing_ok=True)
+                continue
+            df['data'] = pd.to_datetime(df['data'])
+            _gravar_particao(df.drop(columns=['celula_id']), caminho)
+            linhas += len(df)
+    return linhas
+
+
+def _ler(nome, filtros, colunas):
+    raiz = diretorio(nome)
+    if not raiz.exists():
+        return pd.DataFrame(columns=colunas)
+    tabela = pq.read_table(raiz, columns=colunas, filters=filtros or None, memory_map=True, partitioning='hive')
+    df = tabela.to_pandas()
+    # Colunas de partição voltam como categóricas; devolve o tipo original
+    for coluna in df.select_dtypes('category'):
+        df[coluna] = df[coluna].astype(df[coluna].cat.categories.dtype)
+    return df
+
+
+def ler_safras(anos=None, ufs=None, colunas=None):
+    """Lê o snapshot de safras, só com as partições e colunas pedidas."""
+    filtros = []
+    if anos is not None:
+        filtros.append(('ano', 'in', list(anos)))
+    if ufs is not None:
+        filtros.append(('uf', 'in', list(ufs)))
+    return _ler('safras', filtros, colunas)
+
+
+def ler_clima_diario(anos=None, celulas=None, colunas=None):
+    """Lê o snapshot diário de clima, só com as partições (ano, célula) e colunas pedidas."""
+    filtros = []
+    if anos is not None:
+        filtros.append(('ano', 'in', list(anos)))
+    if celulas is not None:
+        filtros.append(('celula_id', 'in', list(celulas)))
+    return _ler('clima_diario', filtros, colunas)
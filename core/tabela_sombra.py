@@ -0,0 +1,343 @@
+"""
+Recarga completa de uma tabela sem interromper as leituras, no PostgreSQL.
+
+As linhas novas são gravadas bloco a bloco numa tabela-sombra
+`<tabela>_sombra`, criada com a mesma estrutura da tabela em uso (LIKE ...
+INCLUDING ALL), sem tocar na tabela em uso; chaves repetidas são resolvidas
+pelo ON CONFLICT da própria sombra, sem juntar a série em memória, e cada
+chave que já existia mantém o seu id. Terminada a carga, a contagem de
+linhas, a soma de controle das chaves e as somas das medidas da sombra são
+comparadas com as esperadas. Só então uma transação curta apaga a tabela
+antiga, renomeia a sombra e devolve aos índices, restrições e sequência os
+nomes originais, que as migrações usam. O lock exclusivo dura apenas esses
+comandos de catálogo: quem lê vê a tabela antiga inteira até o COMMIT e a
+nova inteira depois dele. Tabelas referenciadas por chaves estrangeiras
+não podem ser recarregadas assim (a troca apagaria a tabela referenciada).
+
+Em outros bancos (SQLite no desenvolvimento) a recarga é DELETE + upsert
+numa única transação.
+"""
+import hashlib
+import math
+import re
+import time
+from dataclasses import dataclass, field
+
+from django.db import OperationalError, connection, transaction
+
+# Chave do advisory lock que impede duas recargas simultâneas usando a mesma sombra
+CHAVE_LOCK_SOMBRA = 7_310_002
+
+TAMANHO_LOTE_SOMBRA = 2000
+
+# Espera máxima pelo lock exclusivo da troca; esgotada, a troca é tentada de novo
+TEMPO_LOCK_TROCA = '200ms'
+TENTATIVAS_TROCA = 10
+
+
+class CargaInvalida(Exception):
+    """A tabela-sombra não confere com as linhas enviadas; a tabela em uso não foi trocada."""
+
+
+class TabelaReferenciada(Exception):
+    """
+    Alguma chave estrangeira aponta para a tabela em uso. A troca a apagaria
+    (e LIKE ... INCLUDING ALL não copia chaves estrangeiras), então a recarga
+    é recusada antes de gravar a sombra.
+    """
+
+
+@dataclass
+class Controle:
+    """Contagem de linhas, soma de controle das chaves e somas das medidas de uma carga."""
+    linhas: int = 0
+    chaves: int = 0
+    somas: dict = field(default_factory=dict)
+
+
+@dataclass
+class ResultadoTroca:
+    linhas: int
+    segundos_carga: float
+    segundos_troca: float
+
+
+def usa_tabela_sombra():
+    return connection.vendor == 'postgresql'
+
+
+def hash_chave(valores):
+    """Mesma conta de `_sql_hash_chave`: primeiros 32 bits do MD5 dos valores unidos por '|'."""
+    return int(hashlib.md5('|'.join(map(str, valores)).encode()).hexdigest()[:8], 16)
+
+
+def acumular_controle(controle, linhas, colunas, chave, medidas, sinal=1):
+    """Soma (ou, com `sinal=-1`, subtrai) ao `controle` as `linhas` (tuplas na ordem de `colunas`)."""
+    posicoes_chave = [colunas.index(coluna) for coluna in chave]
+    posicoes_medidas = {medida: colunas.index(medida) for medida in medidas}
+    for linha in linhas:
+        controle.linhas += sinal
+        controle.chaves += sinal * hash_chave(linha[i] for i in posicoes_chave)
+        for medida, i in posicoes_medidas.items():
+            if linha[i] is not None and not math.isnan(linha[i]):
+                controle.somas[medida] += sinal * linha[i]
+    return controle
+
+
+def controle_esperado(linhas, colunas, chave, medidas):
+    """`Controle` das `linhas` (tuplas na ordem de `colunas`), calculado em Python."""
+    return acumular_controle(Controle(somas=dict.fromkeys(medidas, 0.0)), linhas, colunas, chave, medidas)
+
+
+def _sql_hash_chave(chave):
+    q = connection.ops.quote_name
+    return (
+        f"('x' || lpad(substr(md5(concat_ws('|', {', '.join(map(q, chave))})), 1, 8), 16, '0'))::bit(64)::bigint"
+    )
+
+
+def controle_tabela(cursor, tabela, chave, medidas):
+    """`Controle` das linhas gravadas em `tabela`, calculado no banco."""
+    q = connection.ops.quote_name
+    somas = ''.join(f', COALESCE(SUM({q(medida)}), 0)' for medida in medidas)
+    cursor.execute(f'SELECT COUNT(*), COALESCE(SUM({_sql_hash_chave(chave)}), 0){somas} FROM {q(tabela)}')
+    linhas, chaves, *valores = cursor.fetchone()
+    return Controle(int(linhas), int(chaves), dict(zip(medidas, map(float, valores))))
+
+
+def conferir(esperado, gravado):
+    """Levanta `CargaInvalida` se a contagem, as chaves ou as somas não baterem."""
+    if esperado.linhas != gravado.linhas:
+        raise CargaInvalida(f'{gravado.linhas} linhas na tabela-sombra; esperadas {esperado.linhas}.')
+    if esperado.chaves != gravado.chaves:
+        raise CargaInvalida('A soma de controle das chaves da tabela-sombra não confere.')
+    for medida, valor in esperado.somas.items():
+        if not math.isclose(valor, gravado.somas[medida], rel_tol=1e-9, abs_tol=1e-6):
+            raise CargaInvalida(f'Soma de {medida} na tabela-sombra: {gravado.somas[medida]}; esperada {valor}.')
+
+
+def _indices(cursor, tabela):
+    """{definição sem o nome do índice e da tabela: nome} dos índices de `tabela`."""
+    cursor.execute('SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s', [tabela])
+    return {re.sub(r' INDEX \S+ ON \S+ ', ' INDEX ON ', definicao): nome for nome, definicao in cursor.fetchall()}
+
+
+def _referencias(cursor, tabela):
+    """Chaves estrangeiras, como 'tabela.restrição', que apontam para `tabela`."""
+    cursor.execute(
+        "SELECT conrelid::regclass::text || '.' || conname FROM pg_constraint "
+        "WHERE contype = 'f' AND confrelid = %s::regclass ORDER BY 1",
+        [connection.ops.quote_name(tabela)],
+    )
+    return [nome for nome, in cursor.fetchall()]
+
+
+def recusar_se_referenciada(cursor, tabela):
+    """Levanta `TabelaReferenciada` se alguma chave estrangeira apontar para `tabela`."""
+    referencias = _referencias(cursor, tabela)
+    if referencias:
+        raise TabelaReferenciada(
+            f'{tabela} é referenciada por {", ".join(referencias)}; a troca pela tabela-sombra apagaria a tabela.'
+        )
+
+
+def _sequencia(cursor, tabela):
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [tabela])
+    return cursor.fetchone()[0]
+
+
+def trocar_tabelas(modelo, tentativas=TENTATIVAS_TROCA):
+    """
+    Troca a tabela de `modelo` pela sombra numa transação curta. Se o lock
+    exclusivo não sair em TEMPO_LOCK_TROCA (uma leitura longa em andamento),
+    a transação desiste, sem enfileirar as leituras seguintes atrás dela, e
+    é tentada de novo. Retorna os segundos da transação que fez a troca.
+    """
+    q = connection.ops.quote_name
+    tabela = modelo._meta.db_table
+    sombra = f'{tabela}_sombra'
+    for tentativa in range(1, tentativas + 1):
+        inicio = time.perf_counter()
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f"SET LOCAL lock_timeout = '{TEMPO_LOCK_TROCA}'")
+                cursor.execute(f'LOCK TABLE {q(tabela)}, {q(sombra)} IN ACCESS EXCLUSIVE MODE')
+                # Conferido de novo sob o lock: uma chave estrangeira pode ter surgido durante a carga
+                recusar_se_referenciada(cursor, tabela)
+                originais, novos = _indices(cursor, tabela), _indices(cursor, sombra)
+                sequencia_original, sequencia_nova = _sequencia(cursor, tabela), _sequencia(cursor, sombra)
+                cursor.execute(f'DROP TABLE {q(tabela)}')
+                cursor.execute(f'ALTER TABLE {q(sombra)} RENAME TO {q(tabela)}')
+                # Renomear o índice de uma PRIMARY KEY/UNIQUE renomeia também a restrição
+                for definicao, nome in novos.items():
+                    if definicao in originais:
+                        cursor.execute(f'ALTER INDEX {q(nome)} RENAME TO {q(originais[definicao])}')
+                if sequencia_original and sequencia_nova:
+                    cursor.execute(
+                        f'ALTER SEQUENCE {sequencia_nova} RENAME TO {q(sequencia_original.split(".")[-1])}'
+                    )
+            return time.perf_counter() - inicio
+        except OperationalError:
+            if tentativa == tentativas:
+                raise
+            time.sleep(0.5 * tentativa)
+
+
+def sem_repeticao(linhas, colunas, chave):
+    """`linhas` sem chaves repetidas, ficando a última ocorrência de cada chave."""
+    posicoes_chave = [colunas.index(coluna) for coluna in chave]
+    return list({tuple(linha[i] for i in posicoes_chave): linha for linha in linhas}.values())
+
+
+class RecargaTabela:
+    """
+    Substituição de todo o conteúdo da tabela de `modelo`, recebendo as
+    linhas (tuplas na ordem de `colunas`) bloco a bloco por `gravar`: só o
+    lote em gravação fica em memória. `chave` são as colunas da chave única;
+    uma chave repetida fica com a última ocorrência. `concluir` confere a
+    carga e troca as tabelas; sair do `with` sem concluir descarta a carga e
+    deixa a tabela em uso como estava.
+
+    Os ids são mantidos pela chave única: uma chave que já estava na tabela
+    fica com o mesmo id, e só as chaves novas recebem ids novos (maiores que
+    todos os em uso); só no fallback sem sombra (SQLite, desenvolvimento)
+    os ids são renumerados. A recarga é recusada (`TabelaReferenciada`) se
+    alguma chave estrangeira apontar para a tabela.
+
+    No PostgreSQL os lotes vão para a tabela-sombra com INSERT ... ON
+    CONFLICT (chave) DO UPDATE, e o `Controle` esperado é o de cada lote
+    gravado menos o das linhas da sombra que ele sobrescreveu. Nos outros
+    bancos tudo acontece numa transação aberta do início ao `concluir`.
+    """
+
+    def __init__(self, modelo, colunas, chave, medidas=(), tamanho_lote=TAMANHO_LOTE_SOMBRA):
+        self.modelo = modelo
+        self.colunas, self.chave, self.medidas = list(colunas), list(chave), list(medidas)
+        self.tamanho_lote = tamanho_lote
+        self.tabela = modelo._meta.db_table
+        self.sombra = f'{self.tabela}_sombra'
+        self.esperado = Controle(somas=dict.fromkeys(self.medidas, 0.0))
+        self.sombra_ativa = usa_tabela_sombra()
+        self._transacao = None
+        self._inicio = None
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        if not self.sombra_ativa:
+            # Sem sombra, a "troca" é a transação inteira de DELETE + INSERT
+            self._transacao = transaction.atomic()
+            self._transacao.__enter__()
+            self.modelo.objects.all().delete()
+            return self
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_lock(%s)', [CHAVE_LOCK_SOMBRA])
+        try:
+            self._criar_sombra()
+        except BaseException:
+            self._liberar()
+            raise
+        return self
+
+    def __exit__(self, tipo, erro, rastro):
+        if self._transacao is not None:
+            # Ainda aberta: o `with` saiu sem `concluir`, e o DELETE é desfeito
+            transacao, self._transacao = self._transacao, None
+            transacao.__exit__(tipo or CargaInvalida, erro, rastro)
+        elif self.sombra_ativa and self._inicio is not None:
+            self._liberar()
+        return False
+
+    def _liberar(self):
+        self._inicio = None
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s)', [CHAVE_LOCK_SOMBRA])
+
+    def _criar_sombra(self):
+        q = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            recusar_se_referenciada(cursor, self.tabela)
+            cursor.execute(f'DROP TABLE IF EXISTS {q(self.sombra)}')
+            cursor.execute(f'CREATE TABLE {q(self.sombra)} (LIKE {q(self.tabela)} INCLUDING ALL)')
+            # Ids novos começam depois do maior id em uso, para não colidirem com os mantidos
+            cursor.execute(
+                f'SELECT setval(%s, COALESCE((SELECT MAX(id) FROM {q(self.tabela)}), 0) + 1, false)',
+                [_sequencia(cursor, self.sombra)],
+            )
+
+    def _manter_ids(self, cursor):
+        """Dá às linhas da sombra o id que a mesma chave tem na tabela em uso."""
+        q = connection.ops.quote_name
+        cursor.execute(
+            f'UPDATE {q(self.sombra)} AS s SET id = t.id FROM {q(self.tabela)} AS t '
+            f"WHERE {' AND '.join(f's.{q(coluna)} = t.{q(coluna)}' for coluna in self.chave)}"
+        )
+
+    def gravar(self, linhas):
+        """Grava as `linhas` de um bloco, lote a lote. Retorna quantas linhas foram enviadas."""
+        for i in range(0, len(linhas), self.tamanho_lote):
+            lote = sem_repeticao(linhas[i:i + self.tamanho_lote], self.colunas, self.chave)
+            if self.sombra_ativa:
+                self._gravar_na_sombra(lote)
+            else:
+                self.modelo.objects.bulk_create(
+                    [self.modelo(**dict(zip(self.colunas, linha))) for linha in lote],
+                    update_conflicts=True, unique_fields=self.chave,
+                    update_fields=[coluna for coluna in self.colunas if coluna not in self.chave],
+                )
+        return len(linhas)
+
+    def _gravar_na_sombra(self, lote):
+        q = connection.ops.quote_name
+        marcador_chave = '(' + ', '.join(['%s'] * len(self.chave)) + ')'
+        marcador_linha = '(' + ', '.join(['%s'] * len(self.colunas)) + ')'
+        posicoes_chave = [self.colunas.index(coluna) for coluna in self.chave]
+        atualizadas = [coluna for coluna in self.colunas if coluna not in self.chave]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {', '.join(map(q, self.chave + self.medidas))} FROM {q(self.sombra)} "
+                f"WHERE ({', '.join(map(q, self.chave))}) IN (VALUES {', '.join([marcador_chave] * len(lote))})",
+                [linha[i] for linha in lote for i in posicoes_chave],
+            )
+            acumular_controle(self.esperado, cursor.fetchall(), self.chave + self.medidas,
+                              self.chave, self.medidas, sinal=-1)
+            cursor.execute(
+                f"INSERT INTO {q(self.sombra)} ({', '.join(map(q, self.colunas))}) "
+                f"VALUES {', '.join([marcador_linha] * len(lote))} "
+                f"ON CONFLICT ({', '.join(map(q, self.chave))}) DO UPDATE SET "
+                + ', '.join(f'{q(coluna)} = EXCLUDED.{q(coluna)}' for coluna in atualizadas),
+                [valor for linha in lote for valor in linha],
+            )
+        acumular_controle(self.esperado, lote, self.colunas, self.chave, self.medidas)
+
+    def concluir(self):
+        """
+        Confere a carga e troca as tabelas. Levanta `CargaInvalida` se a
+        conferência falhar. Retorna um `ResultadoTroca`.
+        """
+        if not self.sombra_ativa:
+            transacao, self._transacao = self._transacao, None
+            transacao.__exit__(None, None, None)
+            segundos = time.perf_counter() - self._inicio
+            return ResultadoTroca(self.modelo.objects.count(), segundos, segundos)
+        q = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            self._manter_ids(cursor)
+            # A sombra leva as estatísticas para a troca
+            cursor.execute(f'ANALYZE {q(self.sombra)}')
+            conferir(self.esperado, controle_tabela(cursor, self.sombra, self.chave, self.medidas))
+        segundos_carga = time.perf_counter() - self._inicio
+        segundos_troca = trocar_tabelas(self.modelo)
+        return ResultadoTroca(self.esperado.linhas, segundos_carga, segundos_troca)
+
+
+def substituir_tabela(modelo, blocos, colunas, chave, medidas=(), tamanho_lote=TAMANHO_LOTE_SOMBRA):
+    """
+    Substitui todo o conteúdo da tabela de `modelo` pelas linhas de `blocos`
+    (iterável de listas de tuplas na ordem de `colunas`, consumido um bloco
+    por vez) com uma `RecargaTabela`. Levanta `CargaInvalida` se a
+    conferência falhar.
+    """
+    with RecargaTabela(modelo, colunas, chave, medidas, tamanho_lote) as recarga:
+        for bloco in blocos:
+            recarga.gravar(bloco)
+        return recarga.concluir()
@@ -1,131 +1,201 @@
+import random
+from operator import attrgetter
 import requests
-import os
-import pandas as pd
-from datetime import datetime
-from celery import shared_task
-from django.db import transaction
-from .models import SafraAnual, Localidade, DadoMeteorologicoDiario
+from celery import shared_task, chord
+from django.db import OperationalError
+from .models import CelulaGrade, SafraAnual
+from .agregados import anos_do_periodo, atualizar_clima_anual, atualizar_cubo_safras
+from .cache import invalidar_respostas
+from .checkpoints import (
+    concluir_unidade, falhar_unidade, finalizar_execucao, iniciar_execucao, pular_concluidas,
+    registrar_pendentes, retomar,
+)
+from .metricas import ImportacaoFalhou, Medicao
+from .indicadores import atualizar_indicadores, safras_dos_anos
+from .snapshots import exportar_clima_diario, exportar_safras
+from .conab import TAMANHO_LOTE_PADRAO, baixar_serie_conab, importar_serie_conab, registrar_download
+from .municipios import cadastrar_municipios
+from .nasa import (
+    celulas_com_localidades, criar_coletor, importar_periodo, periodos_a_refazer, planejar_periodos,
+)
 
 @shared_task
-def importar_dados_conab_task():
+def importar_dados_conab_task(tamanho_lote=TAMANHO_LOTE_PADRAO, forcar=False):
     """
-    Tarefa Celery para baixar, processar e importar dados da Conab.
+    Tarefa Celery para baixar e processar os dados da Conab. A série inteira
+    é carregada numa tabela-sombra, conferida e trocada com a de
+    `SafraAnual` numa transação curta: o dashboard nunca vê a tabela vazia
+    ou pela metade, e uma falha deixa a série anterior intacta. Não faz nada
+    quando a série não mudou desde a última carga.
     """
     print("INICIANDO TAREFA CELERY: Importação de dados da Conab.")
-    
+    medicao = Medicao('conab')
+    execucao = iniciar_execucao('conab')
+    registrar_pendentes(execucao, [('serie', None, None)])
+
     # Etapa de Extração (Download)
-    url = 'https://portaldeinformacoes.conab.gov.br/downloads/arquivos/SerieHistoricaGraos.txt'
-    local_filename = 'data/SerieHistoricaGraos.csv'
-    os.makedirs(os.path.dirname(local_filename), exist_ok=True)
-    
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        with open(local_filename, 'w', encoding='latin-1') as f:
-            f.write(response.text)
+        with medicao.etapa('download'):
+            download = baixar_serie_conab(forcar=forcar)
         print("Download dos dados da Conab concluído.")
     except requests.exceptions.RequestException as e:
-        print(f"ERRO no download da Conab: {e}")
-        return f"ERRO no download da Conab: {e}"
+        medicao.registrar_erro('download', e)
+        falhar_unidade(execucao.id, 'conab', 'serie', erro=e)
+        finalizar_execucao(execucao.id, medicao.finalizar())
+        raise ImportacaoFalhou(f"ERRO no download da Conab: {e}") from e
 
-    # Etapa de Transformação e Carga (Transform & Load)
-    try:
-        df = pd.read_csv(local_filename, sep=';', encoding='latin-1')
-        
-        colunas_renomeadas = {'ano_agricola': 'ano_safra', 'dsc_safra_previsao': 'tipo_safra', 'uf': 'uf', 'produto': 'produto', 'area_plantada_mil_ha': 'area_plantada_ha', 'producao_mil_t': 'producao_toneladas', 'produtividade_mil_ha_mil_t': 'produtividade_kg_ha'}
-        df_transformado = df.rename(columns=colunas_renomeadas)
-        df_transformado['area_plantada_ha'] = df_transformado['area_plantada_ha'] * 1000
-        df_transformado['producao_toneladas'] = df_transformado['producao_toneladas'] * 1000
-        df_transformado['ano'] = df_transformado['ano_safra'].str.split('/').str[0].astype(int)
-        df_mt = df_transformado[df_transformado['uf'] == 'MT'].copy()
-        colunas_finais = ['ano', 'uf', 'produto', 'area_plantada_ha', 'producao_toneladas', 'produtividade_kg_ha']
-        df_final = df_mt[colunas_finais]
-
-        SafraAnual.objects.all().delete()
-        
-        with transaction.atomic(): # <-- Bloco de transação adicionado
-            for index, row in df_final.iterrows():
-                SafraAnual.objects.create(
-                    ano=row['ano'], uf=row['uf'], produto=row['produto'],
-                    area_plantada_ha=row['area_plantada_ha'],
-                    producao_toneladas=row['producao_toneladas'],
-                    produtividade_kg_ha=row['produtividade_kg_ha']
-                )
-        
-        print(f"TAREFA CONCLUÍDA: {len(df_final)} registros da Conab importados.")
-        return f"Importação da Conab finalizada. {len(df_final)} registros criados."
+    if not download.alterado:
+        medicao.unidade_concluida()
+        concluir_unidade(execucao.id, 'conab', 'serie', sha256=download.sha256)
+        finalizar_execucao(execucao.id, medicao.finalizar())
+        print("TAREFA CONCLUÍDA: a série da Conab não mudou desde a última importação.")
+        return "Série da Conab inalterada. Nenhuma carga necessária."
 
+    # Etapas de Transformação e Carga (Transform & Load), com a troca da tabela no final
+    try:
+        resultado = importar_serie_conab(download.caminho, tamanho_lote=tamanho_lote, medicao=medicao)
+        registrar_download(download.metadados)
+        with medicao.etapa('agregados') as etapa:
+            etapa.linhas = atualizar_cubo_safras()
+            exportar_safras()
+            invalidar_respostas()
     except Exception as e:
-        print(f"ERRO no processamento dos dados da Conab: {e}")
-        return f"ERRO no processamento dos dados da Conab: {e}"
+        medicao.registrar_erro('carga', e)
+        falhar_unidade(execucao.id, 'conab', 'serie', erro=e)
+        finalizar_execucao(execucao.id, medicao.finalizar())
+        raise ImportacaoFalhou(f"ERRO na carga dos dados da Conab: {e}") from e
+
+    medicao.unidade_concluida()
+    concluir_unidade(execucao.id, 'conab', 'serie', linhas=resultado.registros, sha256=download.sha256)
+    finalizar_execucao(execucao.id, medicao.finalizar())
+    print(f"TAREFA CONCLUÍDA: {resultado.registros} registros da Conab carregados em {resultado.segundos:.2f}s "
+          f"({resultado.registros_por_segundo:.0f} registros/s); troca da tabela em "
+          f"{resultado.segundos_troca * 1000:.0f} ms.")
+    return f"Importação da Conab finalizada. {resultado.registros} registros carregados."
 
 
 @shared_task
-def importar_dados_nasa_task():
+def importar_dados_nasa_task(dry_run=False, somente_falhas=False):
     """
-    Tarefa Celery para buscar e importar dados da API NASA POWER.
+    Tarefa Celery para buscar e importar dados da API NASA POWER. Cada
+    período faltante vira uma sub-tarefa, consolidadas num chord.
+
+    Os períodos concluídos em execuções anteriores são pulados; com
+    `somente_falhas`, só os pendentes ou com falha nos checkpoints são refeitos.
     """
     print("INICIANDO TAREFA CELERY: Importação de dados da NASA.")
-    
-    LOCALIDADES_MT = {
-        "Cuiabá": {"lat": -15.59, "lon": -56.09}, "Rondonópolis": {"lat": -16.47, "lon": -54.63},
-        "Sinop": {"lat": -11.86, "lon": -55.50}, "Sorriso": {"lat": -12.54, "lon": -55.71},
-        "Primavera do Leste": {"lat": -15.56, "lon": -54.29},
-    }
-    API_BASE_URL = "https://power.larc.nasa.gov/api/temporal/daily/point"
-    PARAMS = "parameters=T2M_MAX,T2M_MIN,PRECTOTCORR&community=AG&format=JSON"
-
-    # Fase 1: Cadastrar Localidades
-    with transaction.atomic(): # <-- Bloco de transação adicionado
-        for nome, coords in LOCALIDADES_MT.items():
-            Localidade.objects.update_or_create(
-                nome=nome,
-                defaults={'latitude': coords['lat'], 'longitude': coords['lon']}
-            )
-    print(f"{len(LOCALIDADES_MT)} localidades salvas/atualizadas.")
-
-    # Fase 2: Buscar dados diários
+
+    # Fase 1: Cadastrar Localidades (municípios) e suas células da grade
+    localidades, celulas = cadastrar_municipios()
+    print(f"{localidades} localidades salvas/atualizadas em {celulas} células da grade.")
+
+    # Fase 2: Buscar dados diários, uma vez por célula
     anos = SafraAnual.objects.values_list('ano', flat=True).distinct().order_by('ano')
-    localidades = Localidade.objects.all()
+    celulas = celulas_com_localidades()
 
     if not anos:
         print('Aviso: Nenhum ano de safra encontrado.')
         return "Nenhum ano de safra encontrado."
 
-    for local in localidades:
-        for ano in anos:
-            # ... (Lógica de busca da API, exatamente como no management command)
-            start_date = f"{ano}0101"; end_date = f"{ano}1231"
-            url = f"{API_BASE_URL}?{PARAMS}&latitude={local.latitude}&longitude={local.longitude}&start={start_date}&end={end_date}"
-            
-            try:
-                response = requests.get(url, timeout=60.0)
-                response.raise_for_status()
-                api_data = response.json()
-                
-                params = api_data['properties']['parameter']
-                t2m_max_data = params['T2M_MAX']
-                t2m_min_data = params['T2M_MIN']
-                prec_data = params['PRECTOTCORR']
-
-                with transaction.atomic(): # <-- Bloco de transação adicionado
-                    for date_str, temp_max in t2m_max_data.items():
-                        # ... (lógica de parse de cada dia)
-                        data_obj = datetime.strptime(date_str, '%Y%m%d').date()
-                        temp_min = t2m_min_data.get(date_str, -999)
-                        prec = prec_data.get(date_str, -999)
-                        if temp_max == -999 or temp_min == -999 or prec == -999:
-                            continue
-                        
-                        DadoMeteorologicoDiario.objects.update_or_create(
-                            localidade=local, data=data_obj,
-                            defaults={
-                                'temp_maxima_c': temp_max, 'temp_minima_c': temp_min,
-                                'precipitacao_mm': prec,
-                            }
-                        )
-            except Exception as e:
-                print(f'Erro ao processar dados para {local.nome} em {ano}: {e}')
-    
-    print("TAREFA CONCLUÍDA: Importação de dados da NASA.")
-    return "Importação do INMET finalizada com sucesso."
\ No newline at end of file
+    unidades = periodos_a_refazer() if somente_falhas else planejar_periodos(celulas, anos)
+    if dry_run:
+        unidades = pular_concluidas('nasa', unidades, attrgetter('id'))
+        return [f"{celula}: {inicio} a {fim}" for celula, inicio, fim in unidades]
+    execucao = iniciar_execucao('nasa')
+    unidades = retomar(execucao, unidades, attrgetter('id'))
+    print(f"{len(unidades)} períodos faltantes planejados.")
+    if not unidades:
+        finalizar_execucao(execucao.id, Medicao('nasa').resumo())
+        return "Nenhum período faltante. Dados da NASA já estão completos."
+
+    chord(
+        importar_periodo_nasa_task.s(celula.id, inicio, fim, execucao.id)
+        for celula, inicio, fim in unidades
+    )(consolidar_importacao_nasa_task.s(execucao.id))
+
+    return f"Importação da NASA distribuída em {len(unidades)} sub-tarefas."
+
+
+@shared_task(bind=True, max_retries=3)
+def importar_periodo_nasa_task(self, celula_id, inicio, fim, execucao_id=None):
+    """
+    Busca e grava um período de uma célula da grade. A gravação é um upsert,
+    então a sub-tarefa pode ser repetida isoladamente. Cada tentativa fica
+    no checkpoint do período na execução `execucao_id`.
+    """
+    celula = CelulaGrade.objects.get(pk=celula_id)
+    medicao = Medicao('nasa')
+    resultado = {'celula_id': celula.id, 'celula': str(celula), 'inicio': inicio, 'fim': fim,
+                 'alteradas': 0, 'erro': None}
+    try:
+        resultado['alteradas'] = importar_periodo(celula, inicio, fim, _coletor_do_worker(), medicao, execucao_id)
+        medicao.unidade_concluida()
+    except (requests.exceptions.RequestException, OperationalError) as e:
+        if self.request.retries < self.max_retries:
+            # As requisições desta tentativa também contam nas métricas
+            medicao.publicar()
+            raise self.retry(exc=e, countdown=random.uniform(0, 2 ** (self.request.retries + 1)))
+        medicao.registrar_erro(f'{celula} {inicio}-{fim}', e)
+        resultado['erro'] = str(e)
+    except Exception as e:
+        medicao.registrar_erro(f'{celula} {inicio}-{fim}', e)
+        resultado['erro'] = str(e)
+
+    if resultado['erro']:
+        print(f'Erro ao processar dados para {celula} de {inicio} a {fim}: {resultado["erro"]}')
+    medicao.publicar()
+    resultado['metricas'] = medicao.resumo()
+    return resultado
+
+
+@shared_task
+def consolidar_importacao_nasa_task(resultados, execucao_id=None):
+    """
+    Etapa final do chord da NASA: atualiza `ClimaAnual`, `IndicadorSafra` e o snapshot Parquet
+    dos anos alterados e registra os totais e o resumo da importação.
+    Falha (para o Celery) se nenhum período foi importado.
+    """
+    medicao = Medicao('nasa')
+    anos_alterados = {}
+    for r in resultados:
+        if r.get('metricas'):
+            medicao.incorporar(r['metricas'])
+        if r['alteradas']:
+            anos_alterados.setdefault(r['celula_id'], set()).update(anos_do_periodo(r['inicio'], r['fim']))
+    with medicao.etapa('agregados') as etapa:
+        for celula_id, anos in anos_alterados.items():
+            etapa.linhas += atualizar_clima_anual(celula_id, anos)
+        if anos_alterados:
+            atualizar_indicadores(safras_dos_anos(set().union(*anos_alterados.values())), celulas=anos_alterados)
+            exportar_clima_diario(anos_alterados)
+            invalidar_respostas()
+    resumo = medicao.finalizar()
+    if execucao_id:
+        finalizar_execucao(execucao_id, resumo)
+
+    alteradas = sum(r['alteradas'] for r in resultados)
+    falhas = [r for r in resultados if r['erro']]
+    for r in falhas:
+        print(f"Falha em {r['celula']} de {r['inicio']} a {r['fim']}: {r['erro']}")
+
+    print(f"TAREFA CONCLUÍDA: Importação de dados da NASA. {len(resultados)} períodos, "
+          f"{alteradas} dias inseridos ou atualizados, {len(falhas)} falhas.")
+    if resumo['status'] == 'falha':
+        raise ImportacaoFalhou(f"Nenhum dos {len(resultados)} períodos da NASA foi importado.")
+    return f"Importação da NASA finalizada. {alteradas} dias gravados, {len(falhas)} períodos com falha."
+
+
+_coletor = None
+
+
+def _coletor_do_worker():
+    """
+    Um coletor (e sua sessão HTTP) por processo do worker, reaproveitado
+    entre sub-tarefas. A taxa de requisições é a do token bucket no Redis,
+    comum a todos os workers (`nasa.criar_coletor`); o rate_limit do Celery
+    valeria por worker.
+    """
+    global _coletor
+    if _coletor is None:
+        _coletor = criar_coletor(max_simultaneas=1)
+    return _coletor
@@ -1,3 +1,532 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import threading
+import time
+from collections import Counter
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import requests
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+
+from .benchmark import comparar_relatorios
+from .cache import aobter_ou_calcular, aversao_dados, invalidar_respostas
+from .coleta import ColetorConcorrente, LimitadorTaxa
+from .exportacao import CONJUNTOS, exportar
+from .indicadores import _maiores_sequencias
+from .inmet import parse_registros
+from .models import CelulaGrade, ClimaAnual, DadoMeteorologicoDiario, Localidade, SafraAnual
+from .nasa import COLUNAS_VALORES, agrupar_intervalos, gravar_dados_diarios, planejar_periodos
+from .series import calcular_serie, lttb
+from .tabela_sombra import (
+    CargaInvalida, Controle, RecargaTabela, acumular_controle, conferir, controle_esperado, substituir_tabela,
+)
+
+
+def registro_horario(data, hora, chuva, tem_max, tem_min, umd_ins, pre_max='989.6'):
+    """Registro de /estacao/<inicio>/<fim>/<codigo> no formato da API (números em texto, ausentes como null)."""
+    return {
+        'DC_NOME': 'CUIABA', 'CD_ESTACAO': 'A901', 'UF': 'MT',
+        'VL_LATITUDE': '-15.55916666', 'VL_LONGITUDE': '-56.06277777',
+        'DT_MEDICAO': data, 'HR_MEDICAO': hora,
+        'CHUVA': chuva, 'TEM_MAX': tem_max, 'TEM_MIN': tem_min, 'TEM_INS': tem_max, 'TEM_SEN': tem_max,
+        'UMD_INS': umd_ins, 'UMD_MAX': umd_ins, 'UMD_MIN': umd_ins,
+        'PRE_INS': '989.5', 'PRE_MAX': pre_max, 'PRE_MIN': '989.1',
+        'PTO_INS': '18.4', 'PTO_MAX': '19.5', 'PTO_MIN': '18.2',
+        'VEN_DIR': '130', 'VEN_VEL': '1.6', 'VEN_RAJ': '4.6', 'RAD_GLO': None,
+    }
+
+
+class ParseRegistrosInmetTests(TestCase):
+    REGISTROS = [
+        registro_horario('2023-01-01', '0000', '0', '27.2', '25.5', '58'),
+        registro_horario('2023-01-01', '0100', '2.4', '26.0', '24.1', '70'),
+        registro_horario('2023-01-01', '0200', None, '25.1', '23.8', None, pre_max=None),
+        registro_horario('2023-01-01', '0300', '10.6', '24.9', '22.7', '94'),
+        registro_horario('2023-01-02', '0000', None, None, None, None),
+        registro_horario('2023-01-02', '0100', None, '31.0', '29.5', '40'),
+    ]
+
+    def test_agrega_horas_em_dias(self):
+        df = parse_registros(self.REGISTROS)
+
+        self.assertEqual(list(df.index), [date(2023, 1, 1), date(2023, 1, 2)])
+        dia = df.loc[date(2023, 1, 1)]
+        self.assertAlmostEqual(dia['precipitacao_mm'], 13.0)
+        self.assertAlmostEqual(dia['temp_maxima_c'], 27.2)
+        self.assertAlmostEqual(dia['temp_minima_c'], 22.7)
+        self.assertAlmostEqual(dia['umidade_media_porc'], (58 + 70 + 94) / 3)
+
+    def test_dia_sem_chuva_medida_fica_sem_valor(self):
+        df = parse_registros(self.REGISTROS)
+
+        dia = df.loc[date(2023, 1, 2)]
+        self.assertTrue(dia.isna()['precipitacao_mm'])
+        self.assertAlmostEqual(dia['temp_maxima_c'], 31.0)
+        self.assertAlmostEqual(dia['umidade_media_porc'], 40.0)
+
+    def test_pressao_nao_entra_como_chuva(self):
+        registros = [registro_horario('2023-01-01', '0000', '0', '27.2', '25.5', '58', pre_max='989.6')]
+
+        self.assertEqual(parse_registros(registros).loc[date(2023, 1, 1), 'precipitacao_mm'], 0.0)
+
+    def test_sem_registros(self):
+        self.assertTrue(parse_registros([]).empty)
+
+
+class ApiFalsa(BaseHTTPRequestHandler):
+    """
+    API local para os testes da coleta. /lento/<n> responde depois de
+    `ATRASO` segundos; /falha/<status>/<n>/<id> responde `status` nas `n`
+    primeiras chamadas de cada id e 200 depois; qualquer outro caminho
+    responde 200 na hora. Conta as chamadas por caminho em `chamadas`.
+    """
+    ATRASO = 0.1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with self.server.trava:
+            self.server.chamadas[self.path] += 1
+            chamada = self.server.chamadas[self.path]
+        partes = self.path.strip('/').split('/')
+        status = 200
+        if partes[0] == 'lento':
+            time.sleep(self.ATRASO)
+        elif partes[0] == 'falha' and chamada <= int(partes[2]):
+            status = int(partes[1])
+        corpo = json.dumps({'caminho': self.path}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+
+class ColetorConcorrenteTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = ThreadingHTTPServer(('127.0.0.1', 0), ApiFalsa)
+        cls.servidor.chamadas, cls.servidor.trava = Counter(), threading.Lock()
+        threading.Thread(target=cls.servidor.serve_forever, daemon=True).start()
+        cls.base = f'http://127.0.0.1:{cls.servidor.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        super().tearDownClass()
+
+    def coletar(self, coletor, caminhos):
+        inicio = time.perf_counter()
+        resultados = {chave: (dados, erro) for chave, dados, erro in
+                      coletor.executar((caminho, self.base + caminho) for caminho in caminhos)}
+        return resultados, time.perf_counter() - inicio
+
+    def test_concorrente_mais_rapido_que_sequencial(self):
+        caminhos = [f'/lento/{i}' for i in range(8)]
+
+        sequencial, tempo_sequencial = self.coletar(
+            ColetorConcorrente(max_simultaneas=1, requisicoes_por_segundo=None), caminhos)
+        concorrente, tempo_concorrente = self.coletar(
+            ColetorConcorrente(max_simultaneas=8, requisicoes_por_segundo=None), caminhos)
+
+        self.assertEqual(sequencial, concorrente)
+        self.assertEqual(concorrente['/lento/3'], ({'caminho': '/lento/3'}, None))
+        self.assertGreaterEqual(tempo_sequencial, 8 * ApiFalsa.ATRASO)
+        self.assertLess(tempo_concorrente, 4 * ApiFalsa.ATRASO)
+
+    def test_limitador_respeita_a_taxa(self):
+        limitador = LimitadorTaxa(taxa=50, capacidade=1)
+
+        inicio = time.perf_counter()
+        for _ in range(26):
+            limitador.aguardar()
+
+        # O primeiro token já está no balde; os outros 25 saem a 50/s
+        self.assertGreaterEqual(time.perf_counter() - inicio, 0.5 * 0.95)
+
+    def test_coletor_respeita_a_taxa_com_rajada_inicial(self):
+        coletor = ColetorConcorrente(max_simultaneas=8, requisicoes_por_segundo=20)
+
+        resultados, tempo = self.coletar(coletor, [f'/taxa/{i}' for i in range(30)])
+
+        self.assertTrue(all(erro is None for _, erro in resultados.values()))
+        # Rajada de 20 (a capacidade padrão) e as 10 restantes a 20/s
+        self.assertGreaterEqual(tempo, 0.5 * 0.95)
+
+    def test_nova_tentativa_em_erro_transitorio(self):
+        coletor = ColetorConcorrente(max_simultaneas=4, requisicoes_por_segundo=None,
+                                     tentativas=3, backoff_base=0.01)
+        caminhos = ['/falha/503/2/a', '/falha/429/1/b', '/falha/500/2/c']
+
+        resultados, _ = self.coletar(coletor, caminhos)
+
+        for caminho in caminhos:
+            self.assertEqual(resultados[caminho], ({'caminho': caminho}, None))
+        self.assertEqual(self.servidor.chamadas['/falha/503/2/a'], 3)
+        self.assertEqual(self.servidor.chamadas['/falha/429/1/b'], 2)
+
+    def test_desiste_depois_das_tentativas(self):
+        coletor = ColetorConcorrente(max_simultaneas=1, requisicoes_por_segundo=None,
+                                     tentativas=2, backoff_base=0.01)
+
+        resultados, _ = self.coletar(coletor, ['/falha/429/5/d'])
+
+        dados, erro = resultados['/falha/429/5/d']
+        self.assertIsNone(dados)
+        self.assertIsInstance(erro, requests.HTTPError)
+        self.assertEqual(self.servidor.chamadas['/falha/429/5/d'], 2)
+
+    def test_erro_do_cliente_nao_e_repetido(self):
+        coletor = ColetorConcorrente(max_simultaneas=1, requisicoes_por_segundo=None,
+                                     tentativas=3, backoff_base=0.01)
+
+        resultados, _ = self.coletar(coletor, ['/falha/404/5/e'])
+
+        self.assertIsInstance(resultados['/falha/404/5/e'][1], requests.HTTPError)
+        self.assertEqual(self.servidor.chamadas['/falha/404/5/e'], 1)
+
+
+class CacheRespostasTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calculos = 0
+
+    async def calcular(self):
+        self.calculos += 1
+        return {'calculo': self.calculos}
+
+    def test_calcula_uma_vez_por_versao_dos_dados(self):
+        obter = async_to_sync(aobter_ou_calcular)
+
+        self.assertEqual(obter('producao', {'uf': 'MT'}, self.calcular), {'calculo': 1})
+        self.assertEqual(obter('producao', {'uf': 'MT'}, self.calcular), {'calculo': 1})
+        self.assertEqual(obter('producao', {'uf': 'GO'}, self.calcular), {'calculo': 2})
+
+        versao = invalidar_respostas()
+        self.assertEqual(async_to_sync(aversao_dados)(), versao)
+        self.assertEqual(obter('producao', {'uf': 'MT'}, self.calcular, versao), {'calculo': 3})
+
+
+def datas(*textos):
+    return np.array(textos, dtype='datetime64[D]')
+
+
+class AgruparIntervalosTests(SimpleTestCase):
+    def test_dias_contiguos_viram_um_intervalo(self):
+        intervalos = agrupar_intervalos(datas('2020-01-01', '2020-01-02', '2020-01-03'), 0, 100)
+
+        self.assertEqual(intervalos, [(np.datetime64('2020-01-01'), np.datetime64('2020-01-03'))])
+
+    def test_lacuna_maior_que_a_tolerancia_separa(self):
+        faltantes = datas('2020-01-01', '2020-01-02', '2020-01-10', '2020-01-11')
+
+        self.assertEqual(len(agrupar_intervalos(faltantes, 5, 100)), 2)
+        # Com tolerância de 7 dias gravados no meio, vira uma requisição só
+        self.assertEqual(
+            agrupar_intervalos(faltantes, 7, 100),
+            [(np.datetime64('2020-01-01'), np.datetime64('2020-01-11'))],
+        )
+
+    def test_intervalo_longo_e_dividido_em_max_dias(self):
+        faltantes = np.arange('2020-01-01', '2020-01-11', dtype='datetime64[D]')
+
+        intervalos = agrupar_intervalos(faltantes, 0, 4)
+
+        self.assertEqual([(str(inicio), str(fim)) for inicio, fim in intervalos], [
+            ('2020-01-01', '2020-01-04'), ('2020-01-05', '2020-01-08'), ('2020-01-09', '2020-01-10'),
+        ])
+
+    def test_sem_datas(self):
+        self.assertEqual(agrupar_intervalos(datas(), 0, 10), [])
+
+
+class ClimaDiarioTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.celula = CelulaGrade.objects.create(linha=149, coluna=198, latitude=-15.5, longitude=-56.25)
+        cls.outra = CelulaGrade.objects.create(linha=150, coluna=198, latitude=-15.0, longitude=-56.25)
+        cls.localidade = Localidade.objects.create(
+            nome='Cuiabá', uf='MT', latitude=-15.6, longitude=-56.1, celula=cls.celula,
+        )
+
+    def diario(self, valores):
+        """DataFrame no formato de `parse_parametros`: {data: (chuva, tmax, tmin)}."""
+        df = pd.DataFrame.from_dict(
+            valores, orient='index', columns=['precipitacao_mm', 'temp_maxima_c', 'temp_minima_c'],
+        )
+        df.index.name = 'data'
+        return df[COLUNAS_VALORES]
+
+    def test_upsert_so_conta_linhas_inseridas_ou_alteradas(self):
+        dias = {date(2020, 1, 1): (1.0, 30.0, 20.0), date(2020, 1, 2): (0.0, 31.0, 21.0)}
+
+        self.assertEqual(gravar_dados_diarios(self.celula.id, self.diario(dias)), 2)
+        self.assertEqual(gravar_dados_diarios(self.celula.id, self.diario(dias)), 0)
+
+        dias[date(2020, 1, 2)] = (5.5, 31.0, 21.0)
+        dias[date(2020, 1, 3)] = (2.0, 29.0, 19.0)
+        self.assertEqual(gravar_dados_diarios(self.celula.id, self.diario(dias)), 2)
+        self.assertEqual(DadoMeteorologicoDiario.objects.filter(celula=self.celula).count(), 3)
+        self.assertEqual(
+            DadoMeteorologicoDiario.objects.get(celula=self.celula, data=date(2020, 1, 2)).precipitacao_mm, 5.5,
+        )
+
+    def test_planejar_periodos_busca_so_o_que_falta(self):
+        # Janeiro gravado inteiro, menos os dias 10 a 12
+        janeiro = {
+            date(2020, 1, dia): (0.0, 30.0, 20.0) for dia in range(1, 32) if dia not in (10, 11, 12)
+        }
+        gravar_dados_diarios(self.celula.id, self.diario(janeiro))
+
+        plano = planejar_periodos(
+            [self.celula, self.outra], [2020], hoje=date(2020, 2, 15), max_dias=3653, tolerancia_dias=0,
+        )
+
+        self.assertEqual(plano, [
+            (self.celula, '20200110', '20200112'),
+            (self.celula, '20200201', '20200215'),
+            (self.outra, '20200101', '20200215'),
+        ])
+
+    def test_serie_diaria_reduzida_por_lttb(self):
+        dias = pd.date_range('2020-01-01', '2020-12-31').date
+        chuva = {dia: (float(i % 7), 30.0, 20.0) for i, dia in enumerate(dias)}
+        chuva[date(2020, 6, 15)] = (120.0, 30.0, 20.0)
+        gravar_dados_diarios(self.celula.id, self.diario(chuva))
+
+        serie = calcular_serie(self.localidade.id, date(2020, 1, 1), date(2020, 12, 31), 'precipitacao_mm', 'dia', 50)
+
+        self.assertEqual(len(serie['datas']), 50)
+        self.assertEqual((serie['datas'][0], serie['datas'][-1]), ('2020-01-01', '2020-12-31'))
+        self.assertIn(120.0, serie['valores'])
+
+    def test_serie_mensal_tambem_limitada_aos_pontos(self):
+        dias = pd.date_range('2000-01-01', '2009-12-31').date
+        gravar_dados_diarios(self.celula.id, self.diario({dia: (1.0, 30.0, 20.0) for dia in dias}))
+
+        serie = calcular_serie(self.localidade.id, dias[0], dias[-1], 'precipitacao_mm', 'mes', 24)
+
+        self.assertEqual(len(serie['datas']), 24)
+        self.assertEqual((serie['datas'][0], serie['datas'][-1]), ('2000-01-01', '2009-12-01'))
+
+
+class LttbTests(SimpleTestCase):
+    def test_mantem_extremos_e_picos(self):
+        x = np.arange(1000)
+        y = np.sin(x / 50.0)
+        y[437] = 10.0
+        y[812] = -10.0
+
+        indices = lttb(x, y, 60)
+
+        self.assertEqual(len(indices), 60)
+        self.assertEqual((indices[0], indices[-1]), (0, 999))
+        self.assertTrue(np.all(np.diff(indices) > 0))
+        self.assertIn(437, indices)
+        self.assertIn(812, indices)
+
+    def test_serie_menor_que_os_pontos_fica_inteira(self):
+        x = np.arange(10)
+
+        np.testing.assert_array_equal(lttb(x, x.astype(float), 50), x)
+        np.testing.assert_array_equal(lttb(x, x.astype(float), 2), x)
+
+
+class MaioresSequenciasTests(SimpleTestCase):
+    def test_conta_dias_consecutivos_e_recomeca_na_safra(self):
+        condicao = np.array([
+            [True, False],
+            [True, True],
+            [False, True],
+            [True, True],
+            [True, True],
+            [True, False],
+        ])
+        reinicio = np.array([False, False, False, False, True, False])
+
+        sequencias = _maiores_sequencias(condicao, reinicio)
+
+        np.testing.assert_array_equal(sequencias, [
+            [1, 0],
+            [2, 1],
+            [0, 2],
+            [1, 3],
+            [1, 1],
+            [2, 0],
+        ])
+
+
+class TabelaSombraTests(TestCase):
+    COLUNAS = ['ano', 'uf', 'produto', 'safra', 'produto_slug', 'area_plantada_ha', 'producao_toneladas']
+    CHAVE = ['ano', 'uf', 'produto', 'safra']
+    MEDIDAS = ['area_plantada_ha', 'producao_toneladas']
+
+    def linha(self, ano, uf, producao, area=1.0):
+        return (ano, uf, 'SOJA', 'unica', 'soja', area, producao)
+
+    def test_controle_confere_e_detecta_diferencas(self):
+        linhas = [self.linha(2020, 'MT', 10.0), self.linha(2021, 'MT', 20.0, area=None)]
+        esperado = controle_esperado(linhas, self.COLUNAS, self.CHAVE, self.MEDIDAS)
+
+        self.assertEqual(esperado.linhas, 2)
+        self.assertEqual(esperado.somas, {'area_plantada_ha': 1.0, 'producao_toneladas': 30.0})
+        conferir(esperado, controle_esperado(list(reversed(linhas)), self.COLUNAS, self.CHAVE, self.MEDIDAS))
+
+        outra_chave = [self.linha(2020, 'MT', 10.0), self.linha(2021, 'GO', 20.0, area=None)]
+        with self.assertRaisesMessage(CargaInvalida, 'chaves'):
+            conferir(esperado, controle_esperado(outra_chave, self.COLUNAS, self.CHAVE, self.MEDIDAS))
+        outra_soma = [self.linha(2020, 'MT', 10.0), self.linha(2021, 'MT', 21.0, area=None)]
+        with self.assertRaisesMessage(CargaInvalida, 'producao_toneladas'):
+            conferir(esperado, controle_esperado(outra_soma, self.COLUNAS, self.CHAVE, self.MEDIDAS))
+
+    def test_subtrair_linhas_sobrescritas(self):
+        controle = Controle(somas=dict.fromkeys(self.MEDIDAS, 0.0))
+        acumular_controle(controle, [self.linha(2020, 'MT', 10.0)], self.COLUNAS, self.CHAVE, self.MEDIDAS)
+        acumular_controle(controle, [self.linha(2020, 'MT', 10.0)], self.COLUNAS, self.CHAVE, self.MEDIDAS, sinal=-1)
+
+        self.assertEqual((controle.linhas, controle.chaves), (0, 0))
+        self.assertEqual(controle.somas, {'area_plantada_ha': 0.0, 'producao_toneladas': 0.0})
+
+    def test_substitui_a_tabela_e_fica_com_a_ultima_ocorrencia(self):
+        SafraAnual.objects.create(ano=2019, uf='GO', produto='SOJA', produto_slug='soja', producao_toneladas=1.0)
+        blocos = (
+            bloco for bloco in [
+                [self.linha(2020, 'MT', 10.0), self.linha(2021, 'MT', 20.0)],
+                [self.linha(2020, 'MT', 15.0), self.linha(2022, 'MT', 30.0)],
+            ]
+        )
+
+        troca = substituir_tabela(SafraAnual, blocos, self.COLUNAS, self.CHAVE, self.MEDIDAS, tamanho_lote=1)
+
+        self.assertEqual(troca.linhas, 3)
+        self.assertEqual(
+            dict(SafraAnual.objects.values_list('ano', 'producao_toneladas')), {2020: 15.0, 2021: 20.0, 2022: 30.0},
+        )
+
+    def test_sair_sem_concluir_mantem_a_tabela(self):
+        SafraAnual.objects.create(ano=2019, uf='GO', produto='SOJA', produto_slug='soja', producao_toneladas=1.0)
+
+        with self.assertRaises(ValueError):
+            with RecargaTabela(SafraAnual, self.COLUNAS, self.CHAVE, self.MEDIDAS) as recarga:
+                recarga.gravar([self.linha(2020, 'MT', 10.0)])
+                raise ValueError('falha no meio da carga')
+
+        self.assertEqual(list(SafraAnual.objects.values_list('ano', 'uf')), [(2019, 'GO')])
+
+
+class ExportacaoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        SafraAnual.objects.bulk_create([
+            SafraAnual(ano=ano, uf=uf, produto='SOJA', produto_slug='soja', codigo_produto=1,
+                       area_plantada_ha=ano - 2000.0, producao_toneladas=None if ano == 2021 else 10.0 * ano)
+            for ano in (2020, 2021, 2022) for uf in ('GO', 'MT')
+        ])
+        celula = CelulaGrade.objects.create(linha=149, coluna=198, latitude=-15.5, longitude=-56.25)
+        DadoMeteorologicoDiario.objects.bulk_create([
+            DadoMeteorologicoDiario(celula=celula, data=date(2020, 1, dia), precipitacao_mm=dia,
+                                    temp_maxima_c=30.0, temp_minima_c=20.0)
+            for dia in range(1, 6)
+        ])
+        for nome in ('Cuiabá', 'Várzea Grande'):
+            localidade = Localidade.objects.create(nome=nome, uf='MT', latitude=-15.6, longitude=-56.1, celula=celula)
+            ClimaAnual.objects.bulk_create([
+                ClimaAnual(localidade=localidade, uf='MT', ano=ano, precipitacao_total_mm=1400.0,
+                           temp_maxima_media_c=32.0, temp_minima_media_c=21.0, dias=366)
+                for ano in (2020, 2022, 2023)
+            ])
+
+    def linhas_esperadas(self):
+        colunas = CONJUNTOS['safras']['colunas']
+        return list(SafraAnual.objects.filter(uf='MT').order_by('ano').values_list(*colunas))
+
+    def test_csv_em_varios_pedacos(self):
+        pedacos = list(exportar('safras', 'csv', tamanho_pedaco=2, uf='MT'))
+
+        self.assertEqual(len(pedacos), 2)
+        leitor = csv.reader(io.StringIO(b''.join(pedacos).decode()))
+        self.assertEqual(next(leitor), CONJUNTOS['safras']['colunas'])
+        self.assertEqual([linha[0] for linha in leitor], ['2020', '2021', '2022'])
+
+    def test_ndjson(self):
+        linhas = [json.loads(linha) for linha in b''.join(exportar('safras', 'ndjson', uf='MT')).splitlines()]
+
+        self.assertEqual([linha['ano'] for linha in linhas], [2020, 2021, 2022])
+        self.assertIsNone(linhas[1]['producao_toneladas'])
+
+    def test_parquet_com_um_row_group_por_pedaco(self):
+        arquivo = pq.ParquetFile(pa.BufferReader(b''.join(exportar('safras', 'parquet', tamanho_pedaco=2, uf='MT'))))
+
+        self.assertEqual(arquivo.metadata.num_row_groups, 2)
+        tabela = arquivo.read()
+        self.assertEqual(tabela.column_names, CONJUNTOS['safras']['colunas'])
+        self.assertEqual(list(zip(*(coluna.to_pylist() for coluna in tabela.columns))), self.linhas_esperadas())
+
+    def test_clima_filtrado_por_data_com_centro_da_celula(self):
+        linhas = [
+            json.loads(linha)
+            for linha in b''.join(exportar('clima', 'ndjson', inicio=date(2020, 1, 2), fim=date(2020, 1, 3))).splitlines()
+        ]
+
+        self.assertEqual([linha['data'] for linha in linhas], ['2020-01-02', '2020-01-03'])
+        self.assertEqual((linhas[0]['celula__latitude'], linhas[0]['celula__longitude']), (-15.5, -56.25))
+
+    def test_safras_com_clima_por_localidade_e_ano(self):
+        conteudo = b''.join(exportar('safras_clima', 'csv', tamanho_pedaco=2, ano_fim=2022))
+
+        linhas = list(csv.DictReader(io.StringIO(conteudo.decode())))
+        # Só MT tem clima; 2021 não tem clima e 2023 não tem safra
+        self.assertEqual(
+            [(linha['ano'], linha['uf'], linha['localidade']) for linha in linhas],
+            [('2020', 'MT', 'Cuiabá'), ('2020', 'MT', 'Várzea Grande'),
+             ('2022', 'MT', 'Cuiabá'), ('2022', 'MT', 'Várzea Grande')],
+        )
+        self.assertEqual(linhas[0]['producao_toneladas'], '20200.0')
+        self.assertEqual(linhas[0]['precipitacao_total_mm'], '1400.0')
+        self.assertEqual(linhas[0]['dias_clima'], '366')
+
+    def test_safras_com_clima_em_parquet(self):
+        tabela = pq.read_table(pa.BufferReader(b''.join(exportar('safras_clima', 'parquet', produto='soja'))))
+
+        self.assertEqual(tabela.column_names, CONJUNTOS['safras_clima']['colunas'])
+        self.assertEqual(tabela.num_rows, 4)
+
+
+class CompararRelatoriosTests(SimpleTestCase):
+    def relatorio(self, linhas_por_segundo, segundos, latencia_ms):
+        return {'escalas': {'pequena': {
+            'conab': {'carga': {'linhas_por_segundo': linhas_por_segundo, 'segundos': segundos, 'linhas': 100}},
+            'api': {'chart_data': {'mediana_ms': latencia_ms}},
+        }}}
+
+    def test_marca_regressao_acima_da_tolerancia(self):
+        comparacao = comparar_relatorios(self.relatorio(1000, 2.0, 10.0), self.relatorio(850, 2.1, 12.0))
+
+        por_caminho = {caminho: (variacao, regressao) for caminho, _, _, variacao, regressao in comparacao}
+        self.assertEqual(set(por_caminho), {
+            'pequena.conab.carga.linhas_por_segundo', 'pequena.conab.carga.segundos',
+            'pequena.api.chart_data.mediana_ms',
+        })
+        # Menos linhas/s é piora; mais segundos e mais latência também
+        self.assertEqual(por_caminho['pequena.conab.carga.linhas_por_segundo'], (-0.15, True))
+        self.assertEqual(por_caminho['pequena.conab.carga.segundos'], (0.05, False))
+        self.assertEqual(por_caminho['pequena.api.chart_data.mediana_ms'], (0.2, True))
+
+    def test_melhora_nao_e_regressao_e_zero_e_ignorado(self):
+        comparacao = comparar_relatorios(self.relatorio(1000, 0, 10.0), self.relatorio(2000, 1.0, 5.0))
+
+        self.assertEqual(
+            [(caminho, regressao) for caminho, _, _, _, regressao in comparacao],
+            [('pequena.api.chart_data.mediana_ms', False), ('pequena.conab.carga.linhas_por_segundo', False)],
+        )
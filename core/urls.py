@@ -4,4 +4,9 @@ from . import views
 urlpatterns = [
     path('dashboard/', views.dashboard_view, name='dashboard'),
     path('api/chart-data/', views.get_chart_data, name='chart-data'),
+    path('api/producao/', views.get_producao, name='producao'),
+    path('api/indicadores/', views.get_indicadores, name='indicadores'),
+    path('api/series/', views.get_series, name='series'),
+    path('metrics', views.metricas_view, name='metricas'),
+    path('api/exportar/<str:conjunto>.<str:formato>', views.exportar_dados, name='exportar'),
 ]
\ No newline at end of file
@@ -1,7 +1,25 @@
+import asyncio
+from datetime import date
+from functools import partial, wraps
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
 from django.shortcuts import render
-from django.http import JsonResponse
-from .models import SafraAnual, DadoMeteorologicoDiario
-from django.db.models import Sum, Avg
+from django.utils.text import slugify
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.cache import cache_control
+from .models import CuboSafra, IndicadorSafra, SafraAnual
+from .indicadores import CAMPOS_INDICADORES
+from .exportacao import CONJUNTOS, FORMATOS, exportar
+from .series import (
+    MAX_PONTOS, PONTOS_PADRAO, RESOLUCOES, VARIAVEIS, calcular_serie, escolher_resolucao,
+    interpretar_data, montar_resposta,
+)
+from .cache import etag_resposta, aobter_ou_calcular, aversao_dados
+from .metricas import renderizar_prometheus
+from . import cubo_memoria
 
 def dashboard_view(request):
     """
@@ -12,36 +30,116 @@ def dashboard_view(request):
     return render(request, 'core/dashboard.html')
 
 
-def get_chart_data(request):
+async def _em_paralelo(*consultas):
     """
-    Fornece os dados agregados para o gráfico, agora aceitando filtros.
+    Executa as funções síncronas `consultas` ao mesmo tempo, cada uma numa
+    thread com sua própria conexão (emprestada do pool, quando ativo), e
+    devolve os resultados na mesma ordem.
+
+    O ORM assíncrono do Django roda todas as consultas numa única thread, uma
+    depois da outra; consultas independentes precisam de conexões separadas
+    para de fato rodar em paralelo.
     """
-    # Pega os parâmetros da URL, com um valor padrão 'soja'
-    produto_filtrado = request.GET.get('produto', 'soja')
+    def executar(consulta):
+        try:
+            return consulta()
+        finally:
+            # Devolve a conexão desta thread ao pool (ou a fecha, sem pool)
+            connections.close_all()
+
+    return await asyncio.gather(*(
+        sync_to_async(executar, thread_sensitive=False)(consulta) for consulta in consultas
+    ))
 
-    # Constrói a query base
-    query_producao = SafraAnual.objects.all()
 
-    # Aplica o filtro de produto se ele foi especificado
-    if produto_filtrado:
-        query_producao = query_producao.filter(produto__icontains=produto_filtrado)
+def _recorte_cubo(request, uf_padrao='', produto_padrao=''):
+    """
+    Normaliza o recorte de `CuboSafra` pedido: uf (BR ou vazio = Brasil),
+    produto (vazio = todos) e safra (unica, 1, 2, 3; vazio = todas).
+    """
+    uf = request.GET.get('uf', uf_padrao).strip().upper()
+    safra = request.GET.get('safra', '').strip().lower()
+    return {
+        'uf': uf if uf and uf != 'BR' else CuboSafra.TODOS,
+        'produto': slugify(request.GET.get('produto', produto_padrao)) or CuboSafra.TODOS,
+        'safra': safra if safra in dict(SafraAnual.SAFRAS) else CuboSafra.TODOS,
+    }
 
-    # Agrega os dados
-    producao_anual = query_producao.values('ano').annotate(
-        total_producao=Sum('producao_toneladas')
-    ).order_by('ano')
 
-    precipitacao_anual = DadoMeteorologicoDiario.objects.values('data__year').annotate(
-        total_precipitacao=Sum('precipitacao_mm')
-    ).order_by('data__year')
+def _parametros_chart_data(request):
+    """
+    Normaliza os filtros do gráfico, para que variações de caixa/espaço
+    compartilhem o cache. A UF padrão é MT, a das localidades do clima.
+    """
+    return _recorte_cubo(request, uf_padrao='MT', produto_padrao='soja')
 
-    producao_dict = {item['ano']: item['total_producao'] for item in producao_anual}
-    precipitacao_dict = {item['data__year']: item['total_precipitacao'] for item in precipitacao_anual}
+
+def _resposta_versionada(nome, normalizar):
+    """
+    Decorador das APIs assíncronas em cache. Normaliza os parâmetros com
+    `normalizar(request)` (ValueError vira 400), lê a versão dos dados uma
+    vez, pela API assíncrona do cache, e calcula com ela o ETag e o
+    Last-Modified. Se o navegador já tem essa versão (If-None-Match/
+    If-Modified-Since), responde 304 sem chamar a view; senão chama
+    `view(request, parametros, versao)`. As duas respostas levam os dois
+    cabeçalhos.
+    Faz no event loop o que `condition` faria com callbacks síncronos.
+    """
+    def decorador(view):
+        @wraps(view)
+        async def envoltorio(request):
+            try:
+                parametros = normalizar(request)
+            except ValueError as e:
+                return JsonResponse({'erro': str(e)}, status=400)
+            versao = await aversao_dados()
+            etag = quote_etag(etag_resposta(nome, parametros, versao))
+            response = get_conditional_response(request, etag=etag, last_modified=versao)
+            if response is None:
+                response = await view(request, parametros, versao)
+            response.headers.setdefault('ETag', etag)
+            response.headers.setdefault('Last-Modified', http_date(versao))
+            return response
+        return envoltorio
+    return decorador
+
+
+@cache_control(no_cache=True)
+@_resposta_versionada('chart-data', _parametros_chart_data)
+async def get_chart_data(request, parametros, versao):
+    """
+    Fornece os dados agregados para o gráfico, agora aceitando filtros.
+    A resposta fica em cache até a próxima importação, e o navegador pode
+    revalidá-la com If-None-Match/If-Modified-Since (304).
+    """
+    data = await aobter_ou_calcular(
+        'chart-data', parametros, lambda: _calcular_chart_data(versao=versao, **parametros), versao,
+    )
+    return JsonResponse(data)
+
+
+async def _calcular_chart_data(produto, uf, safra, versao):
+    """
+    Responde da cópia em memória de `SafraAnual` e `ClimaAnual`
+    (`core.cubo_memoria`), com máscaras e somas vetorizadas; o banco só é
+    lido quando a versão dos dados muda. A precipitação é a média da chuva
+    anual das células da grade da UF do recorte (de todas, no Brasil), cada
+    célula contada uma vez, por mais municípios que tenha.
+    """
+    dados = cubo_memoria.dados_atuais(versao)
+    if dados is None:
+        # A carga lê o banco; roda numa thread com conexão própria
+        dados, = await _em_paralelo(partial(cubo_memoria.obter_dados, versao))
+
+    uf, produto, safra = (None if valor == CuboSafra.TODOS else valor for valor in (uf, produto, safra))
+    producao_dict = dados.safras.somar('producao_toneladas', por='ano', uf=uf, produto_slug=produto, safra=safra)
+    precipitacao_dict = dados.clima.media('precipitacao_total_mm', por='ano', uf=uf)
 
     labels = sorted(list(set(producao_dict.keys()) & set(precipitacao_dict.keys())))
 
     # Define um nome dinâmico para o gráfico baseado no filtro
-    label_producao = f'Produção de {produto_filtrado.capitalize()} (Toneladas)'
+    nome_produto = 'todos os produtos' if produto is None else produto.replace('-', ' ').capitalize()
+    label_producao = f"Produção de {nome_produto} (Toneladas)"
 
     data = {
         'labels': labels,
@@ -55,7 +153,7 @@ def get_chart_data(request):
                 'yAxisID': 'y-producao',
             },
             {
-                'label': 'Precipitação Total (mm)',
+                'label': 'Precipitação Anual Média (mm)',
                 'data': [precipitacao_dict.get(ano) for ano in labels],
                 'backgroundColor': 'rgba(54, 162, 235, 0.2)',
                 'borderColor': 'rgba(54, 162, 235, 1)',
@@ -64,4 +162,202 @@ def get_chart_data(request):
             }
         ]
     }
-    return JsonResponse(data)
\ No newline at end of file
+    return data
+
+
+def _parametros_producao(request):
+    """Recorte do cubo (uf, produto, safra; padrão: Brasil, todos, todas) e intervalo de safras."""
+    return {
+        **_recorte_cubo(request),
+        'inicio': _inteiro(request.GET.get('inicio')) or '',
+        'fim': _inteiro(request.GET.get('fim')) or '',
+    }
+
+
+@cache_control(no_cache=True)
+@_resposta_versionada('producao', _parametros_producao)
+async def get_producao(request, parametros, versao):
+    """
+    Série anual de área, produção e produtividade de um recorte de
+    `CuboSafra`, ex: ?uf=BR&produto=soja&safra=2. Filtros: uf (sigla ou
+    BR), produto, safra (unica, 1, 2, 3), inicio e fim (ano da safra).
+    """
+    data = await aobter_ou_calcular('producao', parametros, lambda: _calcular_producao(**parametros), versao)
+    return JsonResponse(data)
+
+
+async def _calcular_producao(uf, produto, safra, inicio, fim):
+    consulta = CuboSafra.objects.filter(uf=uf, produto_slug=produto, safra=safra).order_by('ano')
+    if inicio:
+        consulta = consulta.filter(ano__gte=inicio)
+    if fim:
+        consulta = consulta.filter(ano__lte=fim)
+    return {
+        'uf': uf, 'produto': produto, 'safra': safra,
+        'producao': [
+            {
+                'ano': item.ano,
+                'safra': f"{item.ano}/{str(item.ano + 1)[-2:]}",
+                'area_plantada_ha': item.area_plantada_ha,
+                'producao_toneladas': item.producao_toneladas,
+                'produtividade_kg_ha': item.produtividade_kg_ha,
+            }
+            async for item in consulta
+        ],
+    }
+
+
+def _inteiro(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parametros_indicadores(request):
+    """Normaliza os filtros da API de indicadores (uf, localidade, intervalo de safras)."""
+    return {
+        'uf': request.GET.get('uf', '').strip().upper(),
+        'localidade': _inteiro(request.GET.get('localidade')) or '',
+        'inicio': _inteiro(request.GET.get('inicio')) or '',
+        'fim': _inteiro(request.GET.get('fim')) or '',
+    }
+
+
+@cache_control(no_cache=True)
+@_resposta_versionada('indicadores', _parametros_indicadores)
+async def get_indicadores(request, parametros, versao):
+    """
+    Indicadores agroclimáticos por localidade e safra (`IndicadorSafra`).
+    Filtros opcionais: uf, localidade (id), inicio e fim (ano de início da safra).
+    """
+    data = await aobter_ou_calcular('indicadores', parametros, lambda: _calcular_indicadores(**parametros), versao)
+    return JsonResponse(data)
+
+
+async def _calcular_indicadores(uf, localidade, inicio, fim):
+    consulta = IndicadorSafra.objects.select_related('localidade').order_by('localidade__nome', 'ano')
+    if uf:
+        consulta = consulta.filter(uf=uf)
+    if localidade:
+        consulta = consulta.filter(localidade_id=localidade)
+    if inicio:
+        consulta = consulta.filter(ano__gte=inicio)
+    if fim:
+        consulta = consulta.filter(ano__lte=fim)
+
+    return {
+        'indicadores': [
+            {
+                'localidade': indicador.localidade.nome,
+                'uf': indicador.uf,
+                'ano': indicador.ano,
+                'safra': f"{indicador.ano}/{str(indicador.ano + 1)[-2:]}",
+                **{campo: getattr(indicador, campo) for campo in CAMPOS_INDICADORES},
+            }
+            async for indicador in consulta
+        ]
+    }
+
+
+def _parametros_series(request):
+    """
+    Valida e normaliza os filtros da API de séries. Levanta ValueError com a
+    mensagem de erro para parâmetros inválidos.
+    """
+    localidade = _inteiro(request.GET.get('localidade'))
+    if not localidade:
+        raise ValueError('Informe a localidade (id).')
+    fim = interpretar_data(request.GET.get('fim'), date.today())
+    inicio = interpretar_data(request.GET.get('inicio'), fim.replace(year=fim.year - 1))
+    if inicio > fim:
+        raise ValueError('A data de início é posterior à data de fim.')
+    variaveis = sorted(set(request.GET.get('variaveis', 'precipitacao_mm').split(',')))
+    if not set(variaveis) <= set(VARIAVEIS):
+        raise ValueError(f"Variáveis aceitas: {', '.join(VARIAVEIS)}.")
+    resolucao = request.GET.get('resolucao', 'auto')
+    if resolucao not in RESOLUCOES:
+        raise ValueError(f"Resoluções aceitas: {', '.join(RESOLUCOES)}.")
+    pontos = min(_inteiro(request.GET.get('pontos')) or PONTOS_PADRAO, MAX_PONTOS)
+    return {
+        'localidade': localidade, 'inicio': inicio.isoformat(), 'fim': fim.isoformat(),
+        'variaveis': ','.join(variaveis), 'resolucao': resolucao, 'pontos': pontos,
+    }
+
+
+@cache_control(no_cache=True)
+@_resposta_versionada('series', _parametros_series)
+async def get_series(request, parametros, versao):
+    """
+    Série diária de uma localidade reduzida para gráfico: agregada por
+    semana/mês no banco e, se ainda passar, reduzida por LTTB a no máximo
+    `pontos` pontos.
+    Parâmetros: localidade, inicio, fim (AAAA-MM-DD), variaveis (separadas
+    por vírgula), resolucao (auto, dia, semana, mes) e pontos. Cada variável
+    é uma consulta independente, e elas rodam em paralelo.
+    """
+    data = await aobter_ou_calcular('series', parametros, lambda: _calcular_series(**parametros), versao)
+    return JsonResponse(data)
+
+
+async def _calcular_series(localidade, inicio, fim, variaveis, resolucao, pontos):
+    inicio, fim, variaveis = date.fromisoformat(inicio), date.fromisoformat(fim), variaveis.split(',')
+    if resolucao == 'auto':
+        resolucao = escolher_resolucao(inicio, fim, pontos)
+    series = await _em_paralelo(*(
+        partial(calcular_serie, localidade, inicio, fim, variavel, resolucao, pontos)
+        for variavel in variaveis
+    ))
+    return montar_resposta(localidade, inicio, fim, resolucao, dict(zip(variaveis, series)))
+
+
+async def _iterar_em_thread(gerador):
+    """
+    Adapta um gerador síncrono (que lê do banco) para iteração assíncrona sob
+    ASGI, um pedaço por vez; todos os passos rodam na mesma thread, a do cursor.
+    """
+    proximo = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (pedaco := await proximo(gerador, None)) is not None:
+            yield pedaco
+    finally:
+        await sync_to_async(gerador.close, thread_sensitive=True)()
+
+
+def _filtros_exportacao(request):
+    """Filtros da exportação; levanta ValueError para datas inválidas."""
+    return {
+        'uf': request.GET.get('uf', '').strip().upper() or None,
+        'produto': slugify(request.GET.get('produto', '')) or None,
+        'ano_inicio': _inteiro(request.GET.get('ano_inicio')),
+        'ano_fim': _inteiro(request.GET.get('ano_fim')),
+        'localidade': _inteiro(request.GET.get('localidade')),
+        'inicio': interpretar_data(request.GET.get('inicio'), None),
+        'fim': interpretar_data(request.GET.get('fim'), None),
+    }
+
+
+def exportar_dados(request, conjunto, formato):
+    """
+    Exporta `conjunto` (safras, clima ou safras_clima) em CSV, NDJSON ou Parquet, como
+    fluxo: a resposta começa a sair antes de a consulta terminar.
+    Filtros: uf, produto, ano_inicio, ano_fim, localidade, inicio e fim (AAAA-MM-DD).
+    """
+    if conjunto not in CONJUNTOS or formato not in FORMATOS:
+        return JsonResponse({'erro': f"Use /api/exportar/<{'|'.join(CONJUNTOS)}>.<{'|'.join(FORMATOS)}>."}, status=404)
+    try:
+        filtros = _filtros_exportacao(request)
+    except ValueError as e:
+        return JsonResponse({'erro': f'Data inválida: {e}'}, status=400)
+    conteudo = exportar(conjunto, formato, **filtros)
+    # Sob ASGI o StreamingHttpResponse só transmite sem acumular se o iterador for assíncrono
+    if isinstance(request, ASGIRequest):
+        conteudo = _iterar_em_thread(conteudo)
+    response = StreamingHttpResponse(conteudo, content_type=FORMATOS[formato])
+    response['Content-Disposition'] = f'attachment; filename="{conjunto}.{formato}"'
+    return response
+
+
+def metricas_view(request):
+    """Métricas das importações no formato texto do Prometheus."""
+    return HttpResponse(renderizar_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -85,6 +85,18 @@ DATABASES = {
     }
 }
 
+# Pool de conexões do psycopg 3 para o servidor ASGI (ver docker-compose.prod.yml).
+# Fica desligado por padrão: os workers do Celery usam conexões comuns.
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '0'))
+if DB_POOL_MAX_SIZE:
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': 10,
+        },
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -127,6 +139,24 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache das respostas da API. Por padrão usa o mesmo Redis do Celery (banco 1);
+# com CACHE_URL vazio cai para um cache LRU em memória por processo.
+CACHE_URL = os.environ.get('CACHE_URL', 'redis://redis:6379/1')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 1000},
+        }
+    }
+
 # Configurações do Celery
 CELERY_BROKER_URL = 'redis://redis:6379/0'
 CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
@@ -134,4 +164,50 @@ CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
 
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
-CELERY_RESULT_SERIALIZER = 'json'
\ No newline at end of file
+CELERY_RESULT_SERIALIZER = 'json'
+
+
+# Importação NASA POWER
+NASA_POWER_MAX_SIMULTANEAS = int(os.environ.get('NASA_POWER_MAX_SIMULTANEAS', '4'))
+NASA_POWER_REQUISICOES_POR_SEGUNDO = float(os.environ.get('NASA_POWER_REQUISICOES_POR_SEGUNDO', '5'))
+NASA_POWER_TENTATIVAS = int(os.environ.get('NASA_POWER_TENTATIVAS', '3'))
+# Maior intervalo pedido em uma única requisição e maior trecho já gravado
+# que ainda vale incluir para juntar duas lacunas na mesma requisição
+NASA_POWER_MAX_DIAS_POR_REQUISICAO = int(os.environ.get('NASA_POWER_MAX_DIAS_POR_REQUISICAO', '3653'))
+NASA_POWER_TOLERANCIA_LACUNA_DIAS = int(os.environ.get('NASA_POWER_TOLERANCIA_LACUNA_DIAS', '31'))
+
+# Redis do token bucket que faz de NASA_POWER_REQUISICOES_POR_SEGUNDO um limite
+# global, somado entre todos os workers do Celery e os comandos; por padrão o
+# mesmo do cache. Vazio limita cada processo separadamente.
+LIMITE_TAXA_URL = os.environ.get('LIMITE_TAXA_URL', CACHE_URL)
+
+# Importação INMET (estações automáticas)
+INMET_MAX_SIMULTANEAS = int(os.environ.get('INMET_MAX_SIMULTANEAS', '4'))
+INMET_REQUISICOES_POR_SEGUNDO = float(os.environ.get('INMET_REQUISICOES_POR_SEGUNDO', '4'))
+INMET_TENTATIVAS = int(os.environ.get('INMET_TENTATIVAS', '3'))
+
+# Snapshots colunares (Parquet) gravados após cada importação
+SNAPSHOTS_DIR = os.environ.get('SNAPSHOTS_DIR', str(BASE_DIR / 'data' / 'snapshots'))
+
+# Respostas brutas das APIs (NASA POWER e INMET), guardadas comprimidas para
+# refazer o parse sem rede (`--replay`); vazio desativa o armazém
+RESPOSTAS_BRUTAS_DIR = os.environ.get('RESPOSTAS_BRUTAS_DIR', str(BASE_DIR / 'data' / 'brutos'))
+RESPOSTAS_BRUTAS_COMPRESSAO = os.environ.get('RESPOSTAS_BRUTAS_COMPRESSAO', 'zstd')
+# Validade das respostas de períodos que ainda podem mudar; anos já encerrados não expiram
+RESPOSTAS_BRUTAS_TTL_HORAS = float(os.environ.get('RESPOSTAS_BRUTAS_TTL_HORAS', '24'))
+
+# Logs das importações: um resumo em JSON por execução (logger core.importacao)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.importacao': {
+            'handlers': ['console'],
+            'level': os.environ.get('IMPORTACAO_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}